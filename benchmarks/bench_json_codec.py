@@ -0,0 +1,75 @@
+"""
+Compares the JSON backends of emspy.codec on API payloads.
+
+Usage
+-----
+    python benchmarks/bench_json_codec.py [payload.json[.gz] ...] [--repeat N]
+
+Payloads are response bodies recorded from the EMS API (e.g. saved 'database/get_asyncq' or
+'analytic/query' responses), plain or gzip compressed. Without payloads, a synthetic 25,000 row
+async-query page with 50 mixed-type columns is used.
+"""
+from __future__ import print_function
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from emspy import codec  # noqa: E402
+
+
+def synthetic_page(n_rows=25000, n_cols=50, seed=0):
+    rnd = random.Random(seed)
+    makers = [
+        lambda: rnd.random() * 1e4,
+        lambda: rnd.randint(0, 500),
+        lambda: rnd.choice([True, False]),
+        lambda: '2019-%02d-%02dT%02d:%02d:00' % (rnd.randint(1, 12), rnd.randint(1, 28),
+                                                 rnd.randint(0, 23), rnd.randint(0, 59)),
+        lambda: rnd.choice(['KSEA', 'KLAX', 'EGLL', 'RJTT', None]),
+    ]
+    cols = [makers[i % len(makers)] for i in range(n_cols)]
+    rows = [[make() for make in cols] for _ in range(n_rows)]
+    return json.dumps({'rows': rows}).encode('utf-8')
+
+
+def load_payload(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if raw[:2] == b'\x1f\x8b':
+        raw = gzip.decompress(raw)
+    return raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('payloads', nargs='*')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [(os.path.basename(p), load_payload(p)) for p in args.payloads] \
+        or [('synthetic 25000x50 page', synthetic_page())]
+    backends = codec.available()
+    print("Available backends: %s" % ", ".join(backends))
+
+    for name, raw in payloads:
+        obj = json.loads(raw)
+        print("\n%s (%.1f MB)" % (name, len(raw) / 1e6))
+        print("%-10s %12s %12s %10s" % ("backend", "loads (ms)", "dumps (ms)", "speedup"))
+        baseline = None
+        for backend in reversed(backends):
+            c = codec.get_codec(backend)
+            t_loads = min(timeit.repeat(lambda: c.loads(raw), number=1, repeat=args.repeat))
+            t_dumps = min(timeit.repeat(lambda: c.dumps(obj), number=1, repeat=args.repeat))
+            baseline = baseline or t_loads
+            print("%-10s %12.1f %12.1f %9.1fx"
+                  % (backend, t_loads * 1e3, t_dumps * 1e3, baseline / t_loads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Compares the conversion of async-query pages to typed DataFrames by FltQuery with the former
+row-wise conversion, which built an object DataFrame then replaced its columns one by one, and
+decoded discrete fields with Series.replace.
+
+Usage
+-----
+    python benchmarks/bench_to_dataframe.py [--rows N] [--cols N] [--repeat N]
+
+A synthetic page with number, discrete, boolean, dateTime and string columns is converted, by
+default 25,000 rows by 50 columns.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from emspy.query import FltQuery  # noqa: E402
+from emspy.query.flight import CodeTable  # noqa: E402
+
+TYPES = ['number', 'number', 'discrete', 'boolean', 'dateTime', 'string']
+
+N_DISCRETE_VALUES = 200
+
+
+class KeyValues(object):
+    # Stands in for the Flight object, with the key-value maps of all discrete fields
+    def __init__(self):
+        self.kvmap = pd.DataFrame({'key': list(range(N_DISCRETE_VALUES)),
+                                   'value': ['Value %03d' % k for k in range(N_DISCRETE_VALUES)]})
+        self.tables = dict()
+
+    def list_allvalues(self, field_id=None, in_df=False):
+        return self.kvmap
+
+    def code_table(self, field_id):
+        # Cached, as by Flight.code_table
+        if field_id not in self.tables:
+            self.tables[field_id] = CodeTable(self.kvmap)
+        return self.tables[field_id]
+
+
+def synthetic_page(n_rows, n_cols, seed=0):
+    rnd = random.Random(seed)
+    makers = {
+        'number': lambda: rnd.random() * 1e4 if rnd.random() > 0.01 else None,
+        'discrete': lambda: rnd.randrange(N_DISCRETE_VALUES),
+        'boolean': lambda: rnd.choice([True, False]),
+        'dateTime': lambda: '2019-%02d-%02dT%02d:%02d:00' % (
+            rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59)),
+        'string': lambda: rnd.choice(['KSEA', 'KLAX', 'EGLL', 'RJTT', None]),
+    }
+    types = [TYPES[i % len(TYPES)] for i in range(n_cols)]
+    rows = [[makers[t]() for t in types] for _ in range(n_rows)]
+    header = [{'name': 'Column %d' % i} for i in range(n_cols)]
+    columns = [{'id': 'field%d' % i, 'type': t} for i, t in enumerate(types)]
+    return {'header': header, 'rows': rows}, columns
+
+
+def make_query(columns):
+    query = FltQuery.__new__(FltQuery)
+    query._FltQuery__columns = columns
+    query._FltQuery__queryset = {'format': 'none'}
+    query._FltQuery__flight = KeyValues()
+    return query
+
+
+def rowwise_to_dataframe(query, page):
+    # The former FltQuery.__to_dataframe
+    col = [h['name'] for h in page['header']]
+    df = pd.DataFrame(data=page['rows'], columns=col)
+    for i, c in enumerate(query._FltQuery__columns):
+        ds = df.iloc[:, i]
+        if c['type'] == 'number':
+            ds = pd.to_numeric(ds)
+        elif c['type'] == 'discrete':
+            k_map = query._FltQuery__flight.list_allvalues(field_id=c['id'], in_df=True)
+            k_map = k_map[k_map.key.isin(ds.unique())]
+            ds = ds.replace(dict((r['key'], r['value']) for _, r in k_map.iterrows()))
+        elif c['type'] == 'boolean':
+            ds = ds.astype(bool)
+        elif c['type'] == 'dateTime':
+            ds = pd.to_datetime(ds, utc=True)
+        df.isetitem(i, ds)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=25000)
+    parser.add_argument('--cols', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    page, columns = synthetic_page(args.rows, args.cols)
+    query = make_query(columns)
+    columnar = query._FltQuery__to_dataframe
+    rowwise = lambda p: rowwise_to_dataframe(query, p)  # noqa: E731
+
+    expected, df = rowwise(page), columnar(page)
+    # Discrete columns are now categorical
+    pd.testing.assert_frame_equal(df.astype(object), expected.astype(object))
+
+    print("Synthetic %dx%d page" % (args.rows, args.cols))
+    print("%-10s %12s %10s" % ("method", "time (ms)", "speedup"))
+    baseline = None
+    for name, convert in [('row-wise', rowwise), ('columnar', columnar)]:
+        t = min(timeit.repeat(lambda: convert(page), number=1, repeat=args.repeat))
+        baseline = baseline or t
+        print("%-10s %12.1f %9.1fx" % (name, t * 1e3, baseline / t))
+
+
+if __name__ == '__main__':
+    main()
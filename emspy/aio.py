@@ -0,0 +1,780 @@
+"""
+asyncio counterparts of the connection and query objects.
+
+This module requires Python 3.7 or later. Query objects are still set up synchronously (EMS
+system lookup, database and field trees); only the calls that send queries are coroutines, so
+many of them can be in flight on one event loop.
+"""
+import asyncio
+import collections
+import copy
+import http.client
+import io
+import pprint as pp
+import socket
+import ssl
+import time
+import urllib.error
+import urllib.parse
+
+from . import common
+from . import metrics
+from . import retry
+from .connection import Connection, DeadlineExceeded
+from .query.asyncquery import AsyncQuery
+from .query.fltquery import FltQuery, _concat, _is_last_page
+from .query.tsquery import TSeriesQuery
+from .query.profile import Profile
+
+
+class AsyncTransport(object):
+    """
+    Keep-alive HTTP(S) transport built on asyncio streams
+    """
+    def __init__(self, pool_size=10, idle_timeout=60, proxies=None, ignore_ssl_errors=False):
+        """
+        Async transport initialization
+
+        Parameters
+        ----------
+        pool_size: int
+            maximum number of idle connections kept per host (default 10)
+        idle_timeout: float
+            seconds after which an idle connection is discarded instead of reused (default 60)
+        proxies: dict
+            proxies dictionary {'http': '', 'https': ''}
+        ignore_ssl_errors: bool
+            ignore SSL certificate errors (default False)
+        """
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._proxies = proxies or {}
+        self._ssl = ssl._create_unverified_context() if ignore_ssl_errors \
+            else ssl.create_default_context()
+        self._pools = collections.defaultdict(collections.deque)
+
+    async def send(self, method, url, data=None, headers=None, timeout=None):
+        """
+        Sends a request over a pooled connection
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            absolute request url
+        data: bytes
+            request body
+        headers: dict
+            request headers
+        timeout: float or tuple
+            timeout in seconds, or (connect, read) timeouts. The read timeout bounds the whole
+            exchange once connected. (default None, no timeout)
+
+        Returns
+        -------
+        AsyncResponse
+            response with the body already read
+        """
+        connect_timeout, read_timeout = timeout if isinstance(timeout, (tuple, list)) \
+            else (timeout, timeout)
+        try:
+            return await self.__send(method, url, data, headers, connect_timeout, read_timeout)
+        except asyncio.TimeoutError:
+            # Report the same errors as the blocking transports.
+            raise socket.timeout("Request to '%s' timed out." % url)
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError("Connection closed by the server.")
+
+    def close(self):
+        """
+        Closes all idle connections
+
+        Returns
+        -------
+        None
+        """
+        for pool in self._pools.values():
+            while pool:
+                _, writer, _, loop = pool.pop()
+                if not loop.is_closed():
+                    writer.close()
+        self._pools.clear()
+
+    async def __send(self, method, url, data, headers, connect_timeout, read_timeout):
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = url if parts.scheme == 'http' and self._proxies.get('http') \
+            else (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        headers = dict(headers or {})
+        headers.setdefault('Host', parts.netloc)
+        headers.setdefault('Connection', 'keep-alive')
+        if data is not None:
+            headers['Content-Length'] = str(len(data))
+
+        started = metrics.clock()
+        reader, writer, reused = await _wait(self.__acquire(key), connect_timeout)
+        connect_time = 0. if reused else metrics.clock() - started
+        try:
+            response, will_close = await _wait(
+                _exchange(reader, writer, method, target, data, headers), read_timeout)
+        except asyncio.TimeoutError:
+            writer.close()
+            raise
+        except (OSError, asyncio.IncompleteReadError):
+            writer.close()
+            # A pooled connection may have been dropped by the server while it sat idle. The
+            # request may have been acted on, so only idempotent ones are sent again.
+            if not reused or method not in common.idempotent_methods:
+                raise
+            started = metrics.clock()
+            reader, writer = await _wait(self.__open(key), connect_timeout)
+            connect_time = metrics.clock() - started
+            try:
+                response, will_close = await _wait(
+                    _exchange(reader, writer, method, target, data, headers), read_timeout)
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            # Cancelled mid-exchange; the connection is in an unknown state.
+            writer.close()
+            raise
+
+        if will_close:
+            writer.close()
+        elif len(self._pools[key]) < self.pool_size:
+            self._pools[key].append((reader, writer, time.time(), asyncio.get_event_loop()))
+        else:
+            writer.close()
+
+        response.url = url
+        response.connect_time = connect_time
+        if response.status >= 400:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.msg,
+                                         io.BytesIO(response.body))
+        return response
+
+    async def __acquire(self, key):
+        now = time.time()
+        current_loop = asyncio.get_event_loop()
+        pool = self._pools[key]
+        while pool:
+            reader, writer, last_used, loop = pool.pop()
+            # Streams are bound to the event loop that opened them.
+            if loop is not current_loop:
+                if not loop.is_closed():
+                    writer.close()
+                continue
+            if now - last_used <= self.idle_timeout and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await self.__open(key)
+        return reader, writer, False
+
+    async def __open(self, key):
+        scheme, host, port = key
+        port = port or (443 if scheme == 'https' else 80)
+        context = self._ssl if scheme == 'https' else None
+        proxy = self._proxies.get(scheme)
+        if not proxy:
+            return await asyncio.open_connection(host, port, ssl=context)
+
+        proxy = urllib.parse.urlsplit(proxy)
+        reader, writer = await asyncio.open_connection(proxy.hostname, proxy.port)
+        if scheme == 'http':
+            return reader, writer
+        if not hasattr(writer, 'start_tls'):
+            writer.close()
+            raise NotImplementedError("HTTPS proxies require Python 3.11 or later with "
+                                      "AsyncConnection.")
+        authority = '%s:%d' % (host, port)
+        response, _ = await _exchange(reader, writer, 'CONNECT', authority, None,
+                                      {'Host': authority}, body=False)
+        if response.status != 200:
+            writer.close()
+            raise OSError("Proxy tunnel to %s failed: %d %s"
+                          % (authority, response.status, response.reason))
+        await writer.start_tls(context, server_hostname=host)
+        return reader, writer
+
+
+class AsyncResponse(object):
+    """
+    Response from an AsyncTransport. Mirrors the parts of the urllib response interface used by
+    emspy.connection.Connection.
+    """
+    def __init__(self, status, reason, msg, body):
+        self.status = status
+        self.reason = reason
+        self.msg = msg
+        self.body = body
+        self.url = None
+        # Seconds spent opening the connection and reading the body
+        self.connect_time = None
+        self.download_time = None
+
+    def read(self):
+        return self.body
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def getheaders(self):
+        return list(self.msg.items())
+
+    def info(self):
+        return self.msg
+
+
+async def _wait(aw, timeout):
+    if timeout is None:
+        return await aw
+    return await asyncio.wait_for(aw, timeout)
+
+
+async def _exchange(reader, writer, method, target, data, headers, body=True):
+    lines = ['%s %s HTTP/1.1' % (method, target)]
+    lines += ['%s: %s' % (k, v) for k, v in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1'))
+    if data is not None:
+        writer.write(data)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by the server.")
+    version, status, reason = (status_line.decode('iso-8859-1').rstrip('\r\n').split(' ', 2)
+                               + [''])[:3]
+    status = int(status)
+    header_lines = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        header_lines.append(line)
+    msg = http.client.parse_headers(io.BytesIO(b''.join(header_lines) + b'\r\n'))
+    started = metrics.clock()
+
+    will_close = version == 'HTTP/1.0' or msg.get('Connection', '').lower() == 'close'
+    if not body or method == 'HEAD' or status < 200 or status in (204, 304):
+        content = b''
+    elif 'chunked' in msg.get('Transfer-Encoding', '').lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Skip trailers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        content = b''.join(chunks)
+    elif msg.get('Content-Length') is not None:
+        content = await reader.readexactly(int(msg['Content-Length']))
+    else:
+        content = await reader.read()
+        will_close = True
+    response = AsyncResponse(status, reason, msg, content)
+    response.download_time = metrics.clock() - started
+    return response, will_close
+
+
+async def acquire_semaphore(semaphore, deadline=None):
+    """
+    Coroutine version of emspy.ratelimit.FairSemaphore.acquire. Tasks queue up in the same line
+    as threads waiting for the semaphore.
+
+    Parameters
+    ----------
+    semaphore: emspy.ratelimit.FairSemaphore
+        semaphore to acquire
+    deadline: float
+        time, as given by time.time(), after which waiting is of no use (default None)
+    """
+    loop = asyncio.get_event_loop()
+    granted = loop.create_future()
+
+    def grant():
+        # Called by the releasing thread or task
+        loop.call_soon_threadsafe(_set_granted, granted)
+
+    if semaphore._enqueue(grant):
+        return
+    timeout = None if deadline is None else max(0., deadline - time.time())
+    try:
+        await asyncio.wait_for(asyncio.shield(granted), timeout)
+    except asyncio.TimeoutError:
+        if semaphore._cancel(grant):
+            raise DeadlineExceeded("Too many requests in flight to send the request before "
+                                   "its deadline.")
+    except asyncio.CancelledError:
+        if not semaphore._cancel(grant):
+            semaphore.release()
+        raise
+
+
+def _set_granted(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def _aclose(opened):
+    # Coroutine version of AsyncQuery.close
+    if opened.closed:
+        return
+    opened.detach()
+    try:
+        await opened._conn.arequest(
+            rtype="DELETE",
+            uri_keys=('database', 'close_asyncq'),
+            uri_args=opened._uri_args + (opened.query_id,)
+        )
+    except Exception as e:
+        print("Could not close the async-query %s: %s" % (opened.query_id, e))
+
+
+class AsyncSingleFlight(object):
+    """
+    Coroutine version of emspy.singleflight.SingleFlight, for calls on one event loop
+    """
+    def __init__(self):
+        self._calls = dict()
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Awaits fn(*args, **kwargs) unless a call with the same key is already running on this
+        event loop, in which case its result is shared. Callers sharing a result each receive
+        their own deep copy of it.
+        """
+        loop = asyncio.get_event_loop()
+        call = self._calls.get(key)
+        if call is not None and call[0].get_loop() is loop:
+            call[1] += 1
+            return copy.deepcopy(await asyncio.shield(call[0]))
+
+        call = self._calls[key] = [loop.create_future(), 0]
+        future = call[0]
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as exc:
+            self.__finish(key, call)
+            if not call[1] or not isinstance(exc, Exception):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+            raise
+        self.__finish(key, call)
+        if not call[1]:
+            future.cancel()
+            return result
+        future.set_result(result)
+        return copy.deepcopy(result)
+
+    def __finish(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class AsyncConnection(Connection):
+    """
+    Connection to EMS API with coroutine counterparts of request, connect and reconnect
+    """
+    def __init__(self, user=None, pwd=None, proxies=None, verbose=False, ignore_ssl_errors=False,
+                 server="prod", server_url=None, max_trials=3, pool_size=10,
+                 pool_idle_timeout=60, json_codec=None, retry_policy=None,
+                 token_refresh_margin=60, metrics=None,
+                 timeouts=None, cache=None, coalesce=True, limiter=None, cassette=None,
+                 transport=None):
+        """
+        Async connection initialization. If credentials are given, the connection is made
+        synchronously; otherwise await aconnect before sending requests.
+
+        Parameters
+        ----------
+        user: str
+            EMS username
+        pwd: str
+            EMS password
+        proxies: dict
+            proxies dictionary {'http': '', 'https': ''}
+        verbose: bool
+            verbose output (default False)
+        ignore_ssl_errors: bool
+            ignore SSL certificate errors (default False)
+        server: str
+            server to connect to from emspy.common.uri_root
+        server_url: str
+            hostname for server to connect to if different from any of the common values
+        max_trials: int
+            maximum number of reconnection attempts
+        pool_size: int
+            maximum number of idle keep-alive connections kept per host, for both the
+            synchronous and the asynchronous requests (default 10)
+        pool_idle_timeout: float
+            seconds an idle pooled connection is kept before it is discarded (default 60)
+        json_codec: str or emspy.codec.JSONCodec
+            JSON backend used to encode requests and decode responses, one of
+            emspy.codec.backends. If None, the fastest installed backend is used. (default None)
+        retry_policy: emspy.retry.RetryPolicy
+            decides which failed requests are sent again and how long to wait in between. If None,
+            emspy.retry.RetryPolicy() is used. (default None)
+        token_refresh_margin: float
+            the access token is refreshed this many seconds before it expires (default 60)
+        metrics: emspy.metrics.MetricsRegistry
+            if given, every request is recorded in this registry (default None)
+        timeouts: dict
+            (connect, read) timeouts in seconds overriding emspy.common.timeouts for some endpoint
+            families, e.g. {'async_read': (10, 600)}. A single number sets both. (default None)
+        cache: str or emspy.cache.HTTPCache
+            cache for the responses of metadata endpoints, or the path of its file
+            (default None, no caching)
+        coalesce: bool
+            identical GET requests (and POST requests to emspy.common.read_only_posts) made
+            while one of them is in flight wait for it and share its response (default True)
+        limiter: emspy.ratelimit.RequestLimiter
+            rate limits and in-flight caps per endpoint family applied to the requests of this
+            connection, and of any other connection sharing the limiter (default None)
+        cassette: emspy.cassette.Cassette
+            if given, requests and responses are recorded in the cassette, or replayed from it
+            without network access, depending on its mode (default None)
+        transport: str or emspy.transport.Transport
+            sends the synchronous requests: a backend name from emspy.transport.backends or a
+            transport object. If None, 'pooled' is used. (default None)
+        """
+        self._async_transport = AsyncTransport(pool_size, pool_idle_timeout, proxies,
+                                               ignore_ssl_errors)
+        self._token_refresh = None
+        self._async_single_flight = AsyncSingleFlight()
+        Connection.__init__(self, user, pwd, proxies, verbose, ignore_ssl_errors, server,
+                            server_url, max_trials, pool_size, pool_idle_timeout, json_codec,
+                            retry_policy, token_refresh_margin, metrics, timeouts,
+                            cache, coalesce, limiter, cassette, transport)
+
+    async def aconnect(self, user, pwd, proxies=None, verbose=False):
+        """
+        Coroutine version of connect
+
+        Parameters
+        ----------
+        user: str
+            EMS username
+        pwd: str
+            EMS password
+        proxies: dict
+            proxies dictionary (default None)
+        verbose: bool
+            verbose output (default False)
+
+        Returns
+        -------
+        resp_h: list
+            response headers
+        content: dict
+            response content
+        """
+        resp_h, content = await self.arequest(verbose=verbose,
+                                              **self._auth_request(user, pwd, proxies))
+        self._set_token(content)
+        return resp_h, content
+
+    async def areconnect(self, verbose=False):
+        """
+        Coroutine version of reconnect
+
+        Parameters
+        ----------
+        verbose: bool
+            verbose output (default False)
+
+        Returns
+        -------
+        resp_h: list
+            response headers
+        content: dict
+            response content
+        """
+        user, pwd, proxies = self._reconnect_credentials()
+        return await self.aconnect(user, pwd, proxies, verbose)
+
+    async def arequest(self, rtype="GET", uri=None, uri_keys=None, uri_args=None, headers=None,
+                       body=None, data=None, jsondata=None, proxies=None, verbose=False,
+                       deadline=None):
+        """
+        Coroutine version of request. Takes the same arguments and returns the same values.
+
+        Returns
+        -------
+        response_headers: list
+            response headers
+        content: dict
+            response content
+        """
+        if headers is None and self.token_expiring():
+            await self._arefresh_token(self._authorization())
+        request = self._prepare_request(rtype, uri, uri_keys, uri_args, headers, body, data,
+                                        jsondata)
+        key = self._coalesce_key(request, uri_keys)
+        if key is None:
+            return await self.__arequest(request, uri_keys, verbose, deadline)
+        return await self._async_single_flight.do(key, self.__arequest, request, uri_keys,
+                                                  verbose, deadline)
+
+    async def __arequest(self, request, uri_keys, verbose=False, deadline=None):
+        # Coroutine version of Connection.__request
+        event = self._before_request(request, uri_keys)
+        cache_key, cached = self._cache_lookup(request, uri_keys, event)
+        family, limited = self._family(uri_keys), False
+        try:
+            if event.cache == 'hit':
+                started = metrics.clock()
+                response = cached.response()
+            else:
+                if self._limiter is not None:
+                    semaphore = self._limiter.semaphores.get(family)
+                    if semaphore is not None:
+                        await acquire_semaphore(semaphore, deadline)
+                    limited = True
+                started, response = await self.__send_with_retries(request, uri_keys, event,
+                                                                   deadline)
+            if cache_key is not None:
+                response = self._cache_response(response, cache_key, cached, event)
+            content = self._read_content(response, event, metrics.clock() - started)
+        except Exception as exc:
+            event.error = exc
+            raise
+        finally:
+            if limited:
+                self._limiter.release(family)
+            self._after_request(event)
+
+        status_code = response.getcode()
+        if status_code != 200:
+            print("HTTP status code: %d" % status_code)
+            verbose = True
+        response_headers = response.getheaders()
+
+        if verbose:
+            print("URL: %s" % response.geturl())
+            pp.pprint(response_headers)
+            pp.pprint(content)
+
+        return response_headers, content
+
+    async def __send_with_retries(self, request, uri_keys, event, deadline=None):
+        # Coroutine version of Connection.__send_with_retries
+        attempt, reauthenticated = 0, False
+        while True:
+            if self._limiter is not None:
+                wait = self._limiter.reserve(self._family(uri_keys), deadline)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            timeout = self._timeout(uri_keys, deadline)
+            try:
+                event.attempts += 1
+                started = metrics.clock()
+                return started, await self.__send_request(request, timeout, uri_keys)
+            except Exception as exc:
+                action = self._retry_action(exc, attempt, uri_keys, request, reauthenticated)
+                if action is None:
+                    raise
+                if action == retry.REAUTHENTICATE:
+                    print("Trying to reconnect the EMS API.")
+                    await self._arefresh_token(request.get_header('Authorization'))
+                    self._authorize(request)
+                    print("Done.")
+                    reauthenticated = True
+                else:
+                    await asyncio.sleep(self._retry_delay(exc, attempt, deadline))
+                    attempt += 1
+
+    async def _arefresh_token(self, stale_authorization):
+        # Coroutines needing a new token while a refresh is in flight wait for that refresh
+        # instead of starting their own.
+        refresh = self._token_refresh
+        if refresh is None or refresh.done() or refresh.get_loop() is not asyncio.get_event_loop():
+            if self._authorization() != stale_authorization:
+                return
+            refresh = self._token_refresh = asyncio.ensure_future(self.areconnect())
+        await asyncio.shield(refresh)
+
+    async def __send_request(self, req, timeout=None, uri_keys=None):
+        # Coroutine version of Connection.__send_request
+        if self._cassette is None:
+            return await self.__send(req, timeout)
+        if not self._cassette.recording:
+            interaction = self._cassette.play(req.get_method(), req.full_url, req.data, uri_keys)
+            await asyncio.sleep(self._cassette.delay(interaction))
+            return interaction.response(req.full_url)
+        started = metrics.clock()
+        try:
+            response = await self.__send(req, timeout)
+        except urllib.error.HTTPError as exc:
+            response = exc
+        return self._cassette.record(req.get_method(), req.full_url, req.data, uri_keys,
+                                     response, started)
+
+    async def __send(self, req, timeout):
+        return await self._async_transport.send(req.get_method(), req.full_url, req.data,
+                                                dict(req.header_items()), timeout)
+
+    def close(self):
+        """
+        Closes any pooled connections held by this object
+
+        Returns
+        -------
+        None
+        """
+        Connection.close(self)
+        self._async_transport.close()
+
+
+class AsyncFltQuery(FltQuery):
+    """
+    Flight query whose async_run is a coroutine. Requires an AsyncConnection.
+    """
+    async def async_run(self, n_row=25000, deadline=None):
+        """
+        Coroutine version of FltQuery.async_run
+
+        Parameters
+        ----------
+        n_row: int
+            batch size of a single async call. Default is 25000.
+        deadline: float
+            time, as given by time.time(), by which all rows must have been received. Raises
+            emspy.connection.DeadlineExceeded if it is missed. (default None)
+
+        Returns
+        -------
+        pd.DataFrame
+            Returned data for query in Pandas' DataFrame format
+        """
+        print('Sending and opening an async-query to EMS ...', end=' ')
+        resp_h, content = await self._conn.arequest(
+            rtype="POST",
+            uri_keys=('database', 'open_asyncq'),
+            uri_args=self._asyncq_uri_args(),
+            jsondata=self.in_dict(),
+            deadline=deadline
+        )
+        if 'id' not in content:
+            raise ValueError("Opening Async query did not return the query Id.")
+        opened = AsyncQuery(self._conn, self._asyncq_uri_args(), content['id'],
+                            content['header'])
+        print('Done.')
+
+        # Pages are converted as they are received and joined once, like FltQuery.async_run.
+        # The async-query is closed however the run ends, cancellation included.
+        dfs, n_rows, page = [], 0, 0
+        try:
+            while True:
+                print(" === Async call: %d ===" % (page+1))
+                resp_h, content = await self._conn.arequest(
+                    rtype="GET",
+                    uri_keys=('database', 'get_asyncq'),
+                    uri_args=self._asyncq_uri_args(opened.query_id, n_row * page,
+                                                   n_row * (page+1) - 1),
+                    deadline=deadline
+                )
+                dfs.append(self._page_to_dataframe(content, opened.header))
+                n_rows += dfs[-1].shape[0]
+                print("Received up to %d rows." % n_rows)
+                if _is_last_page(content, dfs[-1].shape[0], n_row):
+                    break
+                page += 1
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            print("Something's wrong. Returning what has been sent so far.")
+            return _concat(dfs)
+        finally:
+            await _aclose(opened)
+
+        print("Done.")
+        return _concat(dfs)
+
+
+class AsyncTSeriesQuery(TSeriesQuery):
+    """
+    Time series query whose run is a coroutine. Requires an AsyncConnection.
+
+    Examples
+    --------
+    Queries for several flights can share one event loop:
+
+    >>> dfs = await asyncio.gather(*[query.run(fr, start=0, end=900) for fr in flight_records])
+    """
+    async def run(self, flight, start=None, end=None, timestep=None, timepoint=None,
+                  discretes_as_strings=True, deadline=None):
+        """
+        Coroutine version of TSeriesQuery.run
+
+        Parameters
+        ----------
+        flight: int
+            flight record id
+        start: str
+            start datetime
+        end: str
+            end datetime
+        timestep: int
+            time step magnitude
+        timepoint: str
+            time point datetime
+        discretes_as_strings: bool
+            allows user to treat discrete values as strings (default True)
+        deadline: float
+            time, as given by time.time(), by which the query must have completed (default None)
+
+        Returns
+        -------
+        pd.DataFrame
+            pandas dataframe with the selected data
+        """
+        queryset = self._run_queryset(start, end, timestep, timepoint, discretes_as_strings)
+        _, content = await self._conn.arequest(
+            uri_keys=("analytic", "query"),
+            uri_args=(self._ems_id, flight),
+            jsondata=queryset,
+            deadline=deadline
+        )
+        return self._run_result(flight, content)
+
+
+class AsyncProfile(Profile):
+    """
+    Profile whose get_events is a coroutine. Requires an AsyncConnection.
+    """
+    async def get_events(self, flight_id):
+        """
+        Coroutine version of Profile.get_events
+
+        Parameters
+        ----------
+        flight_id: int
+            flight record identifier
+
+        Returns
+        -------
+        event_data: pd.DataFrame
+            selected event field for selected flight
+        """
+        if self._guid is None:
+            return None
+        if self._glossary is None:
+            _, dict_data = await self._conn.arequest(
+                uri_keys=('profile', 'glossary'),
+                uri_args=(self._ems_id, self._guid)
+            )
+            self._set_glossary(dict_data)
+        _, profile_results = await self._conn.arequest(
+            uri_keys=('profile', 'profile_results'),
+            uri_args=(self._ems_id, flight_id, self._guid)
+        )
+        return self._events_from_results(profile_results)
@@ -0,0 +1,263 @@
+"""
+On-disk cache of API responses for endpoints returning near-static metadata.
+
+Responses are stored as received, compressed, in a SQLite file. A stored response is reused
+without contacting the API until it is older than the cache's ttl. After that it is revalidated
+with a conditional request (If-None-Match / If-Modified-Since) if the API sent an ETag or
+Last-Modified header, and fetched again otherwise. The least recently used responses are evicted
+once the cache grows beyond its maximum size.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import email.message
+import hashlib
+import io
+import json
+import sqlite3
+import time
+
+from .lrustore import LRUStore
+
+# GET endpoints whose responses are cached by default
+DEFAULT_URI_KEYS = (
+    ('ems_sys', 'list'),
+    ('ems_sys', 'info'),
+    ('fleet', 'list'),
+    ('aircraft', 'list'),
+    ('flt_phase', 'list'),
+    ('airport', 'list'),
+    ('database', 'group'),
+    ('database', 'field_group'),
+    ('database', 'field'),
+    ('analytic', 'group'),
+    ('analytic', 'group_f'),
+    ('profile', 'search'),
+    ('profile', 'glossary'),
+    ('profile', 'events')
+)
+
+
+class HTTPCache(object):
+    """
+    Size-bounded LRU cache of API responses stored in a SQLite file
+    """
+    def __init__(self, path, max_size=64 * 1024 * 1024, ttl=24 * 60 * 60,
+                 uri_keys=DEFAULT_URI_KEYS):
+        """
+        HTTP cache initialization
+
+        Parameters
+        ----------
+        path: str
+            path to the SQLite cache file; it is created if it does not exist
+        max_size: int
+            maximum total size in bytes of the stored response bodies (default 64 MiB)
+        ttl: float
+            seconds a stored response is used without revalidating it (default one day)
+        uri_keys: tuple
+            uri keys of the GET endpoints whose responses are cached (default DEFAULT_URI_KEYS)
+        """
+        self._store = LRUStore(path, 'responses', [('url', 'TEXT'), ('headers', 'TEXT'),
+                                                   ('body', 'BLOB'), ('etag', 'TEXT'),
+                                                   ('last_modified', 'TEXT')], max_size)
+        self.path = self._store.path
+        self.ttl = ttl
+        self.uri_keys = frozenset(tuple(k) for k in uri_keys)
+
+    @property
+    def max_size(self):
+        """
+        Maximum total size in bytes of the stored response bodies
+        """
+        return self._store.max_size
+
+    @max_size.setter
+    def max_size(self, max_size):
+        self._store.max_size = max_size
+
+    def cacheable(self, method, uri_keys):
+        """
+        Tells if responses to a request are cached
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        uri_keys: tuple
+            request uri keys
+
+        Returns
+        -------
+        bool
+            True for GET requests to one of the cached endpoints
+        """
+        return method == 'GET' and uri_keys is not None and tuple(uri_keys) in self.uri_keys
+
+    @staticmethod
+    def key(url, user=None):
+        """
+        Cache key of a request. Responses are stored per user, as they depend on the user's
+        permissions.
+        """
+        return hashlib.sha1(('%s\n%s' % (user or '', url)).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a stored response
+
+        Parameters
+        ----------
+        key: str
+            cache key
+
+        Returns
+        -------
+        CacheEntry or None
+            the stored response, None if there is none
+        """
+        row = self._store.get(key)
+        if row is None:
+            return None
+        url, headers, body, etag, last_modified, stored_at = row
+        return CacheEntry(key, url, json.loads(headers), bytes(body), etag, last_modified,
+                          stored_at, self.ttl)
+
+    def store(self, key, url, headers, body):
+        """
+        Stores a response, evicting the least recently used ones if the cache is full
+
+        Parameters
+        ----------
+        key: str
+            cache key
+        url: str
+            request url
+        headers: list
+            response headers as (name, value) pairs
+        body: bytes
+            response body as received
+
+        Returns
+        -------
+        CacheEntry
+            the response, which is not stored if the API asked not to or it is larger than
+            max_size
+        """
+        msg = _message(headers)
+        now = time.time()
+        entry = CacheEntry(key, url, list(headers), body, msg.get('ETag'),
+                           msg.get('Last-Modified'), now, self.ttl)
+        if 'no-store' not in msg.get('Cache-Control', ''):
+            self._store.put(key, len(body), (url, json.dumps(list(headers)), sqlite3.Binary(body),
+                                             msg.get('ETag'), msg.get('Last-Modified')))
+        return entry
+
+    def refresh(self, entry):
+        """
+        Marks a stored response as fresh again after the API confirmed it did not change
+
+        Parameters
+        ----------
+        entry: CacheEntry
+            revalidated response
+        """
+        entry.stored_at = self._store.refresh(entry.key)
+
+    def size(self):
+        """
+        Total size in bytes of the stored response bodies
+        """
+        return self._store.size()
+
+    def __len__(self):
+        return len(self._store)
+
+    def clear(self):
+        """
+        Removes all stored responses
+        """
+        self._store.clear()
+
+    def close(self):
+        """
+        Closes the cache file
+        """
+        self._store.close()
+
+
+class CacheEntry(object):
+    """
+    Stored response
+    """
+    def __init__(self, key, url, headers, body, etag, last_modified, stored_at, ttl):
+        self.key = key
+        self.url = url
+        self.headers = [tuple(h) for h in headers]
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.ttl = ttl
+
+    def fresh(self):
+        """
+        Tells if the response can be used without revalidating it
+        """
+        return time.time() - self.stored_at < self.ttl
+
+    def validators(self):
+        """
+        Headers making a request conditional on the stored response being outdated
+        """
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def response(self):
+        """
+        The stored response as a response object
+        """
+        return CachedResponse(self)
+
+
+class CachedResponse(object):
+    """
+    Response read from an HTTPCache. Mirrors the parts of the urllib response interface used by
+    emspy.connection.Connection.
+    """
+    def __init__(self, entry):
+        self._entry = entry
+        self._msg = _message(entry.headers)
+        self._fp = io.BytesIO(entry.body)
+        # Seconds spent downloading the body, if it was just received from the API
+        self.download_time = None
+
+    def read(self, amt=None):
+        return self._fp.read(amt) if amt is not None else self._fp.read()
+
+    def close(self):
+        pass
+
+    def getcode(self):
+        return 200
+
+    def geturl(self):
+        return self._entry.url
+
+    def getheaders(self):
+        return list(self._entry.headers)
+
+    def info(self):
+        return self._msg
+
+
+def _message(headers):
+    msg = email.message.Message()
+    for name, value in headers:
+        msg[name] = value
+    return msg
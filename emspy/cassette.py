@@ -0,0 +1,317 @@
+"""
+Record and replay of API traffic.
+
+A Cassette in 'record' mode stores every request sent by a connection together with the
+response, exactly as received (compressed bodies included), in a gzip compressed JSON file. In
+'replay' mode the connection answers requests from the file without any network access, after
+an injected latency, so queries can be run and benchmarked offline with production payloads.
+
+Requests are matched on their method, uri keys, path with uri arguments and body, JSON bodies
+being compared by value rather than by the text a JSON backend wrote. A request
+recorded several times is answered with its recorded responses in order, the last one being
+repeated. Credentials sent to the token endpoint are never written, but the access token it
+returned is; treat cassettes like the data they hold.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import base64
+import collections
+import email.message
+import gzip
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.parse
+
+from . import metrics
+
+MODES = ('record', 'replay')
+
+FORMAT_VERSION = 1
+
+
+class CassetteError(LookupError):
+    """
+    Raised when a request being replayed was not recorded
+    """
+    pass
+
+
+class Cassette(object):
+    """
+    File of recorded requests and responses
+    """
+    def __init__(self, path, mode='replay', latency=0.):
+        """
+        Cassette initialization
+
+        Parameters
+        ----------
+        path: str
+            path to the cassette file. It is read in 'replay' mode, and written by save() in
+            'record' mode; recording adds to the interactions of an existing file.
+        mode: str
+            'record' or 'replay' (default 'replay')
+        latency: float, str or callable
+            seconds to wait before each replayed response: a number, 'recorded' to wait as long
+            as the API took to answer when it was recorded, or a callable receiving the
+            Interaction and returning the seconds (default 0)
+        """
+        if mode not in MODES:
+            raise ValueError("mode must be one of %s. Found: %s" % (MODES, mode))
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.latency = latency
+        self.interactions = []
+        self._index = collections.defaultdict(list)
+        self._played = collections.Counter()
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            self.load()
+        elif mode == 'replay':
+            raise IOError("Cassette file not found: %s" % self.path)
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @staticmethod
+    def key(method, url, data=None, uri_keys=None):
+        """
+        Key matching a request with its recorded responses
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        if uri_keys is not None and tuple(uri_keys) == ('sys', 'auth'):
+            # Never match on, or store, credentials
+            data = None
+        return method, tuple(uri_keys) if uri_keys is not None else None, path, _canonical(data)
+
+    def play(self, method, url, data=None, uri_keys=None):
+        """
+        Finds the next recorded response to a request
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            request url
+        data: bytes
+            request body
+        uri_keys: tuple
+            request uri keys
+
+        Returns
+        -------
+        Interaction
+            the recorded request and response
+
+        Raises
+        ------
+        CassetteError
+            if the request was not recorded
+        """
+        key = self.key(method, url, data, uri_keys)
+        with self._lock:
+            recorded = self._index.get(key)
+            if not recorded:
+                raise CassetteError("No recorded response to %s %s in %s"
+                                    % (method, key[2], self.path))
+            n = self._played[key]
+            self._played[key] += 1
+        return recorded[min(n, len(recorded) - 1)]
+
+    def delay(self, interaction):
+        """
+        Seconds to wait before replaying a response
+        """
+        if callable(self.latency):
+            return self.latency(interaction)
+        if self.latency == 'recorded':
+            return interaction.elapsed
+        return self.latency
+
+    def record(self, method, url, data, uri_keys, response, started):
+        """
+        Reads a response received from the API and records it
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            request url
+        data: bytes
+            request body
+        uri_keys: tuple
+            request uri keys
+        response: object
+            urllib-like response, or the urllib.error.HTTPError raised for it
+        started: float
+            emspy.metrics.clock() reading when the request was sent
+
+        Returns
+        -------
+        ReplayResponse
+            the response, which has been read from the API
+
+        Raises
+        ------
+        urllib.error.HTTPError
+            if the response is an error
+        """
+        read_started = metrics.clock()
+        body = response.read()
+        now = metrics.clock()
+        key = self.key(method, url, data, uri_keys)
+        interaction = Interaction(key, response.getcode(), getattr(response, 'reason', None),
+                                  list(response.info().items()), body, now - started, url)
+        with self._lock:
+            self.interactions.append(interaction)
+            self._index[key].append(interaction)
+        return interaction.response(download_time=now - read_started)
+
+    def rewind(self):
+        """
+        Replays the recorded responses from the first one again
+        """
+        with self._lock:
+            self._played.clear()
+
+    def load(self):
+        """
+        Reads the interactions stored in the cassette file
+        """
+        with gzip.open(self.path, 'rb') as f:
+            stored = json.loads(f.read().decode('utf-8'))
+        if stored.get('version') != FORMAT_VERSION:
+            raise ValueError("Unsupported cassette version %s in %s"
+                             % (stored.get('version'), self.path))
+        with self._lock:
+            for item in stored['interactions']:
+                interaction = Interaction.from_dict(item)
+                self.interactions.append(interaction)
+                self._index[interaction.key].append(interaction)
+
+    def save(self):
+        """
+        Writes the recorded interactions to the cassette file
+        """
+        with self._lock:
+            stored = {'version': FORMAT_VERSION,
+                      'interactions': [i.to_dict() for i in self.interactions]}
+        with gzip.open(self.path, 'wb') as f:
+            f.write(json.dumps(stored).encode('utf-8'))
+
+    def __len__(self):
+        return len(self.interactions)
+
+
+class Interaction(object):
+    """
+    Recorded request and response
+    """
+    def __init__(self, key, status, reason, headers, body, elapsed, url=None):
+        self.key = key
+        self.status = status
+        self.reason = reason
+        self.headers = [tuple(h) for h in headers]
+        self.body = body
+        # Seconds the API took to send the whole response
+        self.elapsed = elapsed
+        self.url = url
+
+    def response(self, url=None, download_time=None):
+        """
+        The recorded response as a response object, as returned by the transports
+
+        Parameters
+        ----------
+        url: str
+            url of the replayed request (default None, the recorded url)
+        download_time: float
+            seconds spent reading the body, if it was just received from the API (default None)
+
+        Raises
+        ------
+        urllib.error.HTTPError
+            if the recorded response is an error
+        """
+        response = ReplayResponse(self, url or self.url)
+        response.download_time = download_time
+        if self.status >= 400:
+            raise urllib.error.HTTPError(response.geturl(), self.status, self.reason,
+                                         response.info(), response)
+        return response
+
+    def to_dict(self):
+        method, uri_keys, path, data = self.key
+        return {'method': method, 'uri_keys': uri_keys, 'path': path, 'data': data,
+                'status': self.status, 'reason': self.reason, 'headers': self.headers,
+                'body': base64.b64encode(self.body).decode('ascii'), 'elapsed': self.elapsed}
+
+    @classmethod
+    def from_dict(cls, item):
+        uri_keys = tuple(item['uri_keys']) if item['uri_keys'] is not None else None
+        key = (item['method'], uri_keys, item['path'], _canonical(item['data']))
+        return cls(key, item['status'], item['reason'], item['headers'],
+                   base64.b64decode(item['body']), item['elapsed'])
+
+
+class ReplayResponse(object):
+    """
+    Response replayed from a Cassette. Mirrors the parts of the urllib response interface used
+    by emspy.connection.Connection.
+    """
+    def __init__(self, interaction, url):
+        self._interaction = interaction
+        self._url = url
+        self._msg = email.message.Message()
+        for name, value in interaction.headers:
+            self._msg[name] = value
+        self._fp = io.BytesIO(interaction.body)
+        self.status = interaction.status
+        self.reason = interaction.reason
+        # Seconds spent downloading the body, if it was just received from the API
+        self.download_time = None
+
+    def read(self, amt=None):
+        return self._fp.read(amt) if amt is not None else self._fp.read()
+
+    def close(self):
+        pass
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self._url
+
+    def getheaders(self):
+        return list(self._interaction.headers)
+
+    def info(self):
+        return self._msg
+
+    @property
+    def headers(self):
+        return self._msg
+
+
+def _canonical(data):
+    # Request body as text. JSON bodies are rewritten with sorted keys and no spaces, so that
+    # bodies written by different JSON backends (emspy.codec) match.
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    try:
+        value = json.loads(data)
+    except ValueError:
+        return data
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
@@ -0,0 +1,160 @@
+"""
+JSON codecs used by the connection layer to encode request bodies and decode responses.
+
+The fastest installed backend is used by default: orjson, then ujson, then the standard library
+json module. Values a fast backend cannot handle are passed to the standard library instead, so
+the choice of backend never changes what can be sent or received.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+from collections import OrderedDict
+import json
+
+
+class JSONCodec(object):
+    """
+    JSON encoder/decoder pair
+    """
+    def __init__(self, name, dumps, loads):
+        """
+        Codec initialization
+
+        Parameters
+        ----------
+        name: str
+            backend name
+        dumps: callable
+            function serializing an object to UTF-8 encoded JSON bytes
+        loads: callable
+            function deserializing JSON bytes or str
+        """
+        self.name = name
+        self._dumps = dumps
+        self._loads = loads
+
+    def dumps(self, obj):
+        """
+        Serializes an object to UTF-8 encoded JSON
+
+        Parameters
+        ----------
+        obj: object
+            object to serialize
+
+        Returns
+        -------
+        bytes
+            JSON document
+        """
+        try:
+            return self._dumps(obj)
+        except (TypeError, OverflowError):
+            if self._dumps is _json_dumps:
+                raise
+            return _json_dumps(obj)
+
+    def loads(self, s):
+        """
+        Deserializes a JSON document
+
+        Parameters
+        ----------
+        s: bytes or str
+            JSON document
+
+        Returns
+        -------
+        object
+            deserialized document
+        """
+        try:
+            return self._loads(s)
+        except (ValueError, OverflowError):
+            if self._loads is json.loads:
+                raise
+            return json.loads(s)
+
+    def __repr__(self):
+        return "JSONCodec(%r)" % self.name
+
+
+def _json_dumps(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json():
+    return JSONCodec('json', _json_dumps, json.loads)
+
+
+def _orjson():
+    import orjson
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=option)
+    return JSONCodec('orjson', dumps, orjson.loads)
+
+
+def _ujson():
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(obj).encode('utf-8')
+    return JSONCodec('ujson', dumps, ujson.loads)
+
+
+backends = OrderedDict([
+    ('orjson', _orjson),
+    ('ujson', _ujson),
+    ('json', _json)
+])
+
+
+def available():
+    """
+    Names of the JSON backends that can be imported, fastest first
+
+    Returns
+    -------
+    list
+        backend names
+    """
+    names = []
+    for name, factory in backends.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_codec(codec=None):
+    """
+    Returns a JSON codec
+
+    Parameters
+    ----------
+    codec: str or JSONCodec
+        backend name from emspy.codec.backends, or a codec object which is returned as is.
+        If None, the fastest available backend is used. (default None)
+
+    Returns
+    -------
+    JSONCodec
+        the codec
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec is not None:
+        if codec not in backends:
+            raise ValueError("Unknown JSON backend '%s'. Use one of %s."
+                             % (codec, list(backends.keys())))
+        return backends[codec]()
+    for factory in backends.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
@@ -64,3 +64,38 @@ uris = {
         'analytic_set': '/v2/ems-systems/%s/analytic-set-groups/%s/analytic-sets/%s',  # (emsSystemId, groupId, analyticSetName)
     }
 }
+
+# Default (connect, read) timeouts in seconds of each endpoint family. None disables a timeout.
+# Override them with the timeouts argument of emspy.Connection.
+timeouts = {
+    'auth': (10., 30.),
+    'metadata': (10., 60.),
+    'field': (10., None),  # fields and their key-value maps, which can take very long
+    'query': (10., 300.),  # synchronous queries and opening async-queries
+    'async_read': (10., 300.),  # reading pages of async-queries
+    'analytic': (10., 300.)  # time-series and profile result queries
+}
+
+# Endpoint family of each of the uris above. Uris not listed here are 'metadata' endpoints.
+endpoint_families = {
+    ('sys', 'auth'): 'auth',
+    ('database', 'field'): 'field',
+    ('database', 'query'): 'query',
+    ('database', 'create'): 'query',
+    ('database', 'open_asyncq'): 'query',
+    ('database', 'get_asyncq'): 'async_read',
+    ('analytic', 'query'): 'analytic',
+    ('profile', 'profile_results'): 'analytic'
+}
+
+# HTTP methods which leave the server in the same state however many times they are sent
+idempotent_methods = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# POST endpoints which only read data. Like GET requests, identical concurrent requests to them
+# share one response.
+read_only_posts = {
+    ('analytic', 'search'),
+    ('analytic', 'query'),
+    ('database', 'query'),
+    ('profile', 'profile_results')
+}
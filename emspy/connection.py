@@ -10,15 +10,31 @@ if sys.version_info < (3, 0):
 from builtins import object
 import gzip
 import io
-import json
+import socket
 import ssl
+import threading
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
 
 from numbers import Number
+from future.utils import string_types
 import pprint as pp
+from . import cache as http_cache
+from . import codec
 from . import common
+from . import jsonstream
+from . import metrics
+from . import retry
+from .singleflight import SingleFlight
+from .transport import get_transport
+
+
+class DeadlineExceeded(socket.timeout):
+    """
+    Raised when a request cannot be completed before its deadline
+    """
 
 
 class Connection(object):
@@ -26,7 +42,10 @@ class Connection(object):
     Object for connection to EMS API
     """
     def __init__(self, user=None, pwd=None, proxies=None, verbose=False, ignore_ssl_errors=False,
-                 server="prod", server_url=None, max_trials=3):
+                 server="prod", server_url=None, max_trials=3, pool_size=None,
+                 pool_idle_timeout=60, json_codec=None, retry_policy=None, token_refresh_margin=60,
+                 metrics=None, timeouts=None, cache=None, coalesce=True, limiter=None,
+                 cassette=None, transport=None):
         """
         Connection initialization
 
@@ -47,7 +66,42 @@ class Connection(object):
         server_url: str
             hostname for server to connect to if different from any of the common values
         max_trials: int
-            maximum number of reconnection attempts
+            maximum number of consecutive reconnection attempts
+        pool_size: int
+            if given, requests are sent over a pool of keep-alive connections holding up to this
+            many idle connections per host, instead of opening a new connection per request
+            (default None)
+        pool_idle_timeout: float
+            seconds an idle pooled connection is kept before it is discarded (default 60)
+        json_codec: str or emspy.codec.JSONCodec
+            JSON backend used to encode requests and decode responses, one of
+            emspy.codec.backends. If None, the fastest installed backend is used. (default None)
+        retry_policy: emspy.retry.RetryPolicy
+            decides which failed requests are sent again and how long to wait before. If None,
+            the default emspy.retry.RetryPolicy is used. (default None)
+        token_refresh_margin: float
+            the access token is refreshed this many seconds before it expires (default 60)
+        metrics: emspy.metrics.MetricsRegistry
+            if given, every request is recorded in this registry (default None)
+        timeouts: dict
+            (connect, read) timeouts in seconds overriding emspy.common.timeouts for some endpoint
+            families, e.g. {'async_read': (10, 600)}. A single number sets both. (default None)
+        cache: str or emspy.cache.HTTPCache
+            cache for the responses of metadata endpoints, or the path of its file
+            (default None, no caching)
+        coalesce: bool
+            identical GET requests (and POST requests to emspy.common.read_only_posts) made
+            while one of them is in flight wait for it and share its response (default True)
+        limiter: emspy.ratelimit.RequestLimiter
+            rate limits and in-flight caps per endpoint family applied to the requests of this
+            connection, and of any other connection sharing the limiter (default None)
+        cassette: emspy.cassette.Cassette
+            if given, requests and responses are recorded in the cassette, or replayed from it
+            without network access, depending on its mode (default None)
+        transport: str or emspy.transport.Transport
+            sends the requests: a backend name from emspy.transport.backends ('pooled',
+            'urllib' or 'fake') or a transport object. If None, 'pooled' is used if a pool_size
+            is given and 'urllib' otherwise. (default None)
         """
         self.__user = user
         self.__pwd = pwd
@@ -55,9 +109,37 @@ class Connection(object):
         self.__ntrials = 0
         self.__max_trials = max_trials
         self._uri_root = None
-        self.__ignore_ssl_errors = ignore_ssl_errors
         self.token = None
         self.token_type = None
+        self.token_expires_at = None
+        self.token_refresh_margin = token_refresh_margin
+        # Serializes token refreshes so that threads sharing this connection refresh it once.
+        self._token_lock = threading.RLock()
+        # Handles of the async-queries opened through this connection and not closed yet
+        self._async_queries = []
+        self._async_queries_lock = threading.Lock()
+        # Callables receiving an emspy.metrics.RequestEvent before each request is sent and after
+        # it completed or failed
+        self.before_request_hooks = []
+        self.after_request_hooks = []
+        if metrics is not None:
+            self.after_request_hooks.append(metrics.observe_request)
+        self._single_flight = SingleFlight() if coalesce else None
+        self._limiter = limiter
+        self._cassette = cassette
+        self._owns_cache = isinstance(cache, string_types)
+        self._cache = http_cache.HTTPCache(cache) if self._owns_cache else cache
+        self._timeouts = dict(common.timeouts)
+        for family, timeout in (timeouts or {}).items():
+            if family not in common.timeouts:
+                raise ValueError("Unknown endpoint family '%s'. Use one of %s."
+                                 % (family, sorted(common.timeouts)))
+            self._timeouts[family] = timeout if isinstance(timeout, (tuple, list)) \
+                else (timeout, timeout)
+        self._codec = codec.get_codec(json_codec)
+        self._retry_policy = retry_policy if retry_policy is not None else retry.RetryPolicy()
+        self._transport = get_transport(transport, pool_size, pool_idle_timeout, proxies,
+                                        ignore_ssl_errors)
 
         # We assign the uri root to a member variable up front, and use that everywhere to
         # simplify. In order to use an alternate uri root, it must be specified in the constructor.
@@ -96,10 +178,37 @@ class Connection(object):
         content: dict
             response content
         """
-        if proxies is not None:
-            proxy_handler = urllib.request.ProxyHandler(proxies)
-            opener = urllib.request.build_opener(proxy_handler, urllib.request.HTTPHandler)
-            urllib.request.install_opener(opener)
+        resp_h, content = self.request(verbose=verbose, **self._auth_request(user, pwd, proxies))
+        self._set_token(content)
+        return resp_h, content
+
+    def reconnect(self, verbose=False):
+        """
+        Method to attempt reconnection to the API
+
+        Parameters
+        ----------
+        verbose: bool
+            verbose output (default False)
+
+        Returns
+        -------
+        resp_h: list
+            response headers
+        content: dict
+            response content
+        """
+        user, pwd, proxies = self._reconnect_credentials()
+        return self.connect(user, pwd, proxies, verbose)
+
+    def _auth_request(self, user, pwd, proxies=None):
+        # Remember the credentials for reconnection and build the keyword arguments of the
+        # token request.
+        self.__user = user
+        self.__pwd = pwd
+        if proxies is not None and proxies != self.__proxies:
+            self._transport.set_proxies(proxies)
+        self.__proxies = proxies
 
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
@@ -110,53 +219,88 @@ class Connection(object):
             'username': user,
             'password': pwd
         }
+        return dict(rtype="POST", uri_keys=('sys', 'auth'), data=data, headers=headers,
+                    proxies=proxies)
 
-        resp_h, content = self.request(
-            rtype="POST",
-            uri_keys=('sys', 'auth'),
-            data=data,
-            headers=headers,
-            proxies=proxies,
-            verbose=verbose
-        )
-
+    def _set_token(self, content):
         # Add error handling --
 
         # Get the token
         self.token = content['access_token']
         self.token_type = content['token_type']
-        return resp_h, content
+        expires_in = content.get('expires_in')
+        self.token_expires_at = time.time() + float(expires_in) if expires_in is not None else None
+        self.__ntrials = 0
 
-    def reconnect(self, verbose=False):
+    def token_expiring(self):
         """
-        Method to attempt reconnection to the API
+        Tells if the access token expires within token_refresh_margin seconds
 
-        Parameters
-        ----------
-        verbose: bool
-            verbose output (default False)
+        Returns
+        -------
+        bool
+            True if the token should be refreshed before it is used. Always False if the
+            server did not tell when the token expires.
+        """
+        return (self.token_expires_at is not None
+                and time.time() >= self.token_expires_at - self.token_refresh_margin)
+
+    @property
+    def user(self):
+        """
+        User name the connection authenticates as
+        """
+        return self.__user
+
+    @property
+    def open_async_queries(self):
+        """
+        Handles of the async-queries opened through this connection which are not closed yet,
+        oldest first. Async-queries hold server resources until they are closed or expire.
 
         Returns
         -------
-        resp_h: list
-            response headers
-        content: dict
-            response content
+        list
+            emspy.query.asyncquery.AsyncQuery objects
         """
+        with self._async_queries_lock:
+            return list(self._async_queries)
+
+    def _track_async_query(self, handle):
+        with self._async_queries_lock:
+            self._async_queries.append(handle)
+
+    def _untrack_async_query(self, handle):
+        with self._async_queries_lock:
+            if handle in self._async_queries:
+                self._async_queries.remove(handle)
+
+    def _authorization(self):
+        return ' '.join([self.token_type, self.token])
+
+    def _refresh_token(self, stale_authorization):
+        # Reconnects unless another thread has already replaced the token that was found stale.
+        with self._token_lock:
+            if self._authorization() != stale_authorization:
+                return
+            self.reconnect()
+
+    def _reconnect_credentials(self):
         if self.__ntrials >= self.__max_trials:
-            sys.exit("Stop trying to reconnect EMS API after %d trials" % self.__ntrials)
+            raise RuntimeError("Stop trying to reconnect EMS API after %d trials" % self.__ntrials)
         self.__ntrials += 1
-        return self.connect(self.__user, self.__pwd, self.__proxies, verbose)
+        return self.__user, self.__pwd, self.__proxies
 
     def request(self, rtype="GET", uri=None, uri_keys=None, uri_args=None, headers=None,
-                body=None, data=None, jsondata=None, proxies=None, verbose=False):
+                body=None, data=None, jsondata=None, proxies=None, verbose=False, stream=False,
+                deadline=None):
         """
         Method to send a HTTP request to the API
 
         Parameters
         ----------
         rtype: str
-            request type (UNUSED)
+            request type. GET requests with data are sent as POST requests.
         uri: str
             request uri
         uri_keys: tuple
@@ -175,6 +319,15 @@ class Connection(object):
             proxies to use in request (UNUSED)
         verbose: bool
             verbose output (default False)
+        stream: bool
+            if True, the response is decompressed and parsed incrementally while it is read.
+            A 'rows' array in the response is returned as an iterator which reads rows from the
+            connection as they are consumed; members that follow the rows are added to the
+            content once the iterator is exhausted. (default False)
+        deadline: float
+            time, as given by time.time(), by which the request must have completed, retries
+            included. The connect and read timeouts of each attempt are shortened to the time
+            left. With stream=True, reading the rows is not bound by the deadline. (default None)
 
         Returns
         -------
@@ -182,11 +335,237 @@ class Connection(object):
             response headers
         content: dict
             response content
+
+        Raises
+        ------
+        DeadlineExceeded
+            if the deadline passed before a response was received
         """
+        if headers is None and self.token_expiring():
+            self._refresh_token(self._authorization())
+        request = self._prepare_request(rtype, uri, uri_keys, uri_args, headers, body, data,
+                                        jsondata)
+        key = self._coalesce_key(request, uri_keys, stream)
+        if key is None:
+            return self.__request(request, uri_keys, verbose, stream, deadline)
+        return self._single_flight.do(key, self.__request, request, uri_keys, verbose, stream,
+                                      deadline)
+
+    def __request(self, request, uri_keys, verbose=False, stream=False, deadline=None):
+        # Sends a prepared request and decodes the response
+        event = self._before_request(request, uri_keys)
+        cache_key, cached = self._cache_lookup(request, uri_keys, event, stream)
+        family, limited, held = self._family(uri_keys), False, None
+        try:
+            if event.cache == 'hit':
+                started = metrics.clock()
+                response = cached.response()
+            else:
+                if self._limiter is not None:
+                    self._limiter.acquire(family, deadline)
+                    limited = True
+                started, response = self.__send_with_retries(request, uri_keys, event, deadline)
+                if limited and stream:
+                    # A streamed body is downloaded while its rows are read, after this
+                    # returns: the in-flight slot is held until then.
+                    response = held = _SlotResponse(response, self._limiter, family)
+                    limited = False
+            if cache_key is not None:
+                response = self._cache_response(response, cache_key, cached, event)
+            content = self._read_content(response, event, metrics.clock() - started, stream)
+            held = None
+        except Exception as exc:
+            event.error = exc
+            raise
+        finally:
+            if limited:
+                self._limiter.release(family)
+            if held is not None:
+                held.close()
+            self._after_request(event)
+
+        status_code = response.getcode()
+        if status_code != 200:
+            print("HTTP status code: %d" % status_code)
+            verbose = True
+        response_headers = response.getheaders()
+
+        if verbose:
+            print("URL: %s" % response.geturl())
+            pp.pprint(response_headers)
+            pp.pprint(content)
+
+        return response_headers, content
+
+    def _coalesce_key(self, request, uri_keys, stream=False):
+        # Requests with the same key can share a response; None if the request must be sent
+        # on its own. Streamed responses can only be consumed once.
+        if self._single_flight is None or stream:
+            return None
+        method = request.get_method()
+        if method != 'GET' and (uri_keys is None or tuple(uri_keys) not in common.read_only_posts):
+            return None
+        return method, request.full_url, request.data, request.get_header('Authorization')
+
+    def __send_with_retries(self, request, uri_keys, event, deadline=None):
+        # Sends the request until it succeeds or the retry policy gives up. Returns the clock
+        # reading when the successful attempt started and its response.
+        attempt, reauthenticated = 0, False
+        while True:
+            if self._limiter is not None:
+                self._limiter.throttle(self._family(uri_keys), deadline)
+            timeout = self._timeout(uri_keys, deadline)
+            try:
+                event.attempts += 1
+                started = metrics.clock()
+                return started, self.__send_request(request, timeout, uri_keys)
+            except Exception as exc:
+                action = self._retry_action(exc, attempt, uri_keys, request, reauthenticated)
+                if action is None:
+                    raise
+                if action == retry.REAUTHENTICATE:
+                    print("Trying to reconnect the EMS API.")
+                    self._refresh_token(request.get_header('Authorization'))
+                    self._authorize(request)
+                    print("Done.")
+                    reauthenticated = True
+                else:
+                    time.sleep(self._retry_delay(exc, attempt, deadline))
+                    attempt += 1
+
+    def _before_request(self, request, uri_keys):
+        event = metrics.RequestEvent(request.get_method(), request.full_url, uri_keys)
+        for hook in self.before_request_hooks:
+            hook(event)
+        return event
+
+    def _after_request(self, event):
+        if event.status is None and isinstance(event.error, urllib.error.HTTPError):
+            event.status = event.error.code
+        event.timings['total'] = metrics.clock() - event.started
+        for hook in self.after_request_hooks:
+            hook(event)
+
+    def _cache_lookup(self, request, uri_keys, event, stream=False):
+        # Returns the cache key and stored response of a cached request, (None, None) otherwise.
+        # Stale responses with validators make the request conditional.
+        if self._cache is None or stream or not self._cache.cacheable(request.get_method(),
+                                                                      uri_keys):
+            return None, None
+        key = self._cache.key(request.full_url, self.__user)
+        cached = self._cache.get(key)
+        if cached is None:
+            event.cache = 'miss'
+        elif cached.fresh():
+            event.cache = 'hit'
+        else:
+            for name, value in cached.validators().items():
+                request.add_header(name, value)
+        return key, cached
+
+    def _cache_response(self, response, key, cached, event):
+        # Stores a new response in the cache, or refreshes the stored one if the API confirmed
+        # it did not change. Returns the response to decode.
+        if event.cache == 'hit':
+            return response
+        if response.getcode() == 304 and cached is not None:
+            response.read()
+            self._cache.refresh(cached)
+            event.cache = 'revalidated'
+            return cached.response()
+        event.cache = 'miss'
+        started = metrics.clock()
+        raw = response.read()
+        download_time = metrics.clock() - started
+        if response.getcode() != 200:
+            return http_cache.CacheEntry(key, response.geturl(), response.getheaders(), raw,
+                                         None, None, 0, 0).response()
+        response = self._cache.store(key, response.geturl(), response.getheaders(), raw).response()
+        response.download_time = download_time
+        return response
+
+    def _read_content(self, response, event, elapsed, stream=False):
+        # Reads and decodes the response body, recording the time spent in each phase.
+        # Transports which read the whole body while sending report it as download_time.
+        event.status = response.getcode()
+        connect = getattr(response, 'connect_time', None)
+        download = getattr(response, 'download_time', None) or 0.
+        event.timings['connect'] = connect
+        event.timings['ttfb'] = elapsed - (connect or 0.) - download
+        encoding = response.info().get('Content-Encoding')
+        if stream:
+            return jsonstream.load(response, encoding, iter_key='rows')
+
+        started = metrics.clock()
+        raw = response.read()
+        event.timings['download'] = download + metrics.clock() - started
+        event.bytes_wire = len(raw)
+        started = metrics.clock()
+        raw = _decompress(raw, encoding)
+        event.timings['decompress'] = metrics.clock() - started
+        event.bytes_decoded = len(raw)
+        started = metrics.clock()
+        content = self._codec.loads(raw)
+        event.timings['parse'] = metrics.clock() - started
+        return content
+
+    def _retry_action(self, exc, attempt, uri_keys, request, reauthenticated):
+        # Asks the retry policy what to do about a failed request and reports the error if it
+        # is given up on.
+        action = self._retry_policy.action(exc, attempt, uri_keys, reauthenticated,
+                                           request.get_method())
+        if action == retry.REAUTHENTICATE and not request.has_header('Authorization'):
+            # The token request itself was rejected.
+            action = None
+        if action is None:
+            _report_request_error(exc, request.full_url)
+        elif isinstance(exc, urllib.error.HTTPError):
+            # Nothing is done with the error body; close it so the connection is released.
+            exc.close()
+        return action
+
+    @staticmethod
+    def _family(uri_keys):
+        # Endpoint family of a request, see emspy.common.endpoint_families
+        if uri_keys is None:
+            return 'metadata'
+        return common.endpoint_families.get(tuple(uri_keys), 'metadata')
+
+    def _timeout(self, uri_keys, deadline=None):
+        # (connect, read) timeouts of the endpoint family, capped at the time left before the
+        # deadline.
+        connect, read = self._timeouts[self._family(uri_keys)]
+        if deadline is None:
+            return connect, read
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded("The deadline of the request to '%s' has passed."
+                                   % '/'.join(uri_keys or ('other',)))
+        return (min(connect, remaining) if connect is not None else remaining,
+                min(read, remaining) if read is not None else remaining)
+
+    def _retry_delay(self, exc, attempt, deadline=None):
+        delay = self._retry_policy.backoff(attempt, exc)
+        if deadline is not None:
+            # Do not sleep past the deadline; the next attempt then raises DeadlineExceeded.
+            delay = max(0., min(delay, deadline - time.time()))
+        print("Request failed (%s). Retrying in %.1f seconds (%d/%d)."
+              % (exc, delay, attempt + 1, self._retry_policy.max_retries))
+        return delay
+
+    def _authorize(self, request):
+        if request.has_header('Authorization'):
+            request.add_header('Authorization', self._authorization())
+
+    def _prepare_request(self, rtype="GET", uri=None, uri_keys=None, uri_args=None, headers=None,
+                         body=None, data=None, jsondata=None):
+        # Builds the urllib request object sent by request(). Unless another method than GET is
+        # given, urllib infers the method from the presence of data.
+
         # If no custom headers are given, use our own
         if headers is None:
             headers = {
-                'Authorization': ' '.join([self.token_type, self.token]),
+                'Authorization': self._authorization(),
                 'Accept-Encoding': 'gzip',
                 'User-Agent': common.user_agent
             }
@@ -222,75 +601,114 @@ class Connection(object):
 
         if jsondata is not None:
             headers['Content-Type'] = 'application/json'
-            data = json.dumps(jsondata).encode('utf-8')
-
-        # uri = uri.encode('utf-8')
-        request = urllib.request.Request(uri, data=data, headers=headers)
-        try:
-            response = self.__send_request(request)
-            status_code = response.getcode()
-            if status_code != 200:
-                print("HTTP status code: %d" % status_code)
-                verbose = True
-        except:
-            (exc_type, exc_value, exc_trace) = sys.exc_info()
-            if exc_type is ssl.CertificateError:
-                print("A certificate verification error occurred for the request to '%s'. "
-                      "Certificate verification is required by default, but can be disabled by "
-                      "using the ignore_ssl_errors argument for the Connection constructor." % uri)
-                raise
-            if exc_type is urllib.error.HTTPError:
-                message_bytes = exc_value.read()
-                message_str = message_bytes.decode('utf-8')
-                print(exc_value.msg + '\n Details: ' + message_str)
-                raise
-
-            print("Trying to reconnect the EMS API.")
-            self.reconnect()
-            print("Done.")
-            response = self.__send_request(request)
-        response_headers = response.getheaders()
+            data = self._codec.dumps(jsondata)
 
-        # If the response is compressed, decompress it.
-        if response.info().get('Content-Encoding') == 'gzip':
-            buffer = io.BytesIO(response.read())
-            file = gzip.GzipFile(fileobj=buffer)
-            content = json.loads(file.read())
-        else:
-            content = json.loads(response.read())
+        method = rtype if rtype not in (None, "GET") else None
+        return urllib.request.Request(uri, data=data, headers=headers, method=method)
 
-        if verbose:
-            print("URL: %s" % response.geturl())
-            pp.pprint(response_headers)
-            pp.pprint(content)
-
-        return response_headers, content
-
-    def __send_request(self, req):
+    def __send_request(self, req, timeout=(None, None), uri_keys=None):
         """
-        Sends the request and returns the response, optionally ignoring ssl errors.
+        Sends the request over the transport and returns the response. With a cassette, the
+        response is replayed from it or recorded in it.
 
         Parameters
         ----------
         req: urllib.request.Request
             request object
+        timeout: tuple
+            (connect, read) timeouts in seconds
+        uri_keys: tuple
+            request uri keys
 
         Returns
         -------
         request: urllib.request.Request
             request object
         """
-        # Normally you do NOT want to ignore SSL errors, but this is
-        # sometimes necessary on beta API endpoints without a proper cert.
-        # TODO: Find a real fix for GE Mac OS machines that are having trouble verifying.
-        if self.__ignore_ssl_errors:
-            try:
-                request = urllib.request.urlopen(req, context=None)
-            except urllib.error.URLError:
-                request = urllib.request.urlopen(req, context=ssl._create_unverified_context())
-        else:
-            request = urllib.request.urlopen(req, context=None)
-        return request
+        if self._cassette is None:
+            return self.__send(req, timeout)
+        if not self._cassette.recording:
+            interaction = self._cassette.play(req.get_method(), req.full_url, req.data, uri_keys)
+            time.sleep(self._cassette.delay(interaction))
+            return interaction.response(req.full_url)
+        started = metrics.clock()
+        try:
+            response = self.__send(req, timeout)
+        except urllib.error.HTTPError as exc:
+            response = exc
+        return self._cassette.record(req.get_method(), req.full_url, req.data, uri_keys,
+                                     response, started)
+
+    def __send(self, req, timeout):
+        return self._transport.send(req.get_method(), req.full_url, req.data,
+                                    dict(req.header_items()), timeout)
+
+    def close(self):
+        """
+        Closes the async-queries still open, any pooled connections held by this object, and the
+        response cache if it was opened from a path. A cassette being recorded is saved.
+
+        Returns
+        -------
+        None
+        """
+        for handle in self.open_async_queries:
+            handle.close()
+        self._transport.close()
+        if self._owns_cache:
+            self._cache.close()
+        if self._cassette is not None and self._cassette.recording:
+            self._cassette.save()
+
+
+class _SlotResponse(object):
+    # Response holding an in-flight slot of a RequestLimiter, freed once the body is read to
+    # the end or the response is closed.
+    def __init__(self, response, limiter, family):
+        self._response = response
+        self._limiter = limiter
+        self._family = family
+
+    def read(self, amt=None):
+        data = self._response.read() if amt is None else self._response.read(amt)
+        if not data or amt is None:
+            self.__release()
+        return data
+
+    def close(self):
+        self.__release()
+        self._response.close()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __release(self):
+        limiter, self._limiter = self._limiter, None
+        if limiter is not None:
+            limiter.release(self._family)
+
+
+def _report_request_error(exc, uri):
+    if isinstance(exc, urllib.error.URLError) and isinstance(exc.reason, ssl.CertificateError):
+        exc = exc.reason
+    if isinstance(exc, ssl.CertificateError):
+        print("A certificate verification error occurred for the request to '%s'. "
+              "Certificate verification is required by default, but can be disabled by "
+              "using the ignore_ssl_errors argument for the Connection constructor." % uri)
+    elif isinstance(exc, urllib.error.HTTPError):
+        headers = exc.headers if hasattr(exc.headers, 'get') else {}
+        message_bytes = _decompress(exc.read(), headers.get('Content-Encoding'))
+        message_str = message_bytes.decode('utf-8')
+        print(exc.msg + '\n Details: ' + message_str)
+
+
+def _decompress(raw, encoding=None):
+    # If the response is compressed, decompress it.
+    if encoding == 'gzip':
+        buffer = io.BytesIO(raw)
+        file = gzip.GzipFile(fileobj=buffer)
+        raw = file.read()
+    return raw
 
 
 def _print_resp(resp):
@@ -0,0 +1,202 @@
+"""
+Incremental decoding of (gzip compressed) JSON responses.
+
+The response body is inflated and parsed chunk by chunk while it is read, so neither the
+compressed nor the decompressed body is ever held in memory as a whole. A top-level array (the
+'rows' of query results) can be handed out as an iterator which parses one item at a time.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import codecs
+import json
+import re
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+def iter_inflate(fp, encoding=None, chunk_size=CHUNK_SIZE):
+    """
+    Reads a response body in chunks, decompressing them if needed
+
+    Parameters
+    ----------
+    fp: file-like
+        object with a read(size) method, e.g. an HTTP response
+    encoding: str
+        Content-Encoding of the body; 'gzip' and 'deflate' are decompressed (default None)
+    chunk_size: int
+        number of bytes read at a time
+
+    Returns
+    -------
+    generator
+        decompressed chunks of bytes
+    """
+    if encoding == 'gzip':
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        inflater = zlib.decompressobj()
+    else:
+        inflater = None
+
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        if inflater is not None:
+            chunk = inflater.decompress(chunk)
+        if chunk:
+            yield chunk
+    if inflater is not None:
+        tail = inflater.flush()
+        if tail:
+            yield tail
+
+
+def load(fp, encoding=None, iter_key=None, chunk_size=CHUNK_SIZE):
+    """
+    Decodes a JSON document while it is read from a file-like object
+
+    Parameters
+    ----------
+    fp: file-like
+        object with a read(size) method, e.g. an HTTP response
+    encoding: str
+        Content-Encoding of the body (default None)
+    iter_key: str
+        if the document is an object with an array under this key, the array is returned as an
+        iterator that parses items as they are consumed. Members following the array are added
+        to the returned dict once the iterator is exhausted. (default None)
+    chunk_size: int
+        number of bytes read at a time
+
+    Returns
+    -------
+    object
+        decoded document. fp is closed once the document is decoded or, if an iterator is
+        returned, once the iterator is exhausted or closed.
+    """
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    text = (utf8.decode(chunk) for chunk in iter_inflate(fp, encoding, chunk_size))
+    reader = _Reader(text, fp)
+    iterating = False
+    try:
+        if iter_key is None or reader.peek() != '{':
+            return json.loads(reader.remainder())
+
+        content = dict()
+        reader.take('{')
+        if reader.peek() == '}':
+            reader.take('}')
+            return content
+        iterating = _load_members(reader, content, iter_key)
+        return content
+    finally:
+        if not iterating:
+            reader.close()
+
+
+def _load_members(reader, content, iter_key=None):
+    # Returns True if the array under iter_key was handed out as an iterator
+    while True:
+        key = reader.value()
+        reader.take(':')
+        if key == iter_key and reader.peek() == '[':
+            reader.take('[')
+            content[key] = _iter_items(reader, content)
+            return True
+        content[key] = reader.value()
+        if reader.take(',}') == '}':
+            return False
+
+
+def _iter_items(reader, content):
+    try:
+        if reader.peek() == ']':
+            reader.take(']')
+        else:
+            while True:
+                yield reader.value()
+                if reader.take(',]') == ']':
+                    break
+        # The rest of the document comes after the array.
+        if reader.take(',}') == ',':
+            _load_members(reader, content)
+    finally:
+        reader.close()
+
+
+class _Reader(object):
+    # Sliding window over a stream of text chunks read from fp.
+    def __init__(self, chunks, fp):
+        self._chunks = chunks
+        self._fp = fp
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def peek(self):
+        # Returns the next non-whitespace character without consuming it ('' at the end).
+        while True:
+            self._pos = _whitespace.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self.__fill():
+                return ''
+
+    def take(self, expected):
+        c = self.peek()
+        if c == '' or c not in expected:
+            raise ValueError("Expecting one of %r at position %d of the JSON stream, found %r."
+                             % (expected, self._pos, c))
+        self._pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self._buf, self._pos)
+                # A number at the very end of the buffer may continue in the next chunk.
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return obj
+            except ValueError:
+                if self._eof:
+                    raise
+            # Grow the window geometrically so large values are not re-parsed many times.
+            self.__fill(len(self._buf) - self._pos)
+
+    def remainder(self):
+        # Consumes the rest of the stream and returns it as a single string.
+        rest = self._buf[self._pos:] + ''.join(self._chunks)
+        self._buf, self._pos, self._eof = '', 0, True
+        return rest
+
+    def close(self):
+        self._fp.close()
+
+    def __fill(self, min_size=0):
+        if self._eof:
+            return False
+        parts = [self._buf[self._pos:]]
+        size = len(parts[0])
+        while True:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._eof = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+            if size > 2 * min_size:
+                break
+        self._buf = ''.join(parts)
+        self._pos = 0
+        return True
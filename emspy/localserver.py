@@ -0,0 +1,577 @@
+"""
+Stand-in EMS API server for offline end-to-end tests and benchmarks.
+
+LocalServer serves the emspy.common.uris endpoints used by the query classes over HTTP on
+localhost, with synthetic flight data of configurable size, so that the whole stack, from
+sockets and gzip to JSON decoding and DataFrame conversion, can be exercised without an EMS
+system:
+
+    with LocalServer(n_flights=100000, latency=0.05) as server:
+        conn = Connection('user', 'pwd', server_url=server.url)
+        query = FltQuery(conn, 'LOCAL')
+
+Any credentials are accepted. Query filters other than dateTimeOnAfter and dateTimeBefore
+filters combined with 'and', ordering and grouping are ignored; a query returns the rows of the
+synthetic flight table in its date range, one flight per hour from 2020-01-01, with its 'top'
+applied. The same row always has the same values. It can also be started from the command line with
+`python -m emspy.localserver --port 8080`, or served from memory, without sockets, by passing
+emspy.transport.FakeTransport(LocalServer().handle) as a connection's transport.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+if sys.version_info < (3, 0):
+    from future import standard_library
+    standard_library.install_aliases()
+
+from builtins import object
+import argparse
+import calendar
+import gzip
+import io
+import itertools
+import json
+import math
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from . import common
+from .transport import _decode_request
+
+EMS_ID = 1
+EMS_NAME = 'LOCAL'
+DATABASE_ID = '[ems-core][entity-type][foqa-flights]'
+DATABASE_NAME = 'FDW Flights'
+PROFILE_ID = 'a7483c44-9db9-4a44-9eb5-f67681ee52b0'
+PROFILE_NAME = 'Local Profile'
+
+# Synchronous database queries return at most this many rows
+MAX_QUERY_ROWS = 25000
+
+_DB_ROOT = '[-hub-][entity-type-group][[--][internal-type-group][root]]'
+_DB_GROUP = '[-hub-][entity-type-group][[ems-core][entity-type-group][foqa]]'
+_FIELD_ROOT = '[-hub-][field-group][[[ems-core][entity-type][foqa-flights]]' \
+              '[[--][internal-field-group][root]]]'
+_FIELD_GROUPS = (('flight-info', 'Flight Information'), ('measurements', 'Measurements'))
+_EPOCH = 1577836800  # 2020-01-01T00:00:00Z
+
+
+class LocalServer(object):
+    """
+    Stand-in EMS API serving synthetic data from a background thread
+    """
+    def __init__(self, host='127.0.0.1', port=0, n_flights=10000, n_measurements=10,
+                 n_discrete_values=50, n_analytics=20, n_samples=3600, latency=0.,
+                 compress=True):
+        """
+        Local server initialization. The server listens once started.
+
+        Parameters
+        ----------
+        host: str
+            interface to listen on (default '127.0.0.1')
+        port: int
+            port to listen on; 0 picks a free port (default 0)
+        n_flights: int
+            number of rows of the flight table (default 10000)
+        n_measurements: int
+            number of numeric fields besides the flight information fields (default 10)
+        n_discrete_values: int
+            number of values of each discrete field (default 50)
+        n_analytics: int
+            number of time-series parameters (default 20)
+        n_samples: int
+            number of one-second samples of each flight's time series (default 3600)
+        latency: float
+            seconds to wait before answering each request (default 0)
+        compress: bool
+            gzip compress responses to clients accepting it (default True)
+        """
+        self.host = host
+        self.port = port
+        self.n_flights = n_flights
+        self.n_discrete_values = n_discrete_values
+        self.n_samples = n_samples
+        self.latency = latency
+        self.compress = compress
+        self.fields = _make_fields(n_measurements)
+        self.analytics = _make_analytics(n_analytics)
+        # Selected field ids, row limit and row range of each open async-query by query id
+        self.async_queries = dict()
+        # Number of requests received per endpoint, e.g. {('database', 'query'): 1}
+        self.requests = dict()
+        # Number of requests being handled, and the largest number handled at the same time
+        self.active = 0
+        self.max_active = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Root url of the server, to pass as Connection(server_url=...)
+        """
+        return 'http://%s:%d/api' % (self.host, self.port)
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        """
+        self._httpd = _ThreadingServer((self.host, self.port), _Handler)
+        self._httpd.api = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving
+        """
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        """
+        Serves in the calling thread until interrupted
+        """
+        self._httpd = _ThreadingServer((self.host, self.port), _Handler)
+        self._httpd.api = self
+        self.port = self._httpd.server_address[1]
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            self._httpd = None
+
+    def handle(self, method, path, query, body):
+        """
+        Answers a request
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            url path
+        query: dict
+            url query parameters
+        body: dict
+            decoded request body
+
+        Returns
+        -------
+        status: int
+            HTTP status code
+        content: object
+            JSON serializable response content
+        """
+        for uri_keys, pattern in _ROUTES:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            handler = _HANDLERS.get(uri_keys)
+            if handler is None:
+                break
+            with self._lock:
+                self.requests[uri_keys] = self.requests.get(uri_keys, 0) + 1
+            args = [urllib.parse.unquote(a) for a in match.groups()]
+            return handler(self, method, args, query, body)
+        return 404, {'message': 'The local server does not implement %s %s' % (method, path)}
+
+    # Synthetic data
+
+    def rows(self, field_ids, start, end):
+        """
+        Rows start to end (inclusive) of the flight table, with the given fields
+        """
+        columns = [self.fields[f] for f in field_ids]
+        return [[self.value(column, i) for column in columns]
+                for i in range(start, min(end + 1, self.n_flights))]
+
+    def value(self, field, i):
+        """
+        Value of a field in row i of the flight table
+        """
+        ftype, n = field['type'], field['index']
+        if field['name'] == 'Flight Record':
+            return i + 1
+        if ftype == 'dateTime':
+            return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(_EPOCH + 3600 * i))
+        if ftype == 'discrete':
+            return (i * 7 + n) % self.n_discrete_values
+        if ftype == 'boolean':
+            return i % 3 != 0
+        if ftype == 'string':
+            return 'N%04d' % (i % 1000)
+        return round(1000. * math.sin(0.01 * i + n), 3)
+
+    def discrete_values(self, field):
+        """
+        Key-value mapping of a discrete field, as returned by the field endpoint
+        """
+        return dict(('%d' % k, '%s %03d' % (field['name'].split()[0], k))
+                    for k in range(self.n_discrete_values))
+
+    def samples(self, analytic, flight, offsets):
+        """
+        Time series of an analytic for a flight at the given offsets
+        """
+        if analytic['name'] == 'Hours of Data (hours)':
+            return [self.n_samples / 3600.] * len(offsets)
+        n = analytic['index']
+        return [round(math.sin(t / 60. + n + flight), 4) for t in offsets]
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.__handle('GET')
+
+    def do_POST(self):
+        self.__handle('POST')
+
+    def do_DELETE(self):
+        self.__handle('DELETE')
+
+    def __handle(self, method):
+        api = self.server.api
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length) if length else None
+        path, query, body = _decode_request(self.path, data, dict(self.headers.items()))
+        with api._lock:
+            api.active += 1
+            api.max_active = max(api.max_active, api.active)
+        try:
+            if api.latency:
+                time.sleep(api.latency)
+            status, content = api.handle(method, path, query, body)
+        finally:
+            with api._lock:
+                api.active -= 1
+
+        payload = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if api.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as f:
+                f.write(payload)
+            payload = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+# Endpoint handlers. Each takes the server, HTTP method, uri arguments, url query parameters and
+# request body, and returns the status code and response content.
+
+def _token(api, method, args, query, body):
+    return 200, {'access_token': 'local-token-%d' % next(api._ids), 'token_type': 'bearer',
+                 'expires_in': 3600}
+
+
+def _ems_systems(api, method, args, query, body):
+    return 200, [{'id': EMS_ID, 'name': EMS_NAME, 'description': 'Local stand-in EMS system'}]
+
+
+def _ems_info(api, method, args, query, body):
+    return 200, {'id': EMS_ID, 'name': EMS_NAME, 'description': 'Local stand-in EMS system'}
+
+
+def _database_groups(api, method, args, query, body):
+    group = query.get('groupId')
+    if group is None:
+        return 200, {'id': _DB_ROOT, 'name': '<root>', 'databases': [],
+                     'groups': [{'id': _DB_GROUP, 'name': 'FDW'}]}
+    if group == _DB_GROUP:
+        return 200, {'id': _DB_GROUP, 'name': 'FDW', 'groups': [],
+                     'databases': [{'id': DATABASE_ID, 'singularName': 'FDW Flight',
+                                    'pluralName': DATABASE_NAME}]}
+    return 404, {'message': 'Unknown database group %s' % group}
+
+
+def _field_groups(api, method, args, query, body):
+    group = query.get('groupId')
+    if group is None:
+        return 200, {'id': _FIELD_ROOT, 'name': '<root>', 'fields': [],
+                     'groups': [{'id': _field_group_id(g), 'name': name}
+                                for g, name in _FIELD_GROUPS]}
+    for g, name in _FIELD_GROUPS:
+        if group == _field_group_id(g):
+            fields = [{'id': f['id'], 'name': f['name'], 'type': f['type']}
+                      for f in api.fields.values() if f['group'] == g]
+            return 200, {'id': group, 'name': name, 'groups': [], 'fields': fields}
+    return 404, {'message': 'Unknown field group %s' % group}
+
+
+def _field(api, method, args, query, body):
+    field = api.fields.get(args[2])
+    if field is None:
+        return 404, {'message': 'Unknown field %s' % args[2]}
+    content = {'id': field['id'], 'name': field['name'], 'type': field['type']}
+    if field['type'] == 'discrete':
+        content['discreteValues'] = api.discrete_values(field)
+    return 200, content
+
+
+def _query_header(api, body):
+    field_ids = [s['fieldId'] for s in body.get('select', [])]
+    unknown = [f for f in field_ids if f not in api.fields]
+    if unknown:
+        return None, (400, {'message': 'Unknown fields %s' % unknown})
+    return field_ids, None
+
+
+def _row_range(api, body):
+    # First and last + 1 rows of the flight table within the date range filters of a query
+    first, stop = 0, api.n_flights
+    filters = [body['filter']] if 'filter' in body else []
+    while filters:
+        fltr = filters.pop()
+        if fltr.get('operator') == 'and':
+            filters += [a['value'] for a in fltr.get('args', []) if a.get('type') == 'filter']
+        elif fltr.get('operator') in ('dateTimeOnAfter', 'dateTimeBefore'):
+            args = fltr['args']
+            if api.fields.get(args[0]['value'], {}).get('type') != 'dateTime':
+                continue
+            row = int(math.ceil((_parse_time(args[1]['value']) - _EPOCH) / 3600.))
+            if fltr['operator'] == 'dateTimeOnAfter':
+                first = max(first, row)
+            else:
+                stop = min(stop, row)
+    return first, max(first, stop)
+
+
+def _parse_time(value):
+    value = value.rstrip('Z')
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(value.split('.')[0], fmt))
+        except ValueError:
+            continue
+    raise ValueError("Unsupported date %s" % value)
+
+
+def _database_query(api, method, args, query, body):
+    field_ids, error = _query_header(api, body)
+    if error:
+        return error
+    first, stop = _row_range(api, body)
+    n_rows = min(body.get('top') or MAX_QUERY_ROWS, MAX_QUERY_ROWS, stop - first)
+    return 200, {'header': [{'id': f, 'name': api.fields[f]['name']} for f in field_ids],
+                 'rows': api.rows(field_ids, first, first + n_rows - 1)}
+
+
+def _open_async_query(api, method, args, query, body):
+    field_ids, error = _query_header(api, body)
+    if error:
+        return error
+    query_id = 'local-query-%d' % next(api._ids)
+    first, stop = _row_range(api, body)
+    with api._lock:
+        api.async_queries[query_id] = (field_ids, body.get('top'), first, stop)
+    return 200, {'id': query_id,
+                 'header': [{'id': f, 'name': api.fields[f]['name']} for f in field_ids]}
+
+
+def _read_async_query(api, method, args, query, body):
+    opened = api.async_queries.get(args[2])
+    if opened is None:
+        return 404, {'message': 'Unknown async-query %s' % args[2]}
+    field_ids, top, first, stop = opened
+    n_rows = min(top or stop - first, stop - first)
+    start, end = int(args[3]), min(int(args[4]), n_rows - 1)
+    return 200, {'rows': api.rows(field_ids, first + start, first + end),
+                 'hasMoreRows': end + 1 < n_rows}
+
+
+def _close_async_query(api, method, args, query, body):
+    with api._lock:
+        api.async_queries.pop(args[2], None)
+    return 200, {}
+
+
+def _analytic_search(api, method, args, query, body):
+    if method == 'POST':
+        analytic = api.analytics.get(body.get('id'))
+        if analytic is None:
+            return 404, {'message': 'Unknown analytic %s' % body.get('id')}
+        return 200, _analytic_info(analytic)
+    text = query.get('text', '').lower()
+    return 200, [_analytic_info(a) for a in api.analytics.values() if text in a['name'].lower()]
+
+
+def _analytic_groups(api, method, args, query, body):
+    return 200, {'id': 'local-analytic-root', 'name': 'Root', 'groups': [],
+                 'analytics': [_analytic_info(a) for a in api.analytics.values()]}
+
+
+def _analytic_query(api, method, args, query, body):
+    flight = int(args[1])
+    if 'offsets' in body:
+        offsets = [float(t) for t in body['offsets']]
+    else:
+        start = float(body.get('start') or 0)
+        end = min(float(body['end']) if body.get('end') is not None else api.n_samples,
+                  api.n_samples)
+        offsets = [float(t) for t in range(int(math.ceil(start)), int(end))]
+    if body.get('size') is not None:
+        offsets = offsets[:int(body['size'])]
+    results = []
+    for s in body.get('select', []):
+        analytic = api.analytics.get(s['analyticId'])
+        if analytic is None:
+            return 400, {'message': 'Unknown analytic %s' % s['analyticId']}
+        results.append({'analyticId': analytic['id'],
+                        'values': api.samples(analytic, flight, offsets)})
+    return 200, {'offsets': offsets, 'results': results}
+
+
+def _profile_search(api, method, args, query, body):
+    if query.get('search', '').lower() not in PROFILE_NAME.lower():
+        return 200, []
+    return 200, [{'localId': 1, 'id': PROFILE_ID, 'name': PROFILE_NAME, 'treeLocation': [],
+                  'library': False, 'currentVersion': 1}]
+
+
+def _profile_glossary(api, method, args, query, body):
+    items = [{'recordType': 'measurement', 'scope': 'default', 'itemId': 1,
+              'name': 'Maximum Pressure Altitude', 'units': 'ft', 'eventTypeId': None},
+             {'recordType': 'timepoint', 'scope': 'default', 'itemId': 2,
+              'name': 'Takeoff', 'units': None, 'eventTypeId': None},
+             {'recordType': 'event', 'scope': 'eventSpecific', 'itemId': 3,
+              'name': 'Hard Landing', 'units': None, 'eventTypeId': 1}]
+    return 200, {'profileId': args[1], 'profileVersion': 1, 'glossaryItems': items}
+
+
+def _profile_events(api, method, args, query, body):
+    return 200, [{'id': 1, 'name': 'Hard Landing', 'description': 'Vertical acceleration '
+                  'at touchdown above the limit'}]
+
+
+def _profile_results(api, method, args, query, body):
+    flight = int(args[1])
+    return 200, {'measurements': [{'itemId': 1, 'value': 30000. + flight % 10000}],
+                 'timepoints': [{'itemId': 2, 'value': 600. + flight % 60}],
+                 'events': [{'eventId': 1, 'eventType': 1, 'phaseOfFlight': 'landing',
+                             'severity': 'caution', 'status': 'confirmed'}]
+                 if flight % 10 == 0 else []}
+
+
+_HANDLERS = {
+    ('sys', 'auth'): _token,
+    ('ems_sys', 'list'): _ems_systems,
+    ('ems_sys', 'info'): _ems_info,
+    ('database', 'group'): _database_groups,
+    ('database', 'field_group'): _field_groups,
+    ('database', 'field'): _field,
+    ('database', 'query'): _database_query,
+    ('database', 'open_asyncq'): _open_async_query,
+    ('database', 'get_asyncq'): _read_async_query,
+    ('database', 'close_asyncq'): _close_async_query,
+    ('analytic', 'search'): _analytic_search,
+    ('analytic', 'group'): _analytic_groups,
+    ('analytic', 'query'): _analytic_query,
+    ('profile', 'search'): _profile_search,
+    ('profile', 'glossary'): _profile_glossary,
+    ('profile', 'events'): _profile_events,
+    ('profile', 'profile_results'): _profile_results
+}
+
+
+def _route(template):
+    # Regular expression matching the path of an emspy.common.uris template
+    pieces = [re.escape(p) for p in ('/api' + template).split('%s')]
+    return re.compile('^' + '([^/]+)'.join(pieces) + '$')
+
+
+_ROUTES = [((group, name), _route(template))
+           for group, uris in common.uris.items() for name, template in uris.items()]
+
+
+def _field_group_id(group):
+    return '[-hub-][field-group][[[ems-core][entity-type][foqa-flights]]' \
+           '[[ems-core][internal-field-group][%s]]]' % group
+
+
+def _field_id(slug):
+    return '[-hub-][field][[[ems-core][entity-type][foqa-flights]]' \
+           '[[ems-core][base-field][flight.%s]]]' % slug
+
+
+def _make_fields(n_measurements):
+    info = [('uid', 'Flight Record', 'number'),
+            ('exact-date', 'Flight Date (Exact)', 'dateTime'),
+            ('takeoff-airport-code', 'Takeoff Airport Code', 'discrete'),
+            ('landing-airport-code', 'Landing Airport Code', 'discrete'),
+            ('takeoff-valid', 'Takeoff Valid', 'boolean'),
+            ('tail-number', 'Tail Number', 'string')]
+    fields = [(_field_id(slug), name, ftype, 'flight-info') for slug, name, ftype in info]
+    fields += [(_field_id('measurement-%d' % n), 'P%d: Measurement %d' % (n, n), 'number',
+                'measurements') for n in range(1, n_measurements + 1)]
+    return dict((fid, {'id': fid, 'name': name, 'type': ftype, 'group': group, 'index': index})
+                for index, (fid, name, ftype, group) in enumerate(fields))
+
+
+def _make_analytics(n_analytics):
+    analytics = [('local-analytic-hours', 'Hours of Data (hours)', 'hr')]
+    analytics += [('local-analytic-%d' % n, 'Parameter %d (ft)' % n, 'ft')
+                  for n in range(1, n_analytics + 1)]
+    return dict((aid, {'id': aid, 'name': name, 'units': units, 'index': index})
+                for index, (aid, name, units) in enumerate(analytics))
+
+
+def _analytic_info(analytic):
+    return {'id': analytic['id'], 'name': analytic['name'], 'units': analytic['units'],
+            'description': 'Synthetic parameter %s' % analytic['name']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in EMS API serving synthetic data.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--flights', type=int, default=10000, help="rows of the flight table")
+    parser.add_argument('--measurements', type=int, default=10, help="numeric fields")
+    parser.add_argument('--samples', type=int, default=3600, help="time-series samples per flight")
+    parser.add_argument('--latency', type=float, default=0., help="seconds per response")
+    args = parser.parse_args(argv)
+    server = LocalServer(args.host, args.port, n_flights=args.flights,
+                         n_measurements=args.measurements, n_samples=args.samples,
+                         latency=args.latency)
+    print("Serving a stand-in EMS API on %s (Ctrl-C to stop)" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Size-bounded LRU store of entries in a SQLite file, shared by emspy.cache.HTTPCache and
+emspy.query.resultcache.ResultCache.
+
+Each entry has a key, a size in bytes, the times it was stored and last used, and the columns
+given by its owner. Once the total size of the entries grows beyond the maximum size, the least
+recently used ones are evicted.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import os
+import sqlite3
+import threading
+import time
+
+
+class LRUStore(object):
+    """
+    Table of a SQLite file holding size-bounded entries evicted in least recently used order
+    """
+    def __init__(self, path, table, columns, max_size):
+        """
+        LRUStore initialization
+
+        Parameters
+        ----------
+        path: str
+            path to the SQLite file; it is created if it does not exist
+        table: str
+            name of the table of the entries
+        columns: list
+            (name, SQL type) of the columns of an entry, besides its key, size and times
+        max_size: int
+            maximum total size in bytes of the entries
+        """
+        self.path = os.path.abspath(path)
+        self.table = table
+        self.columns = [name for name, _ in columns]
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, %s, "
+                         "size INTEGER, stored_at REAL, used_at REAL)"
+                         % (table, ', '.join('%s %s' % c for c in columns)))
+        self._db.execute("CREATE INDEX IF NOT EXISTS %s_used_at ON %s (used_at)"
+                         % (table, table))
+        self._db.commit()
+
+    def get(self, key, max_age=None):
+        """
+        Looks up an entry, marking it as used
+
+        Parameters
+        ----------
+        key: str
+            entry key
+        max_age: float
+            seconds after which a stored entry is removed instead of returned (default None,
+            entries do not expire)
+
+        Returns
+        -------
+        tuple or None
+            the values of the columns of the entry followed by the time it was stored, None if
+            there is no entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT %s, stored_at FROM %s WHERE key = ?"
+                                   % (', '.join(self.columns), self.table), (key,)).fetchone()
+            if row is not None and max_age is not None and now - row[-1] >= max_age:
+                self._db.execute("DELETE FROM %s WHERE key = ?" % self.table, (key,))
+                self._db.commit()
+                return None
+            if row is not None:
+                self._db.execute("UPDATE %s SET used_at = ? WHERE key = ?" % self.table,
+                                 (now, key))
+                self._db.commit()
+        return row
+
+    def put(self, key, size, values):
+        """
+        Stores an entry, evicting the least recently used ones if the store is full
+
+        Parameters
+        ----------
+        key: str
+            entry key
+        size: int
+            size of the entry in bytes
+        values: tuple
+            values of the columns of the entry
+
+        Returns
+        -------
+        float or None
+            the time the entry was stored, None if it is larger than max_size and was not
+            stored
+        """
+        if size > self.max_size:
+            return None
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO %s (key, %s, size, stored_at, used_at) "
+                             "VALUES (%s)" % (self.table, ', '.join(self.columns),
+                                              ', '.join('?' * (len(self.columns) + 4))),
+                             (key,) + tuple(values) + (size, now, now))
+            self.__evict()
+            self._db.commit()
+        return now
+
+    def refresh(self, key):
+        """
+        Marks an entry as stored and used now
+
+        Returns
+        -------
+        float
+            the time the entry was refreshed
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE %s SET stored_at = ?, used_at = ? WHERE key = ?"
+                             % self.table, (now, now, key))
+            self._db.commit()
+        return now
+
+    def discard(self, key):
+        """
+        Removes an entry
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM %s WHERE key = ?" % self.table, (key,))
+            self._db.commit()
+
+    def counts(self):
+        """
+        Number of entries and their total size in bytes
+        """
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM %s"
+                                             % self.table).fetchone()
+        return entries, size
+
+    def size(self):
+        """
+        Total size in bytes of the entries
+        """
+        return self.counts()[1]
+
+    def __len__(self):
+        return self.counts()[0]
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM %s" % self.table)
+            self._db.commit()
+
+    def close(self):
+        """
+        Closes the SQLite file
+        """
+        with self._lock:
+            self._db.close()
+
+    def __evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM %s"
+                                 % self.table).fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self._db.execute("SELECT key, size FROM %s ORDER BY used_at"
+                                % self.table).fetchall()
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            self._db.execute("DELETE FROM %s WHERE key = ?" % self.table, (key,))
+            total -= size
@@ -0,0 +1,296 @@
+"""
+Request instrumentation.
+
+Connection.request reports every request as a RequestEvent to the hooks registered on the
+connection. A MetricsRegistry can be registered as such a hook to aggregate the events into
+counters and latency histograms which can be read with snapshot() or scraped in the Prometheus
+text format with render().
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+from collections import OrderedDict
+import bisect
+import threading
+import timeit
+
+# Monotonic clock used for all latency measurements
+clock = timeit.default_timer
+
+# Phases of a request, in order. Time spent sending the request and waiting for the response
+# headers is reported as 'ttfb'; it includes 'connect' when the transport cannot tell them apart.
+PHASES = ('connect', 'ttfb', 'download', 'decompress', 'parse')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+
+
+class RequestEvent(object):
+    """
+    What is known about a request sent by Connection.request. Before-request hooks receive it
+    once the request is prepared; after-request hooks receive it once the response is decoded or
+    the request failed.
+
+    Attributes
+    ----------
+    method: str
+        HTTP method
+    url: str
+        request url
+    uri_keys: tuple
+        key of the endpoint in emspy.common.uris, or None if the request was sent by url
+    status: int
+        HTTP status code of the final response, None if no response was received
+    attempts: int
+        number of times the request was sent, including retries
+    error: Exception
+        exception raised by the request, None if it succeeded
+    timings: OrderedDict
+        seconds spent in each of emspy.metrics.PHASES, plus 'total'. Phases which were not
+        measured are None; with stream=True the download, decompress and parse phases happen
+        while the rows are consumed and are not measured.
+    bytes_wire: int
+        size of the response body as received, None if not measured
+    bytes_decoded: int
+        size of the decompressed response body, None if not measured
+    started: float
+        emspy.metrics.clock() reading when the request was prepared
+    cache: str
+        for requests to endpoints cached by an emspy.cache.HTTPCache: 'hit' if the stored
+        response was used without contacting the API, 'revalidated' if the API confirmed it
+        did not change, 'miss' otherwise. None for requests which are not cached.
+    """
+    def __init__(self, method, url, uri_keys=None):
+        self.method = method
+        self.url = url
+        self.uri_keys = tuple(uri_keys) if uri_keys is not None else None
+        self.status = None
+        self.attempts = 0
+        self.error = None
+        self.timings = OrderedDict((phase, None) for phase in PHASES + ('total',))
+        self.bytes_wire = None
+        self.bytes_decoded = None
+        self.started = clock()
+        self.cache = None
+
+    @property
+    def endpoint(self):
+        """
+        Endpoint name, e.g. 'database/query', or 'other' for requests sent by url
+        """
+        return '/'.join(self.uri_keys) if self.uri_keys is not None else 'other'
+
+    def __repr__(self):
+        return "RequestEvent(%s %s, status=%s, total=%s)" % (self.method, self.endpoint,
+                                                            self.status, self.timings['total'])
+
+
+class Counter(object):
+    """
+    Monotonically increasing value
+    """
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, value=1):
+        self.value += value
+
+
+class Histogram(object):
+    """
+    Distribution of observed values over fixed buckets
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # Counts per bucket, the last one for values above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """
+        Number of observations less than or equal to each bucket bound, then the total count
+        """
+        counts, total = [], 0
+        for c in self.counts:
+            total += c
+            counts.append(total)
+        return counts
+
+
+class MetricsRegistry(object):
+    """
+    Thread-safe collection of named counters and histograms with labels
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Metrics registry initialization
+
+        Parameters
+        ----------
+        buckets: tuple
+            upper bounds in seconds of the request latency histogram buckets
+        """
+        self.buckets = buckets
+        self._counters = OrderedDict()
+        self._histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increments a counter, creating it at zero if needed
+
+        Parameters
+        ----------
+        name: str
+            metric name
+        value: float
+            increment (default 1)
+        labels:
+            label values identifying the counter among those with the same name
+        """
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self._counters:
+                self._counters[key] = Counter()
+            self._counters[key].inc(value)
+
+    def observe(self, name, value, **labels):
+        """
+        Adds a value to a histogram, creating it if needed
+
+        Parameters
+        ----------
+        name: str
+            metric name
+        value: float
+            observed value
+        labels:
+            label values identifying the histogram among those with the same name
+        """
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+            self._histograms[key].observe(value)
+
+    def observe_request(self, event):
+        """
+        After-request hook recording a RequestEvent. Register it with
+        Connection(metrics=registry) or conn.after_request_hooks.append(registry.observe_request).
+
+        Parameters
+        ----------
+        event: emspy.metrics.RequestEvent
+            finished request
+        """
+        endpoint = event.endpoint
+        status = str(event.status) if event.status is not None else 'error'
+        self.inc('emspy_requests_total', endpoint=endpoint, status=status)
+        if event.cache is not None:
+            self.inc('emspy_cache_requests_total', endpoint=endpoint, result=event.cache)
+        if event.attempts > 1:
+            self.inc('emspy_request_retries_total', event.attempts - 1, endpoint=endpoint)
+        for phase, seconds in event.timings.items():
+            if seconds is not None:
+                self.observe('emspy_request_seconds', seconds, endpoint=endpoint, phase=phase)
+        if event.bytes_wire is not None:
+            self.inc('emspy_response_bytes_total', event.bytes_wire, endpoint=endpoint,
+                     encoding='wire')
+        if event.bytes_decoded is not None:
+            self.inc('emspy_response_bytes_total', event.bytes_decoded, endpoint=endpoint,
+                     encoding='decoded')
+
+    def counter(self, name, **labels):
+        """
+        Current value of a counter, 0 if it does not exist
+        """
+        with self._lock:
+            counter = self._counters.get(_key(name, labels))
+            return counter.value if counter is not None else 0
+
+    def histogram(self, name, **labels):
+        """
+        Histogram with the given name and labels, None if nothing was observed
+        """
+        with self._lock:
+            return self._histograms.get(_key(name, labels))
+
+    def snapshot(self):
+        """
+        Current values of all metrics
+
+        Returns
+        -------
+        dict
+            {'counters': [(name, labels, value)],
+             'histograms': [(name, labels, {'count', 'sum', 'buckets'})]} where buckets maps
+            each bucket bound (and float('inf')) to the cumulative count
+        """
+        with self._lock:
+            counters = [(name, dict(labels), c.value)
+                        for (name, labels), c in self._counters.items()]
+            histograms = [(name, dict(labels), _histogram_values(h))
+                          for (name, labels), h in self._histograms.items()]
+        return {'counters': counters, 'histograms': histograms}
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format
+
+        Returns
+        -------
+        str
+            metrics text, one sample per line
+        """
+        snapshot = self.snapshot()
+        lines, typed = [], set()
+        for name, labels, value in snapshot['counters']:
+            if name not in typed:
+                lines.append('# TYPE %s counter' % name)
+                typed.add(name)
+            lines.append('%s%s %s' % (name, _labels(labels), _number(value)))
+        for name, labels, values in snapshot['histograms']:
+            if name not in typed:
+                lines.append('# TYPE %s histogram' % name)
+                typed.add(name)
+            for bound, count in values['buckets'].items():
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append('%s_bucket%s %d' % (name, _labels(dict(labels, le=le)), count))
+            lines.append('%s_sum%s %s' % (name, _labels(labels), _number(values['sum'])))
+            lines.append('%s_count%s %d' % (name, _labels(labels), values['count']))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+        Removes all metrics
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _histogram_values(histogram):
+    bounds = histogram.buckets + (float('inf'),)
+    return {'count': histogram.count, 'sum': histogram.sum,
+            'buckets': OrderedDict(zip(bounds, histogram.cumulative_counts()))}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in sorted(labels.items()))
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
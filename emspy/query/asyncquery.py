@@ -0,0 +1,147 @@
+"""
+Handles of the async-queries opened on the EMS API.
+
+An async-query holds server resources until it is closed or expires. Used as a context manager,
+an AsyncQuery is closed when the block is left, whether all rows were read, an error was raised
+or the run was interrupted (KeyboardInterrupt). The handles not closed yet are listed by
+Connection.open_async_queries.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from builtins import object
+import time
+
+
+class AsyncQuery(object):
+    """
+    Async-query opened on the EMS API
+
+    Attributes
+    ----------
+    query_id: str
+        async-query id
+    header: list
+        header of the rows, returned when the query was opened
+    opened_at: float
+        time, as given by time.time(), the handle was created
+    n_reads: int
+        number of pages read
+    closed: bool
+        True once the query was closed or the handle detached
+    """
+    def __init__(self, conn, uri_args, query_id, header):
+        """
+        AsyncQuery initialization, for a query which is already open. The handle is registered
+        with the connection until it is closed or detached.
+
+        Parameters
+        ----------
+        conn: emspy.Connection
+            connection the query was opened with
+        uri_args: tuple
+            EMS id and database id of the query
+        query_id: str
+            async-query id
+        header: list
+            header of the rows
+        """
+        self._conn = conn
+        self._uri_args = tuple(uri_args)
+        self.query_id = query_id
+        self.header = header
+        self.opened_at = time.time()
+        self.n_reads = 0
+        self.closed = False
+        conn._track_async_query(self)
+
+    @classmethod
+    def open(cls, conn, uri_args, queryset, deadline=None):
+        """
+        Opens an async-query
+
+        Parameters
+        ----------
+        conn: emspy.Connection
+            connection to send the query with
+        uri_args: tuple
+            EMS id and database id of the query
+        queryset: dict
+            the query
+        deadline: float
+            time, as given by time.time(), by which the query must be open (default None)
+
+        Returns
+        -------
+        AsyncQuery
+            handle of the open query
+        """
+        resp_h, content = conn.request(
+            rtype="POST",
+            uri_keys=('database', 'open_asyncq'),
+            uri_args=tuple(uri_args),
+            jsondata=queryset,
+            deadline=deadline
+        )
+        if 'id' not in content:
+            raise ValueError("Opening Async query did not return the query Id.")
+        return cls(conn, uri_args, content['id'], content['header'])
+
+    def read(self, start, end, stream=False, deadline=None):
+        """
+        Reads rows start to end, included
+
+        Returns
+        -------
+        dict
+            page content, whose 'rows' are an iterator with stream=True
+        """
+        resp_h, content = self._conn.request(
+            rtype="GET",
+            uri_keys=('database', 'get_asyncq'),
+            uri_args=self._uri_args + (self.query_id, start, end),
+            stream=stream,
+            deadline=deadline
+        )
+        self.n_reads += 1
+        return content
+
+    def close(self):
+        """
+        Closes the query on the server. Closing a closed query does nothing, and an error
+        closing it is printed rather than raised, so that it does not hide the error that
+        ended the run.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._conn._untrack_async_query(self)
+        try:
+            self._conn.request(
+                rtype="DELETE",
+                uri_keys=('database', 'close_asyncq'),
+                uri_args=self._uri_args + (self.query_id,)
+            )
+        except Exception as e:
+            print("Could not close the async-query %s: %s" % (self.query_id, e))
+
+    def detach(self):
+        """
+        Stops managing the query, leaving it open on the server until it expires, e.g. to
+        resume reading it later
+        """
+        if not self.closed:
+            self.closed = True
+            self._conn._untrack_async_query(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __repr__(self):
+        return '<AsyncQuery %s, %d pages read, open for %.1fs>' % (
+            self.query_id, self.n_reads, time.time() - self.opened_at)
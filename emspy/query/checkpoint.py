@@ -0,0 +1,127 @@
+"""
+Checkpoints of async-queries, so that an interrupted FltQuery.async_run can be resumed.
+
+A checkpoint is a directory holding every page received so far, as a pickled DataFrame, and a
+manifest with the async-query id and header and the number of pages received. Pages are
+unpickled when read: only resume from checkpoint directories written by a trusted user.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import json
+import os
+import pickle
+import shutil
+
+FORMAT_VERSION = 1
+
+
+class Checkpoint(object):
+    """
+    Pages of an async-query received so far, stored in a directory
+    """
+    def __init__(self, directory, key):
+        """
+        Checkpoint initialization. The stored pages, if any, are found from the manifest.
+
+        Parameters
+        ----------
+        directory: str
+            directory of the checkpoints; it is created if it does not exist
+        key: str
+            key of the query and page size, which names the checkpoint's sub-directory
+        """
+        self.path = os.path.join(os.path.abspath(directory), key)
+        self.query_id = None
+        self.header = None
+        self.n_pages = 0
+        manifest = self.__read_manifest()
+        if manifest is not None:
+            self.query_id = manifest['query_id']
+            self.header = manifest['header']
+            self.n_pages = manifest['n_pages']
+
+    def load(self):
+        """
+        Reads the stored pages
+
+        Returns
+        -------
+        list
+            DataFrames of pages 0 to n_pages - 1
+        """
+        dfs = []
+        for page in range(self.n_pages):
+            with open(self.__page_path(page), 'rb') as f:
+                dfs.append(pickle.load(f))
+        return dfs
+
+    def start(self, query_id, header):
+        """
+        Records the async-query the next pages are read from
+        """
+        self.query_id = query_id
+        self.header = header
+        self.__write_manifest()
+
+    def save(self, page, df):
+        """
+        Stores a page. Pages must be stored in order.
+
+        Parameters
+        ----------
+        page: int
+            page number, which must be n_pages
+        df: pd.DataFrame
+            the page rows
+        """
+        if page != self.n_pages:
+            raise ValueError("Page %d stored after %d pages." % (page, self.n_pages))
+        path = self.__page_path(page)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _replace(path + '.tmp', path)
+        self.n_pages += 1
+        self.__write_manifest()
+
+    def clear(self):
+        """
+        Removes the checkpoint
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.query_id = None
+        self.header = None
+        self.n_pages = 0
+
+    def __page_path(self, page):
+        return os.path.join(self.path, 'page-%06d.pkl' % page)
+
+    def __read_manifest(self):
+        try:
+            with open(os.path.join(self.path, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if manifest.get('version') != FORMAT_VERSION:
+            return None
+        return manifest
+
+    def __write_manifest(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        path = os.path.join(self.path, 'manifest.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'query_id': self.query_id,
+                       'header': self.header, 'n_pages': self.n_pages}, f)
+        _replace(path + '.tmp', path)
+
+
+def _replace(src, dst):
+    # Atomic rename over an existing file
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
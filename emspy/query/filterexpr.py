@@ -0,0 +1,266 @@
+"""
+Parser of the filter expressions of FltQuery.filter.
+
+An expression is made of conditions on fields, grouped with 'and', 'or' and parentheses, e.g.
+
+    'takeoff valid' == True and ('customer id' in ['CQH', 'EVA'] or 'flight record' > 17000)
+
+A condition is one of:
+
+    <field> <op> <value>                  op: ==, !=, <, <=, >, >=
+    <value> <op> <field> <op> <value>     between conditions
+    <field> [not] in [<value>, ...]
+    <field> is [not] null
+
+Fields and string values are quoted with ' or "; other values are numbers, True, False or None.
+'and' binds tighter than 'or'. Expressions are parsed into a tree of Condition and Group nodes,
+and parsed trees are memoized by expression.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import re
+import threading
+
+# Maximum number of parsed expressions kept
+MAX_MEMOIZED = 4096
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?(?![\w.]))
+    | (?P<op>==|!=|<=|>=|<|>)
+    | (?P<punct>[()\[\],])
+    | (?P<word>[A-Za-z_]\w*)
+    )""", re.VERBOSE)
+
+_CONSTANTS = {'True': True, 'true': True, 'False': False, 'false': False, 'None': None}
+
+_KEYWORDS = ('and', 'or', 'not', 'in', 'is', 'null')
+
+_parsed = dict()
+_parsed_lock = threading.Lock()
+
+
+class FilterSyntaxError(ValueError):
+    """
+    Raised when a filter expression cannot be parsed
+    """
+    pass
+
+
+class Condition(object):
+    """
+    Condition on a field
+
+    Attributes
+    ----------
+    field: str
+        field keyword
+    op: str or list
+        operator, e.g. '==' or 'in', or the two operators of a between condition
+    values: list
+        constant values compared with the field
+    """
+    def __init__(self, field, op, values):
+        self.field = field
+        self.op = op
+        self.values = values
+
+    def __eq__(self, other):
+        return (isinstance(other, Condition) and
+                (self.field, self.op, self.values) == (other.field, other.op, other.values))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Condition(%r, %r, %r)' % (self.field, self.op, self.values)
+
+
+class Group(object):
+    """
+    Conditions or groups combined with 'and' or 'or'
+    """
+    def __init__(self, operator, args):
+        self.operator = operator
+        self.args = args
+
+    def __eq__(self, other):
+        return (isinstance(other, Group) and
+                (self.operator, self.args) == (other.operator, other.args))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Group(%r, %r)' % (self.operator, self.args)
+
+
+def tokenize(expr):
+    """
+    Splits a filter expression into (kind, value) tokens. Kinds are 'constant', 'op', 'punct'
+    and 'keyword'.
+    """
+    tokens = []
+    pos, end = 0, len(expr.rstrip())
+    while pos < end:
+        m = _TOKEN.match(expr, pos)
+        if m is None or m.end() == pos:
+            raise FilterSyntaxError("Unexpected character %r at position %d in filter: %s"
+                                    % (expr[pos:].strip()[:1], pos, expr))
+        pos = m.end()
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind == 'string':
+            tokens.append(('constant', _unquote(text)))
+        elif kind == 'number':
+            tokens.append(('constant', float(text) if re.search('[.eE]', text) else int(text)))
+        elif kind == 'word':
+            if text in _CONSTANTS:
+                tokens.append(('constant', _CONSTANTS[text]))
+            elif text.lower() in _KEYWORDS:
+                tokens.append(('keyword', text.lower()))
+            else:
+                raise FilterSyntaxError("Unknown word '%s' in filter: %s. Are quotes missing?"
+                                        % (text, expr))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+def parse(expr):
+    """
+    Parses a filter expression
+
+    Parameters
+    ----------
+    expr: str
+        filter expression
+
+    Returns
+    -------
+    Condition or Group
+        the expression tree. It is shared by all the callers parsing the same expression and
+        must not be modified.
+
+    Raises
+    ------
+    FilterSyntaxError
+        if the expression is not valid
+    """
+    with _parsed_lock:
+        tree = _parsed.get(expr)
+    if tree is None:
+        tree = _Parser(expr).parse()
+        with _parsed_lock:
+            if len(_parsed) >= MAX_MEMOIZED:
+                _parsed.clear()
+            _parsed[expr] = tree
+    return tree
+
+
+def _unquote(text):
+    return re.sub(r'\\(.)', r'\1', text[1:-1])
+
+
+class _Parser(object):
+    # Recursive descent parser:
+    #   expr       := and_expr ('or' and_expr)*
+    #   and_expr   := term ('and' term)*
+    #   term       := '(' expr ')' | condition
+    #   condition  := value op value [op value] | value ['not'] 'in' list | value 'is' ['not'] 'null'
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = tokenize(expr)
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterSyntaxError("Empty filter expression.")
+        tree = self.__or()
+        if self.pos < len(self.tokens):
+            self.__error("Unexpected %s" % self.__describe())
+        return tree
+
+    def __peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def __accept(self, kind, value=None):
+        token = self.__peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return token
+        return None
+
+    def __expect(self, kind, value=None):
+        token = self.__accept(kind, value)
+        if token is None:
+            self.__error("Expected %s but found %s" % (value or kind, self.__describe()))
+        return token
+
+    def __describe(self):
+        kind, value = self.__peek()
+        return 'the end of the expression' if kind is None else repr(value)
+
+    def __error(self, message):
+        raise FilterSyntaxError("%s in filter: %s" % (message, self.expr))
+
+    def __or(self):
+        args = [self.__and()]
+        while self.__accept('keyword', 'or'):
+            args.append(self.__and())
+        return args[0] if len(args) == 1 else Group('or', args)
+
+    def __and(self):
+        args = [self.__term()]
+        while self.__accept('keyword', 'and'):
+            args.append(self.__term())
+        return args[0] if len(args) == 1 else Group('and', args)
+
+    def __term(self):
+        if self.__accept('punct', '('):
+            tree = self.__or()
+            self.__expect('punct', ')')
+            return tree
+        return self.__condition()
+
+    def __condition(self):
+        first = self.__value()
+        if self.__accept('keyword', 'is'):
+            op = 'is not null' if self.__accept('keyword', 'not') else 'is null'
+            self.__expect('keyword', 'null')
+            return Condition(first, op, [])
+        if self.__peek() == ('keyword', 'not') and self.__peek(1) == ('keyword', 'in'):
+            self.pos += 2
+            return Condition(first, 'not in', self.__list())
+        if self.__accept('keyword', 'in'):
+            return Condition(first, 'in', self.__list())
+
+        op = self.__expect('op')[1]
+        second = self.__value()
+        if self.__peek()[0] != 'op':
+            return Condition(first, op, [second])
+        # Between condition, the field being in the middle
+        op2 = self.__expect('op')[1]
+        third = self.__value()
+        return Condition(second, [op, op2], [first, third])
+
+    def __value(self):
+        if self.__peek() == ('punct', '['):
+            return self.__list()
+        return self.__expect('constant')[1]
+
+    def __list(self):
+        self.__expect('punct', '[')
+        values = []
+        if not self.__accept('punct', ']'):
+            values.append(self.__expect('constant')[1])
+            while self.__accept('punct', ','):
+                if self.__peek() == ('punct', ']'):
+                    break
+                values.append(self.__expect('constant')[1])
+            self.__expect('punct', ']')
+        return values
@@ -3,8 +3,14 @@ from builtins import object
 from emspy.query import LocalData
 
 import networkx as nx
+import numpy as np
 import pandas as pd
-import os, sys, re
+import os, sys, re, threading
+
+# Code tables of discrete fields, by (uri root, EMS id, field id). They are shared by all
+# Flight objects, so decoding does not load the key-value maps again for every query.
+_code_tables = dict()
+_code_tables_lock = threading.Lock()
 
 
 class Flight(object):
@@ -603,6 +609,30 @@ class Flight(object):
             return kmap[['key', 'value']]
         return kmap['value'].tolist()
 
+    def code_table(self, field_id):
+        """
+        Code table decoding the keys of a discrete field. It is built from the key-value
+        mapping once and cached for all queries to the same EMS system.
+
+        Parameters
+        ----------
+        field_id: str
+            field id
+
+        Returns
+        -------
+        CodeTable
+            code table of the field
+        """
+        cache_key = (self._uri_root, self._ems_id, field_id)
+        with _code_tables_lock:
+            table = _code_tables.get(cache_key)
+        if table is None:
+            table = CodeTable(self.list_allvalues(field_id=field_id, in_df=True))
+            with _code_tables_lock:
+                table = _code_tables.setdefault(cache_key, table)
+        return table
+
     def get_value_id(self, value, field=None, field_id=None):
         """
         Return the key (id) of the values of a discrete field.
@@ -637,6 +667,60 @@ class Flight(object):
             return ("ems_id = ?", (self._ems_id,))
 
 
+class CodeTable(object):
+    """
+    Key-value mapping of a discrete field, arranged to decode columns of keys into
+    pd.Categorical columns of values
+    """
+    def __init__(self, kvmap):
+        """
+        CodeTable initialization
+
+        Parameters
+        ----------
+        kvmap: pd.DataFrame
+            key-value mapping, with 'key' and 'value' columns
+        """
+        self.keys = pd.Index(kvmap['key'].values)
+        # Category code of the value of each key. Keys sharing a value share its category.
+        codes, categories = pd.factorize(kvmap['value'].values)
+        self.codes = codes
+        # Objects, like the keys added to them by decode, so that all batches decoded with the
+        # table have categories of the same type.
+        self.categories = pd.Index(categories, dtype=object)
+
+    def decode(self, keys):
+        """
+        Decodes keys into their values
+
+        Parameters
+        ----------
+        keys: array-like
+            keys of the field. None is a missing value.
+
+        Returns
+        -------
+        pd.Categorical
+            values of the keys. Keys not in the table are kept as they are, as additional
+            categories.
+        """
+        keys = np.asarray(keys)
+        positions = self.keys.get_indexer(keys)
+        codes = np.full(len(keys), -1, dtype=self.codes.dtype)
+        found = positions >= 0
+        codes[found] = self.codes[positions[found]]
+        unknown = (positions < 0) & pd.notna(keys)
+        categories = self.categories
+        if unknown.any():
+            extra, extra_codes = np.unique(keys[unknown], return_inverse=True)
+            codes[unknown] = len(categories) + extra_codes
+            categories = categories.append(pd.Index(extra, dtype=object))
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    def __len__(self):
+        return len(self.keys)
+
+
 def _get_shortest(fields):
     if isinstance(fields, pd.DataFrame) is False:
         sys.exit("Input should be a Pandas dataframe.")
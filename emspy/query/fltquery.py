@@ -1,15 +1,27 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import copy
 import json
 import sys
+import threading
 from builtins import str
 from builtins import zip
 from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from future.utils import string_types
 
+from emspy import metrics
+from emspy.connection import DeadlineExceeded
+from emspy.query import filterexpr
+from emspy.query.asyncquery import AsyncQuery
+from emspy.query.checkpoint import Checkpoint
+from emspy.query import sink
+from emspy.query.pages import PageSizer, read_pages
+from emspy.query.resultcache import ResultCache
 from emspy.query import *
 from .query import Query
 
@@ -18,7 +30,8 @@ class FltQuery(Query):
     """
     Flight query class
     """
-    def __init__(self, conn, ems_name=None, data_file=LocalData.default_data_file):
+    def __init__(self, conn, ems_name=None, data_file=LocalData.default_data_file,
+                 result_cache=None):
         """
         Flight query initialization
 
@@ -30,8 +43,14 @@ class FltQuery(Query):
             EMS system name
         data_file: str
             path to database file
+        result_cache: str or emspy.query.resultcache.ResultCache
+            cache of the results returned by run(), or the path to its SQLite file. Results
+            are not cached if None. (default None)
         """
         Query.__init__(self, conn, ems_name)
+        if isinstance(result_cache, string_types):
+            result_cache = ResultCache(result_cache)
+        self.result_cache = result_cache
         self._init_assets(data_file)
         self.reset()
 
@@ -198,7 +217,8 @@ class FltQuery(Query):
         Parameters
         ----------
         expr: str
-            filtering expression
+            filtering expression. Conditions can be combined with 'and' and 'or', and
+            grouped with parentheses; see emspy.query.filterexpr for the syntax.
         operator: str
             specifies how to aggregate filters:
                 and: all filter conditions must be met
@@ -210,8 +230,7 @@ class FltQuery(Query):
         """
         if 'filter' not in self.__queryset:
             self.__queryset['filter'] = dict(operator=operator, args=[])
-        expr_vec = self.__split_expr(expr)
-        jsonobj = self.__translate_expr(expr_vec)
+        jsonobj = self.__compile_filter(expr)
         self.__queryset['filter']['args'].append(jsonobj)
 
     def remove_filter(self, expr):
@@ -228,96 +247,52 @@ class FltQuery(Query):
         None
         """
         if 'filter' in self.__queryset:
-            expr_vec = self.__split_expr(expr)
-            jsonobj = self.__translate_expr(expr_vec)
+            jsonobj = self.__compile_filter(expr)
             # Remove the filter from the arguments
             self.__queryset['filter']['args'].remove(jsonobj)
             # If no filters are left remove the filter key from the queryset
             if len(self.__queryset['filter']['args']) == 0:
-                self.__queryset.remove('filter')
-
-    @staticmethod
-    def __split_expr(expr):
-        # This function might need to be updated to be more robust. The split of a
-        # given expression will not be correctly done if either field or field
-        # value contains symbols identical to filtering operators.
-        #
-        # In fact the correction was already applied in Rems so refer to Rems'
-        # split_expr function to check what was done there.
-        import re
-
-        any_valid_match = 0
-        for pattern in ['[=!<>]=?'] + list(sp_ops.keys()):
-            # The regular expression looks for either of these patterns in the filter:
-            # 1. <variable> <operator> <value> (i.e. "'x' < '1'")
-            # 2. <value> <operator> <variable> <operator> <value> (i.e. "'0' < 'x' < '1'")
-            # Pattern 1 is the standard for filtering
-            # Pattern 2 is only used for 'between' filtering
-            if pattern not in ['is null', 'is not null']:
-                match = re.search(
-                    r"(.*)\s+(%s)\s+(.*)\s+(%s)\s+(.*)|(.*)\s+(%s)\s+(.*)".replace('%s', pattern),
-                    expr
-                )
-            else:
-                match = re.search(r"(.*)\s+(%s)$".replace('%s', pattern), expr)
-            if match is not None:
-                any_valid_match = len([group for group in match.groups() if group is not None])
-                if any_valid_match:
-                    break
-
-        if match is None or not any_valid_match:
-            sys.exit("Cannot find any valid conditional operator from the given string expression.")
-        split = [group.strip() for group in match.groups() if group is not None]
-        return split
-
-    def __translate_expr(self, expr_vec):
-        fld_loc = [False, False]
-        fld_info = None
-        fld_type = None
-        val_info = []
+                self.__queryset.pop('filter')
+
+    def __compile_filter(self, expr):
+        # Translations are memoized by expression and database, as they only depend on the
+        # fields and discrete values of the database.
+        key = (self._conn._uri_root, self._ems_id, self.__flight._db_id, expr)
+        with _filter_cache_lock:
+            jsonobj = _filter_cache.get(key)
+        if jsonobj is None:
+            jsonobj = self.__translate_expr(filterexpr.parse(expr))
+            with _filter_cache_lock:
+                if len(_filter_cache) >= filterexpr.MAX_MEMOIZED:
+                    _filter_cache.clear()
+                _filter_cache[key] = jsonobj
+        # The queryset may be changed by the caller
+        return copy.deepcopy(jsonobj)
+
+    def __translate_expr(self, tree):
+        if isinstance(tree, filterexpr.Group):
+            return {
+                'type': 'filter',
+                'value': {
+                    'operator': tree.operator,
+                    'args': [self.__translate_expr(arg) for arg in tree.args]
+                }
+            }
 
-        # If the expression vector contains 3 elements the filter is in the form
-        # <variable> <operator> <value>
-        # The operator is the second item of the list
-        if len(expr_vec) in [2, 3]:
-            op = expr_vec[1]
-        # If the expression vector contains 5 elements the filter is in the form
-        # <value> <operator> <variable> <operator> <value>
-        # The operators are the second and fourth elements of the list
-        elif len(expr_vec) == 5:
-            op = [expr_vec[1], expr_vec[3]]
-
-        # Get the list of operators in the expression
-        op_vec = [op] if not isinstance(op, list) else op
-        # Remove the operator[s] from the expression vector
-        fld_val_vec = [s for s in expr_vec if s not in op_vec]
-        for i, s in enumerate(fld_val_vec):
-            x = eval(s)  # FIXME Remove eval
-            # If the length of the expression vector is 3, the field is the first item in the list.
-            # Otherwise, if the length of the expression vector is 5, the second item in the list
-            # is the field.
-            if i == 0 if len(expr_vec) in [2, 3] else i == 1:
-                fld = self.__flight.search_fields(x)[0]
-                if fld is not None:
-                    fld_info = [{'type': 'field', 'value': fld['id']}]
-                    fld_type = fld['type']
-                    fld_loc[i] = True
-                else:
-                    raise ValueError("No field was found with the keyword %s. "
-                                     "Please double-check if it is a right keyword." % x)
-            else:
-                if type(x) != list:
-                    x = [x]
-                val_info += [{'type': 'constant', 'value': v} for v in x]
-
-        # This logic only applies to standard conditional operators
-        if fld_loc[1] and len(expr_vec) == 3:
-            if '<' in expr_vec[1]:
-                op = expr_vec[1].replace('<', '>')
-            else:
-                op = expr_vec[1].replace('>', '<')
-
-        arg_list = fld_info + val_info
+        op = tree.op
+        if not isinstance(tree.field, string_types):
+            raise ValueError("The field of a condition must be quoted: %s." % tree)
+        fld = self.__flight.search_fields(tree.field)[0]
+        if fld is None:
+            raise ValueError("No field was found with the keyword %s. "
+                             "Please double-check if it is a right keyword." % tree.field)
+        fld_type = fld['type']
+        val_info = []
+        for x in tree.values:
+            if type(x) != list:
+                x = [x]
+            val_info += [{'type': 'constant', 'value': v} for v in x]
+        arg_list = [{'type': 'field', 'value': fld['id']}] + val_info
 
         if fld_type == "boolean":
             fltr = _boolean_filter(op, arg_list)
@@ -330,7 +305,7 @@ class FltQuery(Query):
         elif fld_type == "dateTime":
             fltr = _datetime_filter(op, arg_list)
         else:
-            raise ValueError("%s has an unknown field data type %s." % (fld[0], fld_type))
+            raise ValueError("%s has an unknown field data type %s." % (fld['name'], fld_type))
         return fltr
 
     def distinct(self, x=True):
@@ -406,7 +381,7 @@ class FltQuery(Query):
         """
         return self.__queryset
 
-    def simple_run(self, output="dataframe"):
+    def simple_run(self, output="dataframe", deadline=None):
         """
         Sends query to EMS API via the regular query call. The regular query call has a size limit
         in the returned data, which is 25000 rows max. Any output that has greater than 25000 rows
@@ -417,6 +392,8 @@ class FltQuery(Query):
         ----------
         output: str
             desired output data format. Either "raw" or "dataframe".
+        deadline: float
+            time, as given by time.time(), by which the query must have completed (default None)
 
         Returns
         -------
@@ -428,18 +405,22 @@ class FltQuery(Query):
             rtype="POST",
             uri_keys=('database', 'query'),
             uri_args=(self._ems_id, self.__flight.get_database()['id']),
-            jsondata=self.__queryset
+            jsondata=self.__queryset,
+            deadline=deadline
         )
         print('Done.')
 
         if output == "raw":
             return content
         elif output == "dataframe":
-            return self.__to_dataframe(content)
+            print("Raw JSON output to Pandas dataframe...")
+            df = self.__to_dataframe(content)
+            print("Done.")
+            return df
         else:
             raise ValueError("Requested an unknown output type.")
 
-    def async_run(self, n_row=25000):
+    def async_run(self, n_row=25000, deadline=None, n_workers=1, checkpoint_dir=None):
         """
         Sends query to EMS API via async-query call. The async-query does not process
         the query as a single batch for a query expecting a large data. You will have
@@ -447,65 +428,321 @@ class FltQuery(Query):
 
         Parameters
         ----------
-        n_row: int
-            batch size of a single async call. Default is 25000.
+        n_row: int, 'auto' or emspy.query.pages.PageSizer
+            batch size of a single async call. Default is 25000. With 'auto', or a PageSizer,
+            each batch size is chosen from the time taken and the memory used by the batches
+            received so far; this needs n_workers=1.
+        deadline: float
+            time, as given by time.time(), by which all rows must have been received. Unlike
+            other errors, which return the rows received so far, a missed deadline raises
+            emspy.connection.DeadlineExceeded. (default None)
+        n_workers: int
+            number of batches requested at the same time. With more than one, batches are
+            read by a pool of threads and put back in order. (default 1)
+        checkpoint_dir: str
+            directory where received batches are kept until all rows have been received.
+            Running the same query with the same batch size again, after an error, resumes
+            from the last batch received, reading the remaining batches from the same
+            async-query or, if it was closed, from a new one. The query should be ordered
+            (order_by) so that a new async-query returns rows in the same order.
+            (default None)
 
         Returns
         -------
         pd.DataFrame
             Returned data for query in Pandas' DataFrame format
         """
+        return self.__async_run(n_row, deadline, n_workers, checkpoint_dir)[0]
+
+    def __async_run(self, n_row, deadline, n_workers, checkpoint_dir=None):
+        # Returns the DataFrame and whether all rows were received.
+        sizer = _page_sizer(n_row, n_workers)
+        ckpt, opened, first_page, dfs = None, None, 0, []
+        if checkpoint_dir is not None:
+            ckpt = Checkpoint(checkpoint_dir, '%s-%s' % (self.__result_key(),
+                                                         'auto' if sizer else n_row))
+            dfs = ckpt.load()
+            first_page = ckpt.n_pages
+
+        n_rows = sum(dff.shape[0] for dff in dfs)
+        if first_page > 0:
+            print("Resuming from the %d batches in %s." % (first_page, ckpt.path))
+            opened = self.__reusable_async_query(ckpt, n_rows, deadline)
+        complete = False
+        try:
+            if opened is None and ckpt is not None:
+                opened = self.__open_async_query(deadline)
+                ckpt.start(opened.query_id, opened.header)
+            for page, dff in self.__chunks(sizer or n_row, deadline, n_workers, first_page,
+                                           opened, n_rows):
+                dfs.append(dff)
+                n_rows += dff.shape[0]
+                if ckpt is not None:
+                    ckpt.save(page, dff)
+                print("Received up to %d rows." % n_rows)
+            complete = True
+        except DeadlineExceeded:
+            raise
+        except:
+            print("Something's wrong. Returning what has been sent so far.")
+            if ckpt is not None:
+                print("Run the query again to resume from %s." % ckpt.path)
+            return _concat(dfs), False
+        finally:
+            # The async-query of a checkpoint is left open to resume from, until all rows
+            # were received. Otherwise it was closed by __chunks.
+            if opened is not None:
+                if complete:
+                    opened.close()
+                else:
+                    opened.detach()
+
+        if ckpt is not None:
+            ckpt.clear()
+        print("Done.")
+        return _concat(dfs), True
+
+    def __reusable_async_query(self, ckpt, start, deadline):
+        # Returns a handle of the checkpoint's async-query if rows can still be read from it,
+        # None otherwise.
+        try:
+            self._conn.request(
+                rtype="GET",
+                uri_keys=('database', 'get_asyncq'),
+                uri_args=self._asyncq_uri_args(ckpt.query_id, start, start),
+                deadline=deadline
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            print("The async-query %s is closed, opening a new one." % ckpt.query_id)
+            return None
+        return AsyncQuery(self._conn, self._asyncq_uri_args(), ckpt.query_id, ckpt.header)
+
+    def iter_chunks(self, n_row=25000, deadline=None, n_workers=1):
+        """
+        Sends query to EMS API via async-query call and yields the returned data batch by
+        batch, as it is received, so that large outputs can be processed without holding
+        all of them in memory.
+
+        Parameters
+        ----------
+        n_row: int, 'auto' or emspy.query.pages.PageSizer
+            batch size of a single async call, or an adaptive batch size as in async_run.
+            Default is 25000.
+        deadline: float
+            time, as given by time.time(), by which all rows must have been received. Raises
+            emspy.connection.DeadlineExceeded if it is missed. (default None)
+        n_workers: int
+            number of batches requested at the same time. With more than one, batches are
+            read ahead by a pool of threads and yielded in order. (default 1)
+
+        Yields
+        ------
+        pd.DataFrame
+            Returned data for one batch, with the same columns and types as run()
+        """
+        sizer = _page_sizer(n_row, n_workers)
+        for page, dff in self.__chunks(sizer or n_row, deadline, n_workers):
+            yield dff
+
+    def __open_async_query(self, deadline):
+        # Returns the handle of a new async-query.
         print('Sending and opening an async-query to EMS ...', end=' ')
-        resp_h, content = self._conn.request(
-            rtype="POST",
-            uri_keys=('database', 'open_asyncq'),
-            uri_args=(self._ems_id, self.__flight.get_database()['id']),
-            jsondata=self.__queryset
-        )
-        if 'id' not in content:
-            sys.exit("Opening Async query did not return the query Id.")
-        query_id = content['id']
-        query_header = content['header']
+        opened = AsyncQuery.open(self._conn, self._asyncq_uri_args(), self.__queryset, deadline)
         print('Done.')
-
-        ctr = 0
-        df = None
+        return opened
+
+    def __chunks(self, n_row, deadline, n_workers, first_page=0, opened=None, first_row=0):
+        # Yields the page numbers and DataFrames of an async-query from first_page, which
+        # starts at first_row, on. Unless the handle of an open query is given, a query is
+        # opened, and closed once the generator finishes, fails or is closed.
+        # n_row is a number of rows per page or a PageSizer.
+        if opened is None:
+            with self.__open_async_query(deadline) as opened:
+                for item in self.__chunks(n_row, deadline, n_workers, first_page, opened,
+                                          first_row):
+                    yield item
+            return
+        query_header = opened.header
+        sizer = _page_sizer(n_row, n_workers)
+
+        def read_rows(start, size, stream=False):
+            return opened.read(start, start + size - 1, stream=stream, deadline=deadline)
+
+        if n_workers > 1:
+            # Pages are read by a pool of threads, but converted here, in order.
+            def read_whole_page(i):
+                content = read_rows(n_row * (first_page + i), n_row)
+                return content, _is_last_page(content, len(content['rows']), n_row)
+
+            print(" === Async calls: %d at a time ===" % n_workers)
+            for i, content in enumerate(read_pages(read_whole_page, n_workers)):
+                yield first_page + i, self._page_to_dataframe(content, query_header)
+            return
+
+        page = first_page
+        start = first_row
         while True:
-            print(" === Async call: %d ===" % (ctr+1))
-            try:
-                resp_h, content = self._conn.request(
-                    rtype="GET",
-                    uri_keys=('database', 'get_asyncq'),
-                    uri_args=(
-                        self._ems_id,
-                        self.__flight.get_database()['id'],
-                        query_id,
-                        n_row * ctr,
-                        n_row * (ctr+1) - 1)
-                    )
-                content['header'] = query_header
-                dff = self.__to_dataframe(content)
-            except:
-                print("Something's wrong. Returning what has been sent so far.")
-                # from pprint import pprint
-                # pprint(resp_h)
-                # pprint(content)
-                return df
+            size = n_row if sizer is None else sizer.n_row
+            print(" === Async call: %d ===" % (page+1))
+            started = metrics.clock()
+            content = read_rows(start, size, stream=True)
+            dff = self._page_to_dataframe(content, query_header)
+            if sizer is not None:
+                # Streamed pages are never held whole: the memory of a page is its DataFrame's.
+                sizer.update(dff.shape[0], metrics.clock() - started,
+                             dff.memory_usage(deep=True).sum())
+            yield page, dff
+            # Streamed pages only tell whether more rows follow once their rows are read
+            if _is_last_page(content, dff.shape[0], size):
+                return
+            start += size
+            page += 1
+
+    def sharded_run(self, field, start, end, n_shards=4, n_row=25000, deadline=None,
+                    n_workers=None):
+        """
+        Sends query to EMS API as several async-queries, one for each of n_shards equal,
+        disjoint ranges of a dateTime field, which run at the same time. Rows are returned
+        in the order of the ranges, then in the order of each async-query.
 
-            if ctr == 0:
-                df = dff
-            else:
-                df = pd.concat([df, dff], axis=0, join='outer', ignore_index=True)
+        Parameters
+        ----------
+        field: str
+            dateTime field to split the query on, e.g. 'flight date (exact)'
+        start: str or datetime
+            start of the range of field values, included. Time zone naive values are UTC.
+        end: str or datetime
+            end of the range of field values, excluded
+        n_shards: int
+            number of ranges (default 4)
+        n_row: int
+            batch size of a single async call. Default is 25000.
+        deadline: float
+            time, as given by time.time(), by which all rows must have been received. Unlike
+            other errors, which return the rows of the ranges received so far, a missed
+            deadline raises emspy.connection.DeadlineExceeded. (default None)
+        n_workers: int
+            number of async-queries running at the same time (default None, n_shards)
 
-            print("Received up to %d rows." % df.shape[0])
-            if dff.shape[0] < n_row:
-                break
-            ctr += 1
+        Returns
+        -------
+        pd.DataFrame
+            Returned data for query in Pandas' DataFrame format
+        """
+        if 'top' in self.__queryset or self.__queryset['groupBy']:
+            raise ValueError("Queries with a top or group by cannot be split in date ranges.")
+        fld = self.__flight.search_fields(field)[0]
+        if fld['type'] != 'dateTime':
+            raise ValueError("%s is not a dateTime field." % fld['name'])
+
+        bounds = [_utc_iso(t) for t in
+                  pd.date_range(_utc_naive(start), _utc_naive(end), periods=n_shards + 1)]
+        shards = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            fld_info = {'type': 'field', 'value': fld['id']}
+            queryset = _with_filters(self.__queryset, [
+                _datetime_filter('>=', [fld_info, {'type': 'constant', 'value': lo}]),
+                _datetime_filter('<', [fld_info, {'type': 'constant', 'value': hi}])
+            ])
+            shards.append((lo, hi, queryset))
+
+        def read_shard(i):
+            lo, hi, queryset = shards[i]
+            print(" === Shard %d of %d: %s to %s ===" % (i + 1, n_shards, lo, hi))
+            return self.__read_async_query(queryset, n_row, deadline), i == n_shards - 1
+
+        dfs, n_rows = [], 0
+        try:
+            # Shards are read by a pool of threads, but converted here, in order.
+            for header, pages in read_pages(read_shard, n_workers or n_shards):
+                for content in pages:
+                    dfs.append(self._page_to_dataframe(content, header))
+                    n_rows += dfs[-1].shape[0]
+                print("Received up to %d rows." % n_rows)
+        except DeadlineExceeded:
+            raise
+        except:
+            print("Something's wrong. Returning what has been sent so far.")
+            return _concat(dfs)
 
         print("Done.")
-        return df
+        return _concat(dfs)
+
+    def __read_async_query(self, queryset, n_row, deadline):
+        # Opens an async-query, reads all its pages and closes it. Returns the header and the
+        # pages.
+        with AsyncQuery.open(self._conn, self._asyncq_uri_args(), queryset, deadline) as opened:
+            pages, page = [], 0
+            while True:
+                content = opened.read(n_row * page, n_row * (page+1) - 1, deadline=deadline)
+                pages.append(content)
+                if _is_last_page(content, len(content['rows']), n_row):
+                    return opened.header, pages
+                page += 1
+
+    def to_file(self, path, file_format=None, n_row=25000, deadline=None, n_workers=1):
+        """
+        Sends query to EMS API via async-query call and writes the returned data to a
+        Parquet or Arrow IPC file, batch by batch, without building the whole DataFrame.
+        Requires pyarrow.
 
-    def run(self, n_row=25000):
+        Parameters
+        ----------
+        path: str
+            path to the output file, which is overwritten
+        file_format: str
+            'parquet' or 'arrow'. If None, it is told by the file extension ('.parquet',
+            '.pq', '.arrow', '.feather' or '.ipc'), or is 'parquet'. (default None)
+        n_row: int, 'auto' or emspy.query.pages.PageSizer
+            batch size of a single async call, or an adaptive batch size as in async_run.
+            Default is 25000.
+        deadline: float
+            time, as given by time.time(), by which all rows must have been received. Raises
+            emspy.connection.DeadlineExceeded if it is missed. (default None)
+        n_workers: int
+            number of batches requested at the same time (default 1)
+
+        Returns
+        -------
+        int
+            number of rows written
+        """
+        file_format = sink.get_format(path, file_format)
+        if self.__queryset['format'] == "display":
+            coltypes = [None for _ in self.__columns]
+        else:
+            coltypes = [c['type'] for c in self.__columns]
+
+        out = None
+        try:
+            for dff in self.iter_chunks(n_row=n_row, deadline=deadline, n_workers=n_workers):
+                if out is None:
+                    # Columns without field information, e.g. of a query loaded with
+                    # from_json_string, are written as strings.
+                    coltypes += [None] * (dff.shape[1] - len(coltypes))
+                    schema = sink.arrow_schema(list(dff.columns), coltypes)
+                    out = sink.FileSink(path, schema, file_format)
+                out.write(dff)
+                print("Written %d rows to %s." % (out.n_rows, path))
+        finally:
+            if out is not None:
+                out.close()
+        print("Done.")
+        return out.n_rows
+
+    def _asyncq_uri_args(self, *args):
+        # uri arguments of the async-query endpoints: the EMS id and database id followed by
+        # any endpoint specific arguments.
+        return (self._ems_id, self.__flight.get_database()['id']) + args
+
+    def _page_to_dataframe(self, content, header):
+        # Async-query pages do not repeat the header returned when the query was opened.
+        content['header'] = header
+        return self.__to_dataframe(content)
+
+    def run(self, n_row=25000, deadline=None, n_workers=1, checkpoint_dir=None):
         """
         Sends query to EMS API. It uses either regular or async query call depending on
         the expected size of output data. It supports only Pandas DataFrame as the output
@@ -513,39 +750,65 @@ class FltQuery(Query):
 
         Parameters
         ----------
-        n_row: int
-            batch size of a single async call. Default is 25000.
+        n_row: int, 'auto' or emspy.query.pages.PageSizer
+            batch size of a single async call, or an adaptive batch size as in async_run.
+            Default is 25000.
+        deadline: float
+            time, as given by time.time(), by which the query must have completed. Raises
+            emspy.connection.DeadlineExceeded if it is missed. (default None)
+        n_workers: int
+            number of async-query batches requested at the same time (default 1)
+        checkpoint_dir: str
+            directory where async-query batches are kept, so that the query can be resumed
+            after an error; see async_run (default None)
 
         Returns
         -------
         pd.DataFrame
-            Returned data for query in Pandas' DataFrame format
+            Returned data for query in Pandas' DataFrame format. With a result cache, a result
+            stored for the same query is returned instead of sending it.
         """
+        key = None
+        if self.result_cache is not None:
+            key = self.__result_key()
+            df = self.result_cache.get(key)
+            if df is not None:
+                print("Returning the cached result of the query.")
+                return df
+
         Nout = None
         if 'top' in self.__queryset:
             Nout = self.__queryset['top']
 
         if (Nout is not None) and (Nout <= 25000):
-            return self.simple_run(output="dataframe")
+            df, complete = self.simple_run(output="dataframe", deadline=deadline), True
+        else:
+            df, complete = self.__async_run(n_row, deadline, n_workers, checkpoint_dir)
 
-        return self.async_run(n_row=n_row)
+        # Results cut short by an error are not kept
+        if key is not None and complete and df is not None:
+            self.result_cache.store(key, df)
+        return df
+
+    def __result_key(self):
+        return ResultCache.key(self.__queryset, self._ems_id, self.__flight.get_database()['id'],
+                               self._conn._uri_root, getattr(self._conn, 'user', None))
 
     def __to_dataframe(self, json_output):
         # Changes Dict (JSON) formatted raw output from the EMS API to Pandas' DataFrame.
-        print("Raw JSON output to Pandas dataframe...")
         col = [h['name'] for h in json_output['header']]
         coltypes = [c['type'] for c in self.__columns]
         col_id = [c['id'] for c in self.__columns]
         val = json_output['rows']
 
-        df = pd.DataFrame(data=val, columns=col)
-
-        if df.empty:
-            return df
-
         if self.__queryset['format'] == "display":
-            print("Done.")
-            return df
+            return pd.DataFrame(data=val, columns=col)
+
+        # Rows are transposed once, and each column is built with its type from the values
+        # of the column, without an intermediate DataFrame of Python objects.
+        values = list(zip(*val))
+        if not values:
+            return pd.DataFrame(data=[], columns=col)
 
         # Do the dirty work of casting a right type for each column of the data
         # Note
@@ -558,39 +821,37 @@ class FltQuery(Query):
         # query for runway IDs with "queryset$format = display", and then push the
         # this query result at the runway ID column of the original query result.
         # I know this is crappy but it seems the best way I could find.
+        # Queries loaded with from_json_string have no field information: their columns are
+        # left to pandas to infer, like those beyond the selected fields.
+        coltypes += [None] * (len(col) - len(coltypes))
+        col_id += [None] * (len(col) - len(col_id))
+        columns = OrderedDict()
         for i, cid, cname, ctype in zip(range(len(col)), col_id, col, coltypes):
             try:
-                if ctype == 'number':
-                    df.iloc[:, i] = pd.to_numeric(df.iloc[:, i])
+                if ctype is None:
+                    columns[i] = list(values[i])
+                elif ctype == 'number':
+                    columns[i] = _to_numeric(values[i])
                 elif ctype == 'discrete':
-                    df.iloc[:, i] = self.__key_to_val(df.iloc[:, i], cid)
-                    # k_map = self.__flight.list_allvalues(field_id=cid, in_dict=True)
-                    # if len(k_map) == 0:
-                    #     df[cname] = self.__get_rwy_id(cname)
-                    # else:
-                    #     df = df.replace({cname: k_map})
+                    columns[i] = self.__key_to_val(values[i], cid)
                 elif ctype == 'boolean':
-                    df.iloc[:, i] = df.iloc[:, i].astype(bool)
+                    columns[i] = np.array(values[i], dtype=bool)
                 elif ctype == 'dateTime':
-                    df.iloc[:, i] = pd.to_datetime(df.iloc[:, i], utc=True)
-            except ValueError:
+                    columns[i] = pd.to_datetime(_object_array(values[i]), utc=True)
+                else:
+                    columns[i] = _object_array(values[i])
+            except (ValueError, TypeError):
                 print("Somethings wrong when converting to Pandas DataFrame for column '%s' "
                       "(type: %s)." % (cname, ctype))
-        print("Done.")
+                columns[i] = _object_array(values[i])
+        df = pd.DataFrame(columns, copy=False)
+        df.columns = col
         return df
 
-    def __key_to_val(self, ds, field_id):
-        k_map = self.__flight.list_allvalues(field_id=field_id, in_df=True)
-        # Sometimes k_map is a very large table making "replace" operation
-        # very slow. Just grap kv-maps subset that are present in the target
-        # dataframe
-        k_map = k_map[k_map.key.isin(ds.unique())]
-        # Change k_map in dict
-        km_dict = dict()
-        for i, r in k_map.iterrows():
-            km_dict[r['key']] = r['value']
-        ds = ds.replace(km_dict)
-        return ds
+    def __key_to_val(self, keys, field_id):
+        # The code table of a field is cached, so pages and queries after the first one only
+        # look up their keys.
+        return self.__flight.code_table(field_id).decode(keys)
 
     def __get_rwy_id(self, cname):
         # Deprecated
@@ -730,6 +991,95 @@ sp_ops = OrderedDict([
 
 # '=Null': 'isNull', '!=Null': 'isNotNull', 'and': 'And', 'or': 'Or', 'in': 'in', 'not in': 'notIn'
 
+# Translated filter expressions by (API root, EMS id, database id, expression)
+_filter_cache = dict()
+_filter_cache_lock = threading.Lock()
+
+
+def _utc_naive(t):
+    # Timestamp in UTC without time zone, time zone naive values being UTC already
+    t = pd.Timestamp(t)
+    if t.tzinfo is not None:
+        t = t.tz_convert('UTC').tz_localize(None)
+    return t
+
+
+def _utc_iso(t):
+    return t.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def _with_filters(queryset, filters):
+    # Copy of a queryset whose rows also meet all the given filters
+    queryset = copy.deepcopy(queryset)
+    current = queryset.get('filter')
+    if current is None or not current['args']:
+        queryset['filter'] = dict(operator='and', args=filters)
+    elif current['operator'] == 'and':
+        current['args'] += filters
+    else:
+        queryset['filter'] = dict(operator='and',
+                                  args=[{'type': 'filter', 'value': current}] + filters)
+    return queryset
+
+
+def _concat(dfs):
+    # Joins the DataFrames of async-query batches, at once. Empty batches, whose columns are
+    # not typed, are left out unless all are empty.
+    if not dfs:
+        return None
+    dfs = [df for df in dfs if df.shape[0] > 0] or dfs[:1]
+    if len(dfs) == 1:
+        return dfs[0]
+    df = pd.concat(dfs, axis=0, join='outer', ignore_index=True)
+    # Batches with keys missing from the code table of a discrete field add categories of their
+    # own, and pd.concat of categoricals with different categories falls back to objects.
+    for name in df.columns:
+        parts = [d[name] for d in dfs]
+        if not isinstance(df[name].dtype, pd.CategoricalDtype) and \
+                all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            df[name] = union_categoricals(parts)
+    return df
+
+
+def _page_sizer(n_row, n_workers):
+    # PageSizer choosing the batch sizes, or None for batches of n_row rows
+    if isinstance(n_row, PageSizer):
+        sizer = n_row
+    elif isinstance(n_row, string_types) and n_row == 'auto':
+        sizer = PageSizer()
+    else:
+        return None
+    if n_workers > 1:
+        raise ValueError("Adaptive batch sizes need n_workers=1.")
+    return sizer
+
+
+def _is_last_page(content, n_rows, n_row):
+    # Tells if an async-query page is the last one: the API says there are no more rows, or
+    # the page is not full.
+    return content.get('hasMoreRows') is False or n_rows < n_row
+
+
+def _object_array(values):
+    # 1-d array of Python objects, whatever the values are (e.g. tuples stay elements)
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+def _to_numeric(values):
+    # Integer columns stay integers, as with pd.to_numeric. Columns with missing values are
+    # floats, with NaN for the missing values; anything else is left to pandas.
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'iuf':
+        return arr
+    if arr.dtype.kind == 'O':
+        try:
+            return np.array(values, dtype='float64')
+        except (ValueError, TypeError):
+            pass
+    return pd.to_numeric(_object_array(values))
+
 
 def _filter_fmt1(op, *args):
     fltr = {
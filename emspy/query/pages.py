@@ -0,0 +1,197 @@
+"""
+Concurrent reading of the pages of an async-query, and adaptive page sizes.
+"""
+from __future__ import absolute_import
+
+from builtins import object
+import threading
+
+
+def read_pages(read_page, n_workers):
+    """
+    Reads pages 0, 1, 2, ... with a pool of threads, until the last one.
+
+    Parameters
+    ----------
+    read_page: callable
+        receives a page number and returns the page content and whether it is the last page
+    n_workers: int
+        number of pages read at the same time
+
+    Yields
+    ------
+    object
+        page contents, in page order. An error raised reading a page is raised when that page
+        is reached, after the pages before it were yielded. Pages are read at most n_workers
+        ahead of the one last yielded.
+    """
+    pages = _Pages(read_page, max(1, n_workers))
+    workers = [threading.Thread(target=pages.work) for _ in range(pages.window)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+    try:
+        page = 0
+        while True:
+            content, error = pages.wait(page)
+            if error is not None:
+                raise error
+            yield content
+            if page == pages.last:
+                return
+            page += 1
+    finally:
+        pages.stop()
+        for w in workers:
+            w.join()
+
+
+class _Pages(object):
+    """
+    Pages read so far, shared by the reading threads
+    """
+    def __init__(self, read_page, window):
+        self._read_page = read_page
+        # Number of pages read, or waiting to be taken, at any time
+        self.window = window
+        self._cond = threading.Condition()
+        self._next = 0
+        self._taken = 0
+        self._done = {}
+        self._stopped = False
+        # Number of the last page, once known
+        self.last = None
+
+    def _take(self):
+        # Next page to read, or None when there is nothing left to read
+        with self._cond:
+            while not self._stopped and self._next >= self._taken + self.window:
+                self._cond.wait()
+            if self._stopped or (self.last is not None and self._next > self.last):
+                return None
+            page = self._next
+            self._next += 1
+            return page
+
+    def work(self):
+        while True:
+            page = self._take()
+            if page is None:
+                return
+            try:
+                content, is_last = self._read_page(page)
+                error = None
+            except Exception as e:
+                content, is_last, error = None, False, e
+            with self._cond:
+                self._done[page] = (content, error)
+                if error is not None:
+                    # Pages after a failed one are of no use
+                    self._stopped = True
+                elif is_last and (self.last is None or page < self.last):
+                    self.last = page
+                self._cond.notify_all()
+
+    def wait(self, page):
+        with self._cond:
+            while page not in self._done:
+                self._cond.wait()
+            self._taken = page + 1
+            self._cond.notify_all()
+            return self._done.pop(page)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+class PageSizer(object):
+    """
+    Chooses the number of rows of the next page of an async-query from the time taken and the
+    memory used by the pages read so far, so that pages take about target_seconds to read and
+    convert and hold at most max_bytes. Narrow queries get large pages and wide ones small
+    pages.
+
+    Attributes
+    ----------
+    n_row: int
+        number of rows of the next page
+    seconds_per_row: float
+        smoothed time spent per row, None until a page was measured
+    bytes_per_row: float
+        smoothed memory used per row, None until a page was measured
+    """
+    def __init__(self, target_seconds=2., max_bytes=128 * 1024 * 1024, first=1000,
+                 min_rows=100, max_rows=25000, smoothing=0.5, max_growth=4.):
+        """
+        PageSizer initialization
+
+        Parameters
+        ----------
+        target_seconds: float
+            time a page should take to read and convert (default 2)
+        max_bytes: int
+            memory a page may use once converted to a DataFrame (default 128 MiB)
+        first: int
+            number of rows of the first page (default 1000)
+        min_rows: int
+            smallest page size (default 100)
+        max_rows: int
+            largest page size; the API returns at most 25000 rows per call (default 25000)
+        smoothing: float
+            weight of the last page in the smoothed measurements, between 0 and 1
+            (default 0.5)
+        max_growth: float
+            largest factor by which a page is larger than the previous one (default 4)
+        """
+        if not 0 < min_rows <= max_rows:
+            raise ValueError("Page sizes must satisfy 0 < min_rows <= max_rows.")
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.smoothing = smoothing
+        self.max_growth = max_growth
+        self.n_row = self.__clamp(first)
+        self.seconds_per_row = None
+        self.bytes_per_row = None
+
+    def update(self, n_rows, seconds, n_bytes):
+        """
+        Records the measurements of a page and chooses the size of the next one
+
+        Parameters
+        ----------
+        n_rows: int
+            number of rows of the page
+        seconds: float
+            time spent reading and converting the page
+        n_bytes: int
+            memory used by the page
+
+        Returns
+        -------
+        int
+            number of rows of the next page
+        """
+        if n_rows <= 0:
+            return self.n_row
+        self.seconds_per_row = self.__smooth(self.seconds_per_row, float(seconds) / n_rows)
+        self.bytes_per_row = self.__smooth(self.bytes_per_row, float(n_bytes) / n_rows)
+
+        n_row = self.max_rows
+        if self.seconds_per_row > 0:
+            n_row = min(n_row, self.target_seconds / self.seconds_per_row)
+        if self.bytes_per_row > 0:
+            n_row = min(n_row, self.max_bytes / self.bytes_per_row)
+        self.n_row = self.__clamp(min(n_row, self.n_row * self.max_growth))
+        return self.n_row
+
+    def __smooth(self, previous, value):
+        if previous is None:
+            return value
+        return self.smoothing * value + (1. - self.smoothing) * previous
+
+    def __clamp(self, n_row):
+        return int(max(self.min_rows, min(self.max_rows, n_row)))
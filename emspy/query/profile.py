@@ -75,19 +75,22 @@ class Profile(Query):
                 uri_keys=('profile', 'glossary'),
                 uri_args=(self._ems_id, self._guid)
             )
-            a = pd.DataFrame.from_dict(dict_data)
-            # convert the dictionaries values within the glossaryItems column into a new DataFrame
-            b = a['glossaryItems'].apply(pd.Series)
-            # concatenate a and b, drop the old glossaryItems column name
-            c = pd.concat([a, b], axis=1).drop('glossaryItems', axis=1)
-            self._glossary = c
-            return self._glossary
+            return self._set_glossary(dict_data)
         else:
             print("The search results did not return a profile matching the input profile name and "
                   "number on the given system. Please try to instantiate the profile object with "
                   "different arguments.")
             return
 
+    def _set_glossary(self, dict_data):
+        a = pd.DataFrame.from_dict(dict_data)
+        # convert the dictionaries values within the glossaryItems column into a new DataFrame
+        b = a['glossaryItems'].apply(pd.Series)
+        # concatenate a and b, drop the old glossaryItems column name
+        c = pd.concat([a, b], axis=1).drop('glossaryItems', axis=1)
+        self._glossary = c
+        return self._glossary
+
     def get_events_glossary(self):
         """
         Method to get the events glossary for the profile
@@ -175,6 +178,9 @@ class Profile(Query):
             selected event field for selected flight
         """
         profile_results = self.__query_profile_results(flight_id)
+        return self._events_from_results(profile_results)
+
+    def _events_from_results(self, profile_results):
         events = pd.DataFrame(profile_results['events'])
 
         # Grab event names and ID's from the glossary.
@@ -0,0 +1,175 @@
+"""
+On-disk cache of flight query results.
+
+A result is stored as a pickled DataFrame, with its column types, in a SQLite file and keyed
+on the query as sent to the API together with the EMS system, database, server and user. It is
+returned by FltQuery.run() instead of querying the API again until it is older than the cache's
+ttl. The least recently used results are evicted once the cache grows beyond its maximum size.
+
+Results are unpickled when read: only use cache files written by a trusted user.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+
+from emspy.lrustore import LRUStore
+
+
+class ResultCache(object):
+    """
+    Size-bounded LRU cache of query results stored in a SQLite file
+    """
+    def __init__(self, path, max_size=512 * 1024 * 1024, ttl=60 * 60):
+        """
+        Result cache initialization
+
+        Parameters
+        ----------
+        path: str
+            path to the SQLite cache file; it is created if it does not exist
+        max_size: int
+            maximum total size in bytes of the stored results (default 512 MiB)
+        ttl: float
+            seconds a stored result is used before the query is sent again (default one hour)
+        """
+        self._store = LRUStore(path, 'results', [('body', 'BLOB'), ('n_rows', 'INTEGER')],
+                               max_size)
+        self.path = self._store.path
+        self.ttl = ttl
+        # Numbers of lookups made with this cache object which found a stored result, and not
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        """
+        Maximum total size in bytes of the stored results
+        """
+        return self._store.max_size
+
+    @max_size.setter
+    def max_size(self, max_size):
+        self._store.max_size = max_size
+
+    @staticmethod
+    def key(queryset, ems_id, db_id, uri_root=None, user=None):
+        """
+        Cache key of a query. The queryset is canonicalized, so the order in which its
+        members were set does not matter. Results are stored per user, as they depend on the
+        user's permissions.
+
+        Parameters
+        ----------
+        queryset: dict
+            query as sent to the API, e.g. FltQuery.in_dict()
+        ems_id: int
+            EMS system id
+        db_id: str
+            database id
+        uri_root: str
+            root url of the API (default None)
+        user: str
+            user name (default None)
+
+        Returns
+        -------
+        str
+            the key
+        """
+        # default=str for numpy numbers, e.g. EMS ids read from the meta-data file
+        canonical = json.dumps([uri_root, user, ems_id, db_id, queryset], sort_keys=True,
+                               separators=(',', ':'), default=str)
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a stored result
+
+        Parameters
+        ----------
+        key: str
+            cache key
+
+        Returns
+        -------
+        pd.DataFrame or None
+            the stored result, None if there is none or it is older than ttl
+        """
+        row = self._store.get(key, max_age=self.ttl)
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            df = pickle.loads(bytes(row[0]))
+        except Exception:
+            # e.g. stored by a pandas version which cannot be read by this one
+            self.discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return df
+
+    def store(self, key, df):
+        """
+        Stores a result, evicting the least recently used ones if the cache is full
+
+        Parameters
+        ----------
+        key: str
+            cache key
+        df: pd.DataFrame
+            query result. It is not stored if it is larger than max_size.
+        """
+        body = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store.put(key, len(body), (sqlite3.Binary(body), len(df)))
+
+    def discard(self, key):
+        """
+        Removes a stored result
+        """
+        self._store.discard(key)
+
+    def stats(self):
+        """
+        Cache statistics
+
+        Returns
+        -------
+        dict
+            'hits' and 'misses' of the lookups made with this cache object, and the number of
+            stored results ('entries') and their total size in bytes ('size')
+        """
+        entries, size = self._store.counts()
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'size': size}
+
+    def size(self):
+        """
+        Total size in bytes of the stored results
+        """
+        return self._store.size()
+
+    def __len__(self):
+        return len(self._store)
+
+    def clear(self):
+        """
+        Removes all stored results
+        """
+        self._store.clear()
+
+    def close(self):
+        """
+        Closes the cache file
+        """
+        self._store.close()
@@ -0,0 +1,146 @@
+"""
+Writing of query results to Parquet and Arrow IPC files, batch by batch.
+
+Requires pyarrow (pip install pyarrow). The schema of a file is derived from the types of the
+selected fields, not from the data, so that every batch, and every file written by the same
+query, has the same schema:
+
+    number    float64
+    discrete  string
+    boolean   bool
+    dateTime  timestamp[ns, tz=UTC]
+    string    string
+"""
+from __future__ import absolute_import
+
+from builtins import object
+from builtins import zip
+import os
+
+import pandas as pd
+
+FORMATS = ('parquet', 'arrow')
+
+# File extensions telling the format, when it is not given
+EXTENSIONS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow'
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Writing Parquet or Arrow files requires pyarrow. "
+                          "Install it with 'pip install pyarrow'.")
+    return pyarrow
+
+
+def arrow_type(field_type):
+    """
+    Arrow type of the values of an EMS field type
+    """
+    pa = _pyarrow()
+    if field_type == 'number':
+        return pa.float64()
+    if field_type == 'boolean':
+        return pa.bool_()
+    if field_type == 'dateTime':
+        return pa.timestamp('ns', tz='UTC')
+    return pa.string()
+
+
+def arrow_schema(names, field_types):
+    """
+    Arrow schema of a query result
+
+    Parameters
+    ----------
+    names: list
+        column names
+    field_types: list
+        EMS field type of each column, e.g. 'number' or 'discrete'. None for string columns.
+
+    Returns
+    -------
+    pyarrow.Schema
+        the schema
+    """
+    pa = _pyarrow()
+    return pa.schema([pa.field(name, arrow_type(t)) for name, t in zip(names, field_types)])
+
+
+def get_format(path, file_format=None):
+    """
+    Format of a file, given or told by its extension. Defaults to 'parquet'.
+    """
+    if file_format is None:
+        file_format = EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'parquet')
+    if file_format not in FORMATS:
+        raise ValueError("file_format must be one of %s. Found: %s" % (FORMATS, file_format))
+    return file_format
+
+
+class FileSink(object):
+    """
+    Parquet or Arrow IPC file written one DataFrame at a time. Each DataFrame is written as a
+    Parquet row group or an Arrow record batch, so only one of them is held in memory.
+    """
+    def __init__(self, path, schema, file_format=None):
+        """
+        FileSink initialization
+
+        Parameters
+        ----------
+        path: str
+            path to the file, which is overwritten
+        schema: pyarrow.Schema
+            schema of the file
+        file_format: str
+            'parquet' or 'arrow'. If None, the format is told by the file extension, or is
+            'parquet'. (default None)
+        """
+        self._pa = _pyarrow()
+        self.path = path
+        self.schema = schema
+        self.file_format = get_format(path, file_format)
+        self.n_rows = 0
+        if self.file_format == 'parquet':
+            import pyarrow.parquet
+            self._writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            self._writer = self._pa.ipc.new_file(path, schema)
+
+    def write(self, df):
+        """
+        Writes a DataFrame, whose columns are those of the schema, in order
+        """
+        arrays = [self.__to_array(df.iloc[:, i], field.type)
+                  for i, field in enumerate(self.schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self.schema))
+        self.n_rows += df.shape[0]
+
+    def __to_array(self, values, arrow_type):
+        # Values are made to fit the column type, even when the DataFrame could not be typed,
+        # e.g. a discrete column whose keys were not all found.
+        pa = self._pa
+        if pa.types.is_floating(arrow_type):
+            values = pd.to_numeric(values, errors='coerce').astype('float64')
+        elif pa.types.is_timestamp(arrow_type):
+            values = pd.to_datetime(values, utc=True, errors='coerce')
+        elif pa.types.is_string(arrow_type):
+            values = [None if pd.isna(v) else str(v) for v in values]
+        return pa.array(values, type=arrow_type, from_pandas=True)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -293,7 +293,7 @@ class TSeriesQuery(Query):
         self.__queryset['offsets'] = tpoint
 
     def run(self, flight, start=None, end=None, timestep=None, timepoint=None,
-            discretes_as_strings=True):
+            discretes_as_strings=True, deadline=None):
         """
         Runs the query
 
@@ -311,6 +311,9 @@ class TSeriesQuery(Query):
             time point datetime
         discretes_as_strings: bool
             allows user to treat discrete values as strings (default True)
+        deadline: float
+            time, as given by time.time(), by which the query must have completed. Raises
+            emspy.connection.DeadlineExceeded if it is missed. (default None)
 
         Returns
         -------
@@ -318,6 +321,20 @@ class TSeriesQuery(Query):
             pandas dataframe with the selected data
         """
 
+        queryset = self._run_queryset(start, end, timestep, timepoint, discretes_as_strings)
+        _, content = self._conn.request(
+            uri_keys=("analytic", "query"),
+            uri_args=(self._ems_id, flight),
+            jsondata=queryset,
+            deadline=deadline
+        )
+        return self._run_result(flight, content)
+
+    def _run_queryset(self, start=None, end=None, timestep=None, timepoint=None,
+                      discretes_as_strings=True):
+        # Applies the run arguments to the queryset and returns a copy of it, so that queries
+        # for several flights can be in flight at the same time.
+
         # if start is None:
         #     start = 0.0
 
@@ -348,12 +365,9 @@ class TSeriesQuery(Query):
         else:
             self.range(start, end)
 
-        _, content = self._conn.request(
-            uri_keys=("analytic", "query"),
-            uri_args=(self._ems_id, flight),
-            jsondata=self.__queryset
-        )
+        return dict(self.__queryset)
 
+    def _run_result(self, flight, content):
         if 'message' in content:
             sys.exit('API query for flight %d was unsuccessful.\n'
                      'Here is the message from API: %s' % (flight, content['message']))
@@ -365,7 +379,7 @@ class TSeriesQuery(Query):
         return df
 
     def multi_run(self, flight, start=None, end=None, timestep=None, timepoint=None, save_file=None,
-                  verbose=True):
+                  verbose=True, deadline=None):
         """
         Wraps the run method to run several timepoints
 
@@ -385,6 +399,10 @@ class TSeriesQuery(Query):
             path to dump the data to using pickle
         verbose: bool
             sets verbose output
+        deadline: float
+            time, as given by time.time(), by which the queries for all flights must have
+            completed. Raises emspy.connection.DeadlineExceeded if it is missed; the results
+            received before are in save_file, if given. (default None)
 
         Returns
         -------
@@ -425,7 +443,7 @@ class TSeriesQuery(Query):
                 i_res['flt_data'] = flight.iloc[i, :].to_dict()
             else:
                 i_res['flt_data'] = {'Flight Record': fr}
-            i_res['ts_data'] = self.run(fr, start[i], end[i], timestep[i])
+            i_res['ts_data'] = self.run(fr, start[i], end[i], timestep[i], deadline=deadline)
             res.append(i_res)
             if save_file is not None:
                 pickle.dump(res, open(save_file, 'wb'))
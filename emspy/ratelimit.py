@@ -0,0 +1,280 @@
+"""
+Client-side throttling of API requests.
+
+A RequestLimiter holds a token-bucket rate limit and a cap on the number of requests in flight
+for each endpoint family (see emspy.common.endpoint_families). Requests exceeding either wait
+in line, first come first served, instead of being rejected by the API with 429 responses.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import collections
+import threading
+import time
+
+from . import common
+from .connection import DeadlineExceeded
+
+
+class TokenBucket(object):
+    """
+    Token-bucket rate limiter. Requests are let through at the given rate on average, with
+    bursts of up to burst requests.
+    """
+    def __init__(self, rate, burst=1):
+        """
+        Token bucket initialization
+
+        Parameters
+        ----------
+        rate: float
+            requests per second
+        burst: int
+            number of requests which may be sent at once after an idle period (default 1)
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1. Found: %s, %s"
+                             % (rate, burst))
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self, deadline=None):
+        """
+        Takes a token, reserving one in advance if there is none left. Reservations are served
+        in the order they are made.
+
+        Parameters
+        ----------
+        deadline: float
+            time, as given by time.time(), after which the token would be of no use
+            (default None)
+
+        Returns
+        -------
+        float
+            seconds to wait before the request may be sent
+
+        Raises
+        ------
+        DeadlineExceeded
+            if the token would only be available after the deadline. No token is taken.
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0., (1. - self._tokens) / self.rate)
+            if deadline is not None and now + wait > deadline:
+                raise DeadlineExceeded("Rate limit would delay the request past its deadline.")
+            self._tokens -= 1.
+            return wait
+
+    def acquire(self, deadline=None):
+        """
+        Waits until the request may be sent
+
+        Parameters
+        ----------
+        deadline: float
+            time, as given by time.time(), after which waiting is of no use (default None)
+        """
+        wait = self.reserve(deadline)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class FairSemaphore(object):
+    """
+    Semaphore whose waiters acquire it in the order they arrived. Threads and asyncio tasks
+    (see emspy.aio) can wait on the same semaphore.
+    """
+    def __init__(self, value):
+        """
+        Semaphore initialization
+
+        Parameters
+        ----------
+        value: int
+            number of holders allowed at the same time
+        """
+        if value < 1:
+            raise ValueError("value must be a positive integer. Found: %s" % value)
+        self.value = value
+        self._holders = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """
+        Waits for the semaphore
+
+        Parameters
+        ----------
+        deadline: float
+            time, as given by time.time(), after which waiting is of no use (default None)
+
+        Raises
+        ------
+        DeadlineExceeded
+            if the semaphore could not be acquired before the deadline
+        """
+        event = threading.Event()
+        grant = event.set
+        if self._enqueue(grant):
+            return
+        timeout = None if deadline is None else max(0., deadline - time.time())
+        try:
+            granted = event.wait(timeout)
+        except BaseException:
+            # e.g. KeyboardInterrupt: the waiter must not keep, or be handed, a slot nobody
+            # would release.
+            if not self._cancel(grant):
+                self.release()
+            raise
+        if not granted and self._cancel(grant):
+            raise DeadlineExceeded("Too many requests in flight to send the request before "
+                                   "its deadline.")
+
+    def release(self):
+        """
+        Releases the semaphore, handing it to the longest waiting waiter if any
+        """
+        with self._lock:
+            if self._waiters:
+                grant = self._waiters.popleft()
+            else:
+                self._holders -= 1
+                return
+        grant()
+
+    def in_use(self):
+        """
+        Number of current holders
+        """
+        with self._lock:
+            return self._holders
+
+    def _enqueue(self, grant):
+        # Acquires the semaphore if it is free and nobody waits, otherwise queues the waiter,
+        # whose grant callable is called once the semaphore is handed to it.
+        with self._lock:
+            if self._holders < self.value and not self._waiters:
+                self._holders += 1
+                return True
+            self._waiters.append(grant)
+            return False
+
+    def _cancel(self, grant):
+        # Removes a waiter which gave up. Returns False if it was granted the semaphore in the
+        # meantime, in which case it holds the semaphore.
+        with self._lock:
+            try:
+                self._waiters.remove(grant)
+                return True
+            except ValueError:
+                return False
+
+
+class RequestLimiter(object):
+    """
+    Rate limits and in-flight caps per endpoint family. A limiter can be shared by several
+    connections to stay within one tenant's limits.
+    """
+    def __init__(self, rate_limits=None, max_in_flight=None):
+        """
+        Request limiter initialization
+
+        Parameters
+        ----------
+        rate_limits: dict
+            requests per second, or (requests per second, burst), per endpoint family of
+            emspy.common.timeouts, e.g. {'query': 2, 'async_read': (10, 20)} (default None)
+        max_in_flight: dict
+            maximum number of concurrent requests per endpoint family, e.g. {'analytic': 8}
+            (default None)
+        """
+        self.buckets = dict()
+        self.semaphores = dict()
+        for family, rate in (rate_limits or {}).items():
+            _check_family(family)
+            rate, burst = rate if isinstance(rate, (tuple, list)) else (rate, 1)
+            self.buckets[family] = TokenBucket(rate, burst)
+        for family, value in (max_in_flight or {}).items():
+            _check_family(family)
+            self.semaphores[family] = FairSemaphore(value)
+
+    def acquire(self, family, deadline=None):
+        """
+        Waits for an in-flight slot of the endpoint family. Must be followed by release once
+        the response has been read.
+
+        Parameters
+        ----------
+        family: str
+            endpoint family
+        deadline: float
+            time, as given by time.time(), after which waiting is of no use (default None)
+
+        Raises
+        ------
+        DeadlineExceeded
+            if no slot was freed before the deadline
+        """
+        semaphore = self.semaphores.get(family)
+        if semaphore is not None:
+            semaphore.acquire(deadline)
+
+    def throttle(self, family, deadline=None):
+        """
+        Waits until the rate limit of the endpoint family lets a request through
+
+        Parameters
+        ----------
+        family: str
+            endpoint family
+        deadline: float
+            time, as given by time.time(), after which waiting is of no use (default None)
+
+        Raises
+        ------
+        DeadlineExceeded
+            if the request could only be sent after the deadline
+        """
+        wait = self.reserve(family, deadline)
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self, family, deadline=None):
+        """
+        Reserves a request under the rate limit of the endpoint family without waiting
+
+        Returns
+        -------
+        float
+            seconds to wait before the request may be sent
+        """
+        bucket = self.buckets.get(family)
+        return bucket.reserve(deadline) if bucket is not None else 0.
+
+    def release(self, family):
+        """
+        Frees the in-flight slot taken by acquire
+
+        Parameters
+        ----------
+        family: str
+            endpoint family
+        """
+        semaphore = self.semaphores.get(family)
+        if semaphore is not None:
+            semaphore.release()
+
+
+def _check_family(family):
+    if family not in common.timeouts:
+        raise ValueError("Unknown endpoint family '%s'. Use one of %s."
+                         % (family, sorted(common.timeouts)))
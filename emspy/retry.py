@@ -0,0 +1,202 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sys
+if sys.version_info < (3, 0):
+    from future import standard_library
+    standard_library.install_aliases()
+
+from builtins import object
+import email.utils
+import errno
+import http.client
+import random
+import socket
+import ssl
+import time
+import urllib.error
+
+from . import common
+
+# Actions returned by RetryPolicy.action
+REAUTHENTICATE = 'reauthenticate'
+RETRY = 'retry'
+
+# Status codes of gateways which may have passed the request on before failing
+_GATEWAY_ERRORS = (502, 504)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed request is sent again
+    """
+    def __init__(self, max_retries=5, backoff_factor=0.5, max_backoff=60., jitter=0.5,
+                 status_codes=(429, 502, 503, 504), respect_retry_after=True,
+                 unsafe_uri_keys=(('database', 'create'),)):
+        """
+        Retry policy initialization
+
+        Parameters
+        ----------
+        max_retries: int
+            maximum number of times a request is sent again after it failed (default 5)
+        backoff_factor: float
+            the n-th retry waits backoff_factor * 2 ** (n - 1) seconds (default 0.5)
+        max_backoff: float
+            maximum number of seconds to wait before a retry, including Retry-After waits
+            (default 60)
+        jitter: float
+            fraction of the backoff which is randomized, from 0 (none) to 1 (default 0.5)
+        status_codes: tuple
+            HTTP status codes which are retried (default 429, 502, 503 and 504)
+        respect_retry_after: bool
+            wait as long as the Retry-After response header asks for, if given (default True)
+        unsafe_uri_keys: tuple
+            uri keys of requests which are not idempotent. They are never sent again unless
+            the server rejected them as unauthorized. (default (('database', 'create'),))
+
+        Requests which may have reached the server before failing, e.g. those which timed out
+        waiting for the response or got a 502 or 504 response from a gateway, are only sent
+        again if they are idempotent; see idempotent().
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = tuple(status_codes)
+        self.respect_retry_after = respect_retry_after
+        self.unsafe_uri_keys = tuple(tuple(k) for k in unsafe_uri_keys)
+
+    def action(self, exc, attempt, uri_keys=None, reauthenticated=False, method=None):
+        """
+        Decides what to do about a failed request
+
+        Parameters
+        ----------
+        exc: Exception
+            exception raised while sending the request
+        attempt: int
+            number of retries made so far for this request
+        uri_keys: tuple
+            uri keys of the request (default None)
+        reauthenticated: bool
+            whether the connection already re-authenticated for this request (default False)
+        method: str
+            HTTP method of the request (default None, unknown)
+
+        Returns
+        -------
+        str or None
+            emspy.retry.REAUTHENTICATE, emspy.retry.RETRY, or None to give up
+        """
+        if isinstance(exc, urllib.error.HTTPError):
+            if exc.code == 401:
+                return None if reauthenticated else REAUTHENTICATE
+            retryable = exc.code in self.status_codes and (
+                exc.code not in _GATEWAY_ERRORS or self.idempotent(method, uri_keys))
+        else:
+            retryable = is_connection_error(exc) and (
+                not _may_have_been_applied(exc) or self.idempotent(method, uri_keys))
+        if not retryable or attempt >= self.max_retries:
+            return None
+        if uri_keys is not None and tuple(uri_keys) in self.unsafe_uri_keys:
+            return None
+        return RETRY
+
+    def idempotent(self, method=None, uri_keys=None):
+        """
+        Tells if a request can be sent again without changing its result: requests with an
+        idempotent method (emspy.common.idempotent_methods) and POST requests to read-only
+        endpoints (emspy.common.read_only_posts), unless their uri keys are unsafe
+
+        Parameters
+        ----------
+        method: str
+            HTTP method (default None, unknown)
+        uri_keys: tuple
+            uri keys of the request (default None)
+
+        Returns
+        -------
+        bool
+            True if the request is idempotent
+        """
+        if uri_keys is not None and tuple(uri_keys) in self.unsafe_uri_keys:
+            return False
+        if method in common.idempotent_methods:
+            return True
+        return uri_keys is not None and tuple(uri_keys) in common.read_only_posts
+
+    def backoff(self, attempt, exc=None):
+        """
+        Number of seconds to wait before a retry
+
+        Parameters
+        ----------
+        attempt: int
+            number of retries made so far for this request
+        exc: Exception
+            exception raised by the failed request, used for its Retry-After header
+            (default None)
+
+        Returns
+        -------
+        float
+            seconds to wait
+        """
+        delay = self.backoff_factor * (2 ** attempt)
+        delay -= delay * self.jitter * random.random()
+        if self.respect_retry_after and isinstance(exc, urllib.error.HTTPError):
+            retry_after = _retry_after(exc.headers)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return min(delay, self.max_backoff)
+
+
+def is_connection_error(exc):
+    """
+    Tells if an exception is a network level error that may go away when the request is resent
+
+    Parameters
+    ----------
+    exc: Exception
+        exception raised while sending a request
+
+    Returns
+    -------
+    bool
+        True for connection errors and timeouts, False otherwise
+    """
+    if isinstance(exc, urllib.error.HTTPError):
+        return False
+    if isinstance(exc, urllib.error.URLError):
+        exc = exc.reason if isinstance(exc.reason, BaseException) else None
+        if exc is None:
+            return True
+    if isinstance(exc, ssl.CertificateError):
+        return False
+    return isinstance(exc, (socket.error, socket.timeout, http.client.HTTPException))
+
+
+def _may_have_been_applied(exc):
+    # Connection errors raised once the request could have been received by the server: timeouts,
+    # and connections reset or closed before the response was read.
+    if isinstance(exc, urllib.error.URLError) and isinstance(exc.reason, BaseException):
+        exc = exc.reason
+    if isinstance(exc, (socket.timeout, http.client.HTTPException)):
+        return True
+    return getattr(exc, 'errno', None) == errno.ECONNRESET
+
+
+def _retry_after(headers):
+    value = headers.get('Retry-After') if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0., email.utils.mktime_tz(parsed) - time.time())
@@ -0,0 +1,80 @@
+"""
+Single-flight execution: concurrent calls with the same key share the result of one call.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from builtins import object
+import copy
+import threading
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time. Callers arriving while a call with their key is
+    running wait for it and receive a copy of its result, or its exception.
+    """
+    def __init__(self):
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Calls fn(*args, **kwargs) unless a call with the same key is already running, in which
+        case its result is shared
+
+        Parameters
+        ----------
+        key: hashable
+            identifies calls which can share their result
+        fn: callable
+            function to call
+
+        Returns
+        -------
+        object
+            result of fn. Callers sharing a result each receive their own deep copy of it, so
+            that it can be modified without affecting the others.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            # Interruptions too (KeyboardInterrupt, SystemExit), so that the waiters do not
+            # return a result which was never set.
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+        return copy.deepcopy(call.result) if shared else call.result
+
+    def in_flight(self):
+        """
+        Number of calls currently running
+        """
+        with self._lock:
+            return len(self._calls)
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
@@ -0,0 +1,574 @@
+"""
+HTTP transports used by emspy.connection.Connection to send requests.
+
+A transport is chosen per connection with its transport argument, by name from
+emspy.transport.backends or as a Transport object: 'urllib' opens a connection per request,
+'pooled' keeps connections alive and reuses them, and 'fake' answers from memory without any
+network access.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sys
+if sys.version_info < (3, 0):
+    from future import standard_library
+    standard_library.install_aliases()
+
+from builtins import object
+from collections import OrderedDict
+import collections
+import email.message
+import http.client
+import io
+import json
+import socket
+import ssl
+import threading
+import time
+import timeit
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from . import common
+
+
+class Transport(object):
+    """
+    Sends HTTP requests for a Connection. Transports hold their own proxy settings, so that
+    connections with different proxies can be used in one process.
+    """
+    def send(self, method, url, data=None, headers=None, timeout=None):
+        """
+        Sends a request
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            absolute request url
+        data: bytes
+            request body
+        headers: dict
+            request headers
+        timeout: float or tuple
+            socket timeout in seconds, or (connect, read) timeouts (default None, blocking)
+
+        Returns
+        -------
+        object
+            response with the read, getcode, geturl, getheaders and info methods of urllib
+            responses. 304 responses are returned.
+
+        Raises
+        ------
+        urllib.error.HTTPError
+            for responses with an error status, with the response as its body
+        """
+        raise NotImplementedError
+
+    def set_proxies(self, proxies):
+        """
+        Changes the proxies used by the next requests
+
+        Parameters
+        ----------
+        proxies: dict
+            proxies dictionary {'http': '', 'https': ''}
+        """
+        pass
+
+    def close(self):
+        """
+        Releases any connections held by the transport
+        """
+        pass
+
+
+class UrllibTransport(Transport):
+    """
+    Transport opening a new connection per request with urllib.request
+    """
+    def __init__(self, proxies=None, ignore_ssl_errors=False):
+        """
+        Urllib transport initialization
+
+        Parameters
+        ----------
+        proxies: dict
+            proxies dictionary {'http': '', 'https': ''}. If None, the proxies of the
+            environment are used. (default None)
+        ignore_ssl_errors: bool
+            retry requests failing certificate verification without verifying
+            (default False)
+        """
+        self._ignore_ssl_errors = ignore_ssl_errors
+        self.set_proxies(proxies)
+
+    def set_proxies(self, proxies):
+        handlers = [urllib.request.ProxyHandler(proxies)] if proxies is not None else []
+        self._opener = urllib.request.build_opener(*handlers)
+        # Normally you do NOT want to ignore SSL errors, but this is
+        # sometimes necessary on beta API endpoints without a proper cert.
+        # TODO: Find a real fix for GE Mac OS machines that are having trouble verifying.
+        self._unverified_opener = urllib.request.build_opener(
+            *handlers + [urllib.request.HTTPSHandler(context=ssl._create_unverified_context())])
+
+    def send(self, method, url, data=None, headers=None, timeout=None):
+        request = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+        # urllib applies the read timeout to connecting as well.
+        timeout = timeout[1] if isinstance(timeout, (tuple, list)) else timeout
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        try:
+            try:
+                return self._opener.open(request, timeout=timeout)
+            except urllib.error.HTTPError:
+                raise
+            except urllib.error.URLError:
+                if not self._ignore_ssl_errors:
+                    raise
+                return self._unverified_opener.open(request, timeout=timeout)
+        except urllib.error.HTTPError as exc:
+            # Answer to a conditional request for a cached response
+            if exc.code == 304:
+                return exc
+            raise
+
+
+class PooledTransport(Transport):
+    """
+    Keep-alive HTTP(S) transport that reuses connections per host
+    """
+    def __init__(self, pool_size=10, idle_timeout=60, proxies=None, ignore_ssl_errors=False):
+        """
+        Pooled transport initialization
+
+        Parameters
+        ----------
+        pool_size: int
+            maximum number of idle connections kept per host (default 10)
+        idle_timeout: float
+            seconds after which an idle connection is discarded instead of reused (default 60)
+        proxies: dict
+            proxies dictionary {'http': '', 'https': ''}
+        ignore_ssl_errors: bool
+            ignore SSL certificate errors (default False)
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be a positive integer. Found: %s" % pool_size)
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._proxies = proxies or {}
+        self._ignore_ssl_errors = ignore_ssl_errors
+        self._pools = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def send(self, method, url, data=None, headers=None, timeout=None):
+        """
+        Sends a request over a pooled connection
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        url: str
+            absolute request url
+        data: bytes
+            request body
+        headers: dict
+            request headers
+        timeout: float or tuple
+            socket timeout in seconds, or (connect, read) timeouts (default None, blocking)
+
+        Returns
+        -------
+        PooledResponse
+            response object; the connection returns to the pool once the body is fully read
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = url if self.__http_proxy(parts.scheme) else _request_target(parts)
+        headers = dict(headers or {})
+        headers.setdefault('Connection', 'keep-alive')
+
+        connect_timeout, read_timeout = timeout if isinstance(timeout, (tuple, list)) \
+            else (timeout, timeout)
+        conn, reused = self.__acquire(key, connect_timeout, read_timeout)
+        sent = False
+        try:
+            connect_time = 0. if reused else _connect(conn, read_timeout)
+            conn.request(method, target, body=data, headers=headers)
+            sent = True
+            response = conn.getresponse()
+        except (socket.error, http.client.HTTPException):
+            conn.close()
+            # A pooled connection may have been dropped by the server while it sat idle.
+            # Retry once on a fresh connection; fresh connections are not retried. A request
+            # which was sent may have been acted on, so only idempotent ones are sent again.
+            if not reused or (sent and method not in common.idempotent_methods):
+                raise
+            conn = self.__new_connection(key, connect_timeout)
+            try:
+                connect_time = _connect(conn, read_timeout)
+                conn.request(method, target, body=data, headers=headers)
+                response = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+
+        pooled = PooledResponse(self, key, conn, response, url)
+        pooled.connect_time = connect_time
+        if response.status >= 400:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.msg, pooled)
+        return pooled
+
+    def set_proxies(self, proxies):
+        # Connections opened through the former proxies are not reused.
+        self._proxies = proxies or {}
+        self.close()
+
+    def close(self):
+        """
+        Closes all idle connections
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            for pool in self._pools.values():
+                while pool:
+                    conn, _ = pool.pop()
+                    conn.close()
+            self._pools.clear()
+
+    def idle_count(self, host=None):
+        """
+        Number of idle connections in the pool
+
+        Parameters
+        ----------
+        host: str
+            count only connections to this host (default None, all hosts)
+
+        Returns
+        -------
+        int
+            number of idle connections
+        """
+        with self._lock:
+            return sum(len(pool) for key, pool in self._pools.items()
+                       if host is None or key[1] == host)
+
+    def _release(self, key, conn):
+        with self._lock:
+            pool = self._pools[key]
+            if len(pool) < self.pool_size:
+                pool.append((conn, time.time()))
+                return
+        conn.close()
+
+    def __acquire(self, key, connect_timeout, read_timeout):
+        now = time.time()
+        with self._lock:
+            pool = self._pools[key]
+            while pool:
+                # Most recently used first; it is the least likely to have been closed remotely.
+                conn, last_used = pool.pop()
+                if now - last_used <= self.idle_timeout:
+                    conn.timeout = read_timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(read_timeout)
+                    return conn, True
+                conn.close()
+        return self.__new_connection(key, connect_timeout), False
+
+    def __new_connection(self, key, timeout):
+        scheme, host, port = key
+        proxy = self._proxies.get(scheme)
+        if proxy:
+            proxy = urllib.parse.urlsplit(proxy)
+            conn_host, conn_port = proxy.hostname, proxy.port
+        else:
+            conn_host, conn_port = host, port
+
+        if scheme == 'https':
+            context = ssl._create_unverified_context() if self._ignore_ssl_errors else None
+            conn = http.client.HTTPSConnection(conn_host, conn_port, timeout=timeout,
+                                               context=context)
+            if proxy:
+                conn.set_tunnel(host, port)
+        else:
+            conn = http.client.HTTPConnection(conn_host, conn_port, timeout=timeout)
+        return conn
+
+    def __http_proxy(self, scheme):
+        # Plain HTTP through a proxy sends the absolute url; HTTPS tunnels with CONNECT instead.
+        return scheme == 'http' and bool(self._proxies.get('http'))
+
+
+class PooledResponse(object):
+    """
+    Response from a PooledTransport. Mirrors the parts of the urllib response interface used by
+    emspy.connection.Connection.
+    """
+    def __init__(self, transport, key, conn, response, url):
+        self._transport = transport
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._url = url
+        self.status = response.status
+        self.reason = response.reason
+        # Seconds spent opening the connection, 0 if a pooled connection was reused
+        self.connect_time = None
+
+    def read(self, amt=None):
+        """
+        Reads the response body
+
+        Parameters
+        ----------
+        amt: int
+            maximum number of bytes to read (default None, read everything)
+
+        Returns
+        -------
+        bytes
+            response body
+        """
+        data = self._response.read() if amt is None else self._response.read(amt)
+        if self._response.isclosed():
+            self.__release()
+        return data
+
+    def close(self):
+        """
+        Closes the response. If the body was not fully read the connection is discarded.
+
+        Returns
+        -------
+        None
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._response.close()
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self._url
+
+    def getheaders(self):
+        return self._response.getheaders()
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def info(self):
+        return self._response.msg
+
+    @property
+    def headers(self):
+        return self._response.msg
+
+    def __release(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._response.will_close:
+            conn.close()
+        else:
+            self._transport._release(self._key, conn)
+
+
+class FakeTransport(Transport):
+    """
+    In-memory transport answering requests with canned responses or a handler function, without
+    any network access. Sent requests are kept in the requests attribute.
+    """
+    def __init__(self, handler=None):
+        """
+        Fake transport initialization
+
+        Parameters
+        ----------
+        handler: callable
+            function answering the requests without a canned response. It receives the HTTP
+            method, url path, url query parameters as a dict and decoded request body, and
+            returns the status code and JSON serializable response content, like
+            emspy.localserver.LocalServer.handle. (default None)
+        """
+        self.handler = handler
+        self.requests = []
+        self._responses = dict()
+        self._lock = threading.Lock()
+
+    def add_response(self, method, path, content, status=200, headers=None):
+        """
+        Adds a canned response
+
+        Parameters
+        ----------
+        method: str
+            HTTP method
+        path: str
+            url path, e.g. '/api/v2/ems-systems', answered whatever the url query
+        content: object
+            JSON serializable response content, or bytes sent as is
+        status: int
+            HTTP status code (default 200)
+        headers: dict
+            response headers (default None)
+        """
+        with self._lock:
+            self._responses[(method, path)] = (status, content, headers or {})
+
+    def send(self, method, url, data=None, headers=None, timeout=None):
+        headers = dict(headers or {})
+        with self._lock:
+            self.requests.append((method, url, data, headers))
+            canned = self._responses.get((method, urllib.parse.urlsplit(url).path))
+        if canned is not None:
+            status, content, response_headers = canned
+        elif self.handler is not None:
+            status, content = self.handler(method, *_decode_request(url, data, headers))
+            response_headers = {}
+        else:
+            status, content, response_headers = 404, {'message': 'No fake response'}, {}
+
+        if not isinstance(content, bytes):
+            content = json.dumps(content).encode('utf-8')
+            response_headers = dict(response_headers)
+            response_headers.setdefault('Content-Type', 'application/json; charset=utf-8')
+        response = FakeResponse(url, status, response_headers, content)
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, response.reason, response.info(), response)
+        return response
+
+
+class FakeResponse(object):
+    """
+    Response from a FakeTransport. Mirrors the parts of the urllib response interface used by
+    emspy.connection.Connection.
+    """
+    def __init__(self, url, status, headers, body):
+        self._url = url
+        self.status = status
+        self.reason = http.client.responses.get(status, '')
+        self._msg = email.message.Message()
+        for name, value in headers.items():
+            self._msg[name] = value
+        self._fp = io.BytesIO(body)
+
+    def read(self, amt=None):
+        return self._fp.read(amt) if amt is not None else self._fp.read()
+
+    def close(self):
+        pass
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self._url
+
+    def getheaders(self):
+        return list(self._msg.items())
+
+    def info(self):
+        return self._msg
+
+    @property
+    def headers(self):
+        return self._msg
+
+
+def _pooled(pool_size=None, idle_timeout=60, proxies=None, ignore_ssl_errors=False):
+    return PooledTransport(pool_size or 10, idle_timeout, proxies, ignore_ssl_errors)
+
+
+def _urllib(pool_size=None, idle_timeout=60, proxies=None, ignore_ssl_errors=False):
+    return UrllibTransport(proxies, ignore_ssl_errors)
+
+
+def _fake(pool_size=None, idle_timeout=60, proxies=None, ignore_ssl_errors=False):
+    return FakeTransport()
+
+
+backends = OrderedDict([
+    ('pooled', _pooled),
+    ('urllib', _urllib),
+    ('fake', _fake)
+])
+
+
+def get_transport(transport=None, pool_size=None, idle_timeout=60, proxies=None,
+                  ignore_ssl_errors=False):
+    """
+    Returns a transport
+
+    Parameters
+    ----------
+    transport: str or Transport
+        backend name from emspy.transport.backends, or a transport object which is returned as
+        is. If None, 'pooled' is used if a pool_size is given and 'urllib' otherwise.
+        (default None)
+    pool_size: int
+        maximum number of idle connections kept per host by the 'pooled' backend (default None,
+        10 if the backend is chosen by name)
+    idle_timeout: float
+        seconds an idle pooled connection is kept (default 60)
+    proxies: dict
+        proxies dictionary {'http': '', 'https': ''} (default None)
+    ignore_ssl_errors: bool
+        ignore SSL certificate errors (default False)
+
+    Returns
+    -------
+    Transport
+        the transport
+    """
+    if isinstance(transport, Transport):
+        return transport
+    if transport is None:
+        transport = 'pooled' if pool_size is not None else 'urllib'
+    if transport not in backends:
+        raise ValueError("Unknown transport '%s'. Use one of %s."
+                         % (transport, list(backends.keys())))
+    return backends[transport](pool_size, idle_timeout, proxies, ignore_ssl_errors)
+
+
+def _decode_request(url, data, headers):
+    # Url path, url query parameters and decoded body of a request, as handled by
+    # emspy.localserver.LocalServer.handle
+    parts = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parts.query))
+    raw = data.decode('utf-8') if data else ''
+    content_type = dict((k.lower(), v) for k, v in headers.items()).get('content-type', '')
+    if content_type.startswith('application/json'):
+        body = json.loads(raw)
+    else:
+        body = dict(urllib.parse.parse_qsl(raw))
+    return parts.path, query, body
+
+
+def _request_target(parts):
+    target = parts.path or '/'
+    if parts.query:
+        target += '?' + parts.query
+    return target
+
+
+def _connect(conn, read_timeout):
+    # Opens the connection up front, so the time it takes can be told apart from the request
+    # and the connect timeout can be replaced by the read timeout once connected.
+    started = timeit.default_timer()
+    conn.connect()
+    conn.timeout = read_timeout
+    conn.sock.settimeout(read_timeout)
+    return timeit.default_timer() - started
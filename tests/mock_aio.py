@@ -0,0 +1,46 @@
+import asyncio
+
+from emspy.aio import AsyncFltQuery
+from mock_connection import MockConnection
+
+
+ASYNC_HEADER = [{'name': 'Flight Record'}]
+
+
+class AsyncMockConnection(MockConnection):
+    """
+    Mock connection with a coroutine request method
+    """
+    def __init__(self, user, pwd, n_rows=0):
+        super(AsyncMockConnection, self).__init__(user=user, pwd=pwd)
+        self.n_rows = n_rows
+        self.requests = []
+
+    async def arequest(self, rtype="GET", uri=None, uri_keys=None, uri_args=None, headers=None,
+                       body=None, data=None, jsondata=None, proxies=None, verbose=False,
+                       deadline=None):
+        self.requests.append((uri_keys, uri_args))
+        if uri_keys == ('database', 'open_asyncq'):
+            return [], {'id': 'mock-query-id', 'header': ASYNC_HEADER}
+        if uri_keys == ('database', 'get_asyncq'):
+            start, end = uri_args[-2:]
+            rows = [[i] for i in range(start, min(end + 1, self.n_rows))]
+            return [], {'rows': rows}
+        if uri_keys == ('analytic', 'query'):
+            return [], {'offsets': [0.0, 1.0],
+                        'results': [{'values': [uri_args[1], uri_args[1] + 1]}]}
+        return self.request(rtype, uri, uri_keys, uri_args, headers, body, data, jsondata,
+                            proxies, verbose)
+
+
+class MockAsyncFltQuery(AsyncFltQuery):
+    def __init__(self, conn, ems_name, data_file):
+        self._conn = conn
+        self._ems_name = ems_name
+        self._ems_id = 1
+        self._init_assets(data_file)
+        self.reset()
+
+
+async def gather_all(*aws):
+    return await asyncio.gather(*aws)
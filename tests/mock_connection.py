@@ -9,7 +9,8 @@ if sys.version_info < (3, 0):
 
 from urllib.error import HTTPError
 import pprint as pp
-from emspy.connection import Connection
+import time
+from emspy.connection import Connection, DeadlineExceeded
 
 
 RESPONSE_HEADERS = [
@@ -30,7 +31,7 @@ class MockConnection(Connection):
         return None
 
     def request(self, rtype="GET", uri=None, uri_keys=None, uri_args=None, headers=None, body=None,
-                data=None, jsondata=None, proxies=None, verbose=False):
+                data=None, jsondata=None, proxies=None, verbose=False, stream=False, deadline=None):
         resp_h, content = [], []
         if uri_keys == ('profile', 'search'):
             if body['search'] == 'A PROFILE THAT SHOULD NEVER EXIST':
@@ -128,6 +129,11 @@ class MockConnection(Connection):
                 }
             elif jsondata['id'] == 'fake-pressure-alt-id-that-DOES-NOT-exist=':
                 raise HTTPError('url', 'code', 'msg', 'hdrs', None)
+        elif uri_keys == ('analytic', 'query'):
+            if deadline is not None and deadline <= time.time():
+                raise DeadlineExceeded("The deadline of the request has passed.")
+            content = {'offsets': [0.0, 1.0],
+                       'results': [{'values': [uri_args[1], uri_args[1] + 1]}]}
         elif uri_keys == ('database', 'field_group'):
             if body is None:
                 content = {
@@ -0,0 +1,40 @@
+import pytest
+
+from emspy import Connection
+from emspy.localserver import LocalServer, EMS_NAME, DATABASE_NAME
+from emspy.query import FltQuery
+
+FIELDS = ('flight record', 'takeoff airport code', 'p2: measurement 2')
+
+
+def make_query(srv, tmp_path, fields=FIELDS, user='user', result_cache=None, **conn_args):
+    """
+    Flight query selecting fields, sent to a LocalServer
+    """
+    conn = Connection(user, 'pwd', server_url=srv.url, **conn_args)
+    query = FltQuery(conn, EMS_NAME, data_file=str(tmp_path / 'metadata.db'),
+                     result_cache=result_cache)
+    query.set_database(DATABASE_NAME)
+    query.generate_preset_fieldtree()
+    query.select(*fields)
+    return query
+
+
+@pytest.fixture
+def local_server_args():
+    # Overridden by test modules needing another server
+    return {'n_flights': 1000, 'n_measurements': 2}
+
+
+@pytest.fixture
+def local_server(local_server_args):
+    # One flight per hour from 2020-01-01
+    with LocalServer(**local_server_args) as srv:
+        yield srv
+
+
+@pytest.fixture
+def query(local_server, tmp_path):
+    query = make_query(local_server, tmp_path, pool_size=4)
+    yield query
+    query._conn.close()
@@ -0,0 +1,106 @@
+import gzip
+import json
+import re
+import threading
+import time
+
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        self.server.authorizations.append(self.headers.get('Authorization'))
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        time.sleep(self.server.response_delay)
+        with self.server.lock:
+            self.server.active -= 1
+        if self.server.failures:
+            status = self.server.failures.pop(0)
+            self.__reply(status, {'message': 'injected failure'}, {'Retry-After': '0'})
+            return
+        read = re.search(r'/async-query/[^/]+/read/(\d+)/(\d+)$', self.path)
+        if self.path.startswith('/api/missing'):
+            self.__reply(404, {'message': 'not found'})
+        elif read:
+            start, end = int(read.group(1)), int(read.group(2))
+            rows = [[i, 'row %d' % i] for i in range(start, min(end + 1, self.server.n_rows))]
+            self.__reply(200, {'rows': rows, 'hasMoreRows': end + 1 < self.server.n_rows})
+        elif self.server.etag is None:
+            self.__reply(200, {'path': self.path})
+        elif self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.server.etag)
+            self.end_headers()
+        else:
+            self.__reply(200, {'path': self.path, 'etag': self.server.etag},
+                         {'ETag': self.server.etag})
+
+    def do_POST(self):
+        self.server.client_ports.append(self.client_address[1])
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        if self.path.endswith('/api/token'):
+            time.sleep(self.server.token_delay)
+            self.server.n_tokens += 1
+            self.__reply(200, {'access_token': 'token%d' % self.server.n_tokens,
+                               'token_type': 'bearer', 'expires_in': 3600})
+            return
+        time.sleep(self.server.response_delay)
+        if self.path.endswith('/async-query'):
+            self.__reply(200, {'id': 'mock-query-id',
+                               'header': [{'name': 'Flight Record'}, {'name': 'Name'}]})
+        else:
+            self.__reply(200, {'echo': json.loads(body)})
+
+    def __reply(self, status, content, headers=None):
+        payload = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if status == 200:
+            payload = gzip.compress(payload)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    srv = _ThreadingServer(('127.0.0.1', 0), _Handler)
+    srv.client_ports = []
+    srv.n_rows = 0
+    srv.n_tokens = 0
+    srv.token_delay = 0
+    srv.response_delay = 0
+    srv.failures = []
+    srv.etag = None
+    srv.lock = threading.Lock()
+    srv.active = 0
+    srv.max_active = 0
+    srv.authorizations = []
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def server_url(srv):
+    return 'http://127.0.0.1:%d' % srv.server_address[1]
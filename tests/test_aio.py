@@ -0,0 +1,117 @@
+import os
+import socket
+import sys
+import time
+
+import pytest
+from urllib.error import HTTPError
+
+if sys.version_info < (3, 7):
+    pytest.skip("emspy.aio requires Python 3.7 or later", allow_module_level=True)
+
+import asyncio
+import emspy
+from emspy.aio import AsyncConnection, AsyncTSeriesQuery
+from emspy.connection import DeadlineExceeded
+from emspy.retry import RetryPolicy
+from mock_aio import AsyncMockConnection, MockAsyncFltQuery, gather_all
+from mock_ems import MockEMS
+from mock_server import server, server_url
+
+test_path = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def mocks(monkeypatch):
+    monkeypatch.setattr(emspy.query.query, 'EMS', MockEMS)
+
+
+def test_async_connection_requests_share_event_loop(server):
+    conn = AsyncConnection(server_url=server_url(server), pool_size=4)
+
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    results = asyncio.run(gather_all(*[
+        conn.arequest(uri_keys=('ems_sys', 'info'), uri_args=i) for i in range(20)
+    ]))
+    assert conn.token == 'token1'
+    assert [content['path'] for _, content in results] == \
+        ['/api/v2/ems-systems/%d/info' % i for i in range(20)]
+    assert len(conn._async_transport._pools) == 1
+    conn.close()
+
+
+def test_async_connection_raises_http_error(server):
+    conn = AsyncConnection(server_url=server_url(server))
+    conn.token, conn.token_type = 'abc', 'bearer'
+    with pytest.raises(HTTPError):
+        asyncio.run(conn.arequest(uri=server_url(server) + '/api/missing'))
+
+
+def test_async_tsquery_runs_flights_concurrently(mocks):
+    conn = AsyncMockConnection(user='', pwd='')
+    query = AsyncTSeriesQuery(conn, 'ems24-app', data_file=None)
+    query.select_ids(['fake-bar-alt-id-that-exists='], ['Baro-Corrected Altitude (ft)'])
+
+    dfs = asyncio.run(gather_all(*[query.run(fr, start=0, end=1) for fr in (10, 20, 30)]))
+    assert [df['Baro-Corrected Altitude (ft)'].tolist() for df in dfs] == \
+        [[10, 11], [20, 21], [30, 31]]
+
+
+def test_async_fltquery_async_run_reads_all_pages(mocks):
+    conn = AsyncMockConnection(user='', pwd='', n_rows=5)
+    query = MockAsyncFltQuery(conn, 'ems24-app',
+                              data_file=os.path.join(test_path, 'mock_metadata.db'))
+    query.set_database('FDW Flights')
+    query.update_fieldtree('Flight Information', exclude_tree=['Processing', 'Date Times',
+                                                               'FlightPulse'])
+    query.select('Flight Record')
+
+    df = asyncio.run(query.async_run(n_row=2))
+    assert df['Flight Record'].tolist() == [0, 1, 2, 3, 4]
+    pages = [args[-2:] for keys, args in conn.requests if keys == ('database', 'get_asyncq')]
+    assert pages == [(0, 1), (2, 3), (4, 5)]
+    # The async-query is closed once read
+    assert conn.requests[-1] == (('database', 'close_asyncq'), (1, query._asyncq_uri_args()[1],
+                                                                'mock-query-id'))
+    assert conn.open_async_queries == []
+
+
+def test_async_connection_refreshes_expiring_token_once(server):
+    conn = AsyncConnection(server_url=server_url(server), pool_size=4)
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    conn.token_expires_at = 0
+    server.token_delay = 0.1
+
+    asyncio.run(gather_all(*[conn.arequest(uri_keys=('ems_sys', 'info'), uri_args=i)
+                             for i in range(8)]))
+    assert server.n_tokens == 2
+    assert server.authorizations[-8:] == ['bearer token2'] * 8
+    conn.close()
+
+
+def test_async_connection_deadline(server):
+    conn = AsyncConnection(server_url=server_url(server), timeouts={'metadata': (1, 0.2)},
+                           retry_policy=RetryPolicy(max_retries=0))
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    server.response_delay = 1
+    with pytest.raises(socket.timeout):
+        asyncio.run(conn.arequest(uri_keys=('ems_sys', 'list')))
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(conn.arequest(uri_keys=('ems_sys', 'list'), deadline=time.time() - 1))
+    conn.close()
+
+
+def test_async_fltquery_async_run_without_query_id(mocks):
+    conn = AsyncMockConnection(user='', pwd='', n_rows=5)
+    query = MockAsyncFltQuery(conn, 'ems24-app',
+                              data_file=os.path.join(test_path, 'mock_metadata.db'))
+    query.set_database('FDW Flights')
+    query.update_fieldtree('Flight Information', exclude_tree=['Processing', 'Date Times',
+                                                               'FlightPulse'])
+    query.select('Flight Record')
+
+    async def no_query_id(*args, **kwargs):
+        return [], {'message': 'no capacity'}
+    conn.arequest = no_query_id
+    with pytest.raises(ValueError):
+        asyncio.run(query.async_run(n_row=2))
@@ -0,0 +1,94 @@
+import pytest
+
+from emspy.query.asyncquery import AsyncQuery
+from mock_localserver import local_server, local_server_args, query
+
+
+def closes(local_server):
+    return local_server.requests.get(('database', 'close_asyncq'), 0)
+
+
+def test_async_run_closes_the_query(local_server, query):
+    assert query.async_run(n_row=300).shape[0] == 1000
+    assert closes(local_server) == 1
+    assert local_server.async_queries == {}
+    assert query._conn.open_async_queries == []
+
+
+def test_query_is_closed_on_errors(local_server, query):
+    original = local_server.handle
+
+    def fail_second_page(method, path, query_args, body):
+        if '/read/300/' in path:
+            return 404, {'message': 'injected failure'}
+        return original(method, path, query_args, body)
+
+    local_server.handle = fail_second_page
+    assert query.async_run(n_row=300).shape[0] == 300
+    assert closes(local_server) == 1
+    assert local_server.async_queries == {}
+
+
+def test_query_is_closed_on_keyboard_interrupt(local_server, query, monkeypatch):
+    to_dataframe = query._page_to_dataframe
+    pages = []
+
+    def interrupted(content, header):
+        pages.append(content)
+        if len(pages) == 2:
+            raise KeyboardInterrupt()
+        return to_dataframe(content, header)
+
+    monkeypatch.setattr(query, '_page_to_dataframe', interrupted)
+    chunks = query.iter_chunks(n_row=300)
+    next(chunks)
+    with pytest.raises(KeyboardInterrupt):
+        next(chunks)
+    assert closes(local_server) == 1
+    assert query._conn.open_async_queries == []
+
+
+def test_open_handles_are_tracked(local_server, query):
+    conn = query._conn
+    chunks = query.iter_chunks(n_row=300)
+    next(chunks)
+    opened, = conn.open_async_queries
+    assert opened.query_id in local_server.async_queries
+    assert opened.n_reads == 1
+    assert 'AsyncQuery %s' % opened.query_id in repr(opened)
+
+    # An abandoned iteration closes the query
+    chunks.close()
+    assert conn.open_async_queries == []
+    assert local_server.async_queries == {}
+
+
+def test_connection_close_closes_open_queries(local_server, query):
+    conn = query._conn
+    first = AsyncQuery.open(conn, query._asyncq_uri_args(), query.in_dict())
+    with AsyncQuery.open(conn, query._asyncq_uri_args(), query.in_dict()) as second:
+        assert conn.open_async_queries == [first, second]
+        assert len(second.read(0, 9)['rows']) == 10
+    assert conn.open_async_queries == [first]
+    conn.close()
+    assert first.closed
+    assert local_server.async_queries == {}
+    # Closing twice sends nothing
+    first.close()
+    assert closes(local_server) == 2
+
+
+def test_close_errors_are_not_raised(local_server, query, capsys):
+    opened = AsyncQuery.open(query._conn, query._asyncq_uri_args(), query.in_dict())
+    local_server.async_queries.clear()
+    original = local_server.handle
+
+    def expired(method, path, query_args, body):
+        if method == 'DELETE':
+            return 404, {'message': 'query expired'}
+        return original(method, path, query_args, body)
+
+    local_server.handle = expired
+    opened.close()
+    assert 'Could not close the async-query %s' % opened.query_id in capsys.readouterr().out
+    assert query._conn.open_async_queries == []
@@ -0,0 +1,112 @@
+import sys
+import time
+
+import pytest
+
+from emspy import Connection
+from emspy.cache import HTTPCache
+from emspy.metrics import MetricsRegistry
+from mock_server import server, server_url
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'http_cache.db')
+
+def test_fresh_responses_are_served_from_disk(server, cache_file):
+    events = []
+    conn = Connection('user', 'pwd', server_url=server_url(server), cache=cache_file)
+    conn.after_request_hooks.append(events.append)
+    n_requests = len(server.authorizations)
+
+    for _ in range(3):
+        _, content = conn.request(uri_keys=('ems_sys', 'list'))
+        assert content == {'path': '/api/v2/ems-systems'}
+    assert len(server.authorizations) == n_requests + 1
+    assert [e.cache for e in events] == ['miss', 'hit', 'hit']
+
+    # The cache file outlives the connection: a new process starts warm.
+    conn = Connection('user', 'pwd', server_url=server_url(server), cache=cache_file)
+    _, content = conn.request(uri_keys=('ems_sys', 'list'))
+    assert content == {'path': '/api/v2/ems-systems'}
+    assert len(server.authorizations) == n_requests + 1
+
+@pytest.mark.parametrize('pool_size', [None, 2])
+def test_stale_responses_are_revalidated(server, cache_file, pool_size):
+    registry = MetricsRegistry()
+    cache = HTTPCache(cache_file, ttl=0)
+    conn = Connection('user', 'pwd', server_url=server_url(server), cache=cache,
+                      pool_size=pool_size, metrics=registry)
+    server.etag = '"v1"'
+
+    assert conn.request(uri_keys=('ems_sys', 'info'), uri_args=1)[1]['etag'] == '"v1"'
+    assert conn.request(uri_keys=('ems_sys', 'info'), uri_args=1)[1]['etag'] == '"v1"'
+    server.etag = '"v2"'
+    assert conn.request(uri_keys=('ems_sys', 'info'), uri_args=1)[1]['etag'] == '"v2"'
+    assert conn.request(uri_keys=('ems_sys', 'info'), uri_args=1)[1]['etag'] == '"v2"'
+    assert registry.counter('emspy_cache_requests_total', endpoint='ems_sys/info',
+                            result='miss') == 2
+    assert registry.counter('emspy_cache_requests_total', endpoint='ems_sys/info',
+                            result='revalidated') == 2
+
+def test_only_metadata_gets_are_cached(server, cache_file):
+    cache = HTTPCache(cache_file)
+    conn = Connection('user', 'pwd', server_url=server_url(server), cache=cache)
+    conn.request(uri_keys=('analytic', 'query'), uri_args=(1, 2), jsondata={'select': []})
+    conn.request(uri=server_url(server) + '/api/v2/ems-systems')
+    conn.request(uri_keys=('database', 'get_asyncq'), uri_args=(1, 2, 'q', 0, 9))
+    assert len(cache) == 0
+    conn.request(uri_keys=('database', 'group'), uri_args=1, body={'groupId': 'abc'})
+    assert len(cache) == 1
+
+def test_cached_responses_are_per_user(server, cache_file):
+    cache = HTTPCache(cache_file)
+    conn = Connection('user', 'pwd', server_url=server_url(server), cache=cache)
+    conn.request(uri_keys=('ems_sys', 'list'))
+    conn = Connection('other user', 'pwd', server_url=server_url(server), cache=cache)
+    conn.request(uri_keys=('ems_sys', 'list'))
+    assert len(cache) == 2
+
+def test_least_recently_used_responses_are_evicted(cache_file):
+    cache = HTTPCache(cache_file, max_size=250)
+    for i in range(3):
+        cache.store(str(i), 'url', [], b'x' * 100)
+        time.sleep(0.01)
+    assert len(cache) == 2
+    assert cache.get('0') is None
+
+    cache.get('1')
+    time.sleep(0.01)
+    cache.store('3', 'url', [], b'x' * 100)
+    assert cache.get('1') is not None
+    assert cache.get('2') is None
+    assert cache.size() == 200
+
+    # Responses the API asks not to store and responses larger than the cache are not stored.
+    cache.store('4', 'url', [('Cache-Control', 'no-store')], b'x')
+    cache.store('5', 'url', [], b'x' * 300)
+    assert cache.get('4') is None and cache.get('5') is None
+
+def test_validators(cache_file):
+    cache = HTTPCache(cache_file, ttl=60)
+    entry = cache.store('a', 'url', [('ETag', '"abc"'),
+                                     ('Last-Modified', 'Wed, 21 Oct 2015 07:28:00 GMT')], b'{}')
+    assert entry.fresh()
+    assert entry.validators() == {'If-None-Match': '"abc"',
+                                  'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+    assert cache.store('b', 'url', [], b'{}').validators() == {}
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="emspy.aio requires Python 3.7 or later")
+def test_async_connection_uses_cache(server, cache_file):
+    import asyncio
+    from emspy.aio import AsyncConnection
+
+    conn = AsyncConnection(server_url=server_url(server), cache=HTTPCache(cache_file, ttl=0))
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    server.etag = '"v1"'
+    events = []
+    conn.after_request_hooks.append(events.append)
+    for _ in range(2):
+        _, content = asyncio.run(conn.arequest(uri_keys=('ems_sys', 'list')))
+        assert content['etag'] == '"v1"'
+    assert [e.cache for e in events] == ['miss', 'revalidated']
+    conn.close()
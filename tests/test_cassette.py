@@ -0,0 +1,160 @@
+import gzip
+import sys
+import time
+
+import pytest
+from urllib.error import HTTPError
+
+from emspy import Connection
+from emspy.cassette import Cassette, CassetteError
+from emspy.metrics import MetricsRegistry
+from mock_server import server, server_url
+
+OFFLINE_URL = 'http://127.0.0.1:9'
+
+
+@pytest.fixture
+def cassette_file(tmp_path):
+    return str(tmp_path / 'traffic.cassette')
+
+
+def record(server, cassette_file, pool_size=None):
+    server.n_rows = 30
+    conn = Connection('user', 'secret-pwd', server_url=server_url(server), pool_size=pool_size,
+                      cassette=Cassette(cassette_file, mode='record'))
+    contents = [conn.request(uri_keys=('ems_sys', 'info'), uri_args=i)[1] for i in range(3)]
+    contents.append(conn.request(rtype='POST', uri_keys=('database', 'query'), uri_args=(1, 'db'),
+                                 jsondata={'select': []})[1])
+    contents.append(conn.request(uri_keys=('database', 'get_asyncq'),
+                                 uri_args=(1, 'db', 'mock-query-id', 0, 19))[1])
+    with pytest.raises(HTTPError):
+        conn.request(uri=server_url(server) + '/api/missing')
+    conn.close()
+    return contents
+
+
+@pytest.mark.parametrize('pool_size', [None, 2])
+def test_replay_without_network(server, cassette_file, pool_size):
+    recorded = record(server, cassette_file, pool_size)
+    n_requests = len(server.client_ports)
+
+    registry = MetricsRegistry()
+    conn = Connection('user', 'secret-pwd', server_url=OFFLINE_URL, metrics=registry,
+                      cassette=Cassette(cassette_file))
+    assert conn.token == 'token1'
+    replayed = [conn.request(uri_keys=('ems_sys', 'info'), uri_args=i)[1] for i in range(3)]
+    replayed.append(conn.request(rtype='POST', uri_keys=('database', 'query'),
+                                 uri_args=(1, 'db'), jsondata={'select': []})[1])
+    replayed.append(conn.request(uri_keys=('database', 'get_asyncq'),
+                                 uri_args=(1, 'db', 'mock-query-id', 0, 19))[1])
+    assert replayed == recorded
+    with pytest.raises(HTTPError) as err:
+        conn.request(uri=OFFLINE_URL + '/api/missing')
+    assert err.value.code == 404
+    assert len(server.client_ports) == n_requests
+
+    # Payloads are replayed as received, compressed.
+    wire = registry.counter('emspy_response_bytes_total', endpoint='database/get_asyncq',
+                            encoding='wire')
+    decoded = registry.counter('emspy_response_bytes_total', endpoint='database/get_asyncq',
+                               encoding='decoded')
+    assert 0 < wire < decoded
+
+    with pytest.raises(CassetteError):
+        conn.request(uri_keys=('ems_sys', 'info'), uri_args=3)
+
+
+@pytest.mark.parametrize('recorded_with, replayed_with', [('json', 'orjson'),
+                                                         ('orjson', 'json')])
+def test_replay_with_another_json_codec(server, cassette_file, recorded_with, replayed_with):
+    pytest.importorskip('orjson')
+    body = {'select': [{'fieldId': 'a'}], 'format': 'none', 'top': 5}
+    conn = Connection('user', 'pwd', server_url=server_url(server), json_codec=recorded_with,
+                      cassette=Cassette(cassette_file, mode='record'))
+    recorded = conn.request(rtype='POST', uri_keys=('database', 'query'), uri_args=(1, 'db'),
+                            jsondata=body)[1]
+    conn.close()
+
+    conn = Connection('user', 'pwd', server_url=OFFLINE_URL, json_codec=replayed_with,
+                      cassette=Cassette(cassette_file))
+    assert conn.request(rtype='POST', uri_keys=('database', 'query'), uri_args=(1, 'db'),
+                        jsondata=body)[1] == recorded
+
+
+def test_credentials_are_not_recorded(server, cassette_file):
+    record(server, cassette_file)
+    with gzip.open(cassette_file, 'rb') as f:
+        stored = f.read()
+    assert b'secret-pwd' not in stored
+    # Replaying does not depend on the password.
+    conn = Connection('user', 'other-pwd', server_url=OFFLINE_URL,
+                      cassette=Cassette(cassette_file))
+    assert conn.token == 'token1'
+
+
+def test_repeated_requests_replay_in_order(server, cassette_file):
+    server.failures = [503]
+    conn = Connection('user', 'pwd', server_url=server_url(server),
+                      cassette=Cassette(cassette_file, mode='record'))
+    conn.request(uri_keys=('ems_sys', 'list'))
+    server.etag = '"v1"'
+    conn.request(uri_keys=('ems_sys', 'list'))
+    conn.close()
+
+    events = []
+    cassette = Cassette(cassette_file)
+    conn = Connection('user', 'pwd', server_url=OFFLINE_URL, cassette=cassette)
+    conn.after_request_hooks.append(events.append)
+    # The recorded 503 is retried and answered by the next recorded response.
+    assert conn.request(uri_keys=('ems_sys', 'list'))[1] == {'path': '/api/v2/ems-systems'}
+    assert events[-1].attempts == 2
+    second = {'path': '/api/v2/ems-systems', 'etag': '"v1"'}
+    assert conn.request(uri_keys=('ems_sys', 'list'))[1] == second
+    assert conn.request(uri_keys=('ems_sys', 'list'))[1] == second
+    cassette.rewind()
+    assert conn.request(uri_keys=('ems_sys', 'list'))[1] == {'path': '/api/v2/ems-systems'}
+
+
+def test_injected_latency(server, cassette_file):
+    server.response_delay = 0.1
+    record(server, cassette_file)
+
+    conn = Connection('user', 'pwd', server_url=OFFLINE_URL,
+                      cassette=Cassette(cassette_file, latency=0.05))
+    started = time.time()
+    conn.request(uri_keys=('ems_sys', 'info'), uri_args=0)
+    assert 0.05 <= time.time() - started < 0.1
+
+    conn = Connection('user', 'pwd', server_url=OFFLINE_URL,
+                      cassette=Cassette(cassette_file, latency='recorded'))
+    started = time.time()
+    conn.request(uri_keys=('ems_sys', 'info'), uri_args=0)
+    assert time.time() - started >= 0.1
+
+    conn = Connection('user', 'pwd', server_url=OFFLINE_URL,
+                      cassette=Cassette(cassette_file, latency=lambda i: len(i.body) * 1e-9))
+    started = time.time()
+    conn.request(uri_keys=('ems_sys', 'info'), uri_args=0)
+    assert time.time() - started < 0.05
+
+
+def test_missing_cassette(cassette_file):
+    with pytest.raises(IOError):
+        Cassette(cassette_file)
+    with pytest.raises(ValueError):
+        Cassette(cassette_file, mode='rewind')
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="emspy.aio requires Python 3.7 or later")
+def test_async_replay(server, cassette_file):
+    import asyncio
+    from emspy.aio import AsyncConnection
+    from mock_aio import gather_all
+
+    recorded = record(server, cassette_file)
+    conn = AsyncConnection(server_url=OFFLINE_URL, cassette=Cassette(cassette_file))
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    replayed = asyncio.run(gather_all(*[conn.arequest(uri_keys=('ems_sys', 'info'), uri_args=i)
+                                        for i in range(3)]))
+    assert [content for _, content in replayed] == recorded[:3]
+    conn.close()
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from emspy.query.checkpoint import Checkpoint
+from mock_localserver import local_server, local_server_args, query
+
+
+def fail_pages(local_server, *starts):
+    # Makes the reads of the pages starting at the given rows fail, once each
+    handle = local_server.handle
+    failing = ['/read/%d/' % s for s in starts]
+
+    def failing_handle(method, path, query, body):
+        for f in failing:
+            if f in path:
+                failing.remove(f)
+                return 404, {'message': 'injected failure'}
+        return handle(method, path, query, body)
+
+    local_server.handle = failing_handle
+
+
+def reads(local_server):
+    return local_server.requests.get(('database', 'get_asyncq'), 0)
+
+
+@pytest.mark.parametrize('n_workers', [1, 3])
+def test_resume(local_server, query, tmp_path, n_workers):
+    checkpoints = str(tmp_path / 'checkpoints')
+    expected = query.async_run(n_row=100)
+    n_reads = reads(local_server)
+
+    fail_pages(local_server, 400)
+    partial = query.async_run(n_row=100, n_workers=n_workers, checkpoint_dir=checkpoints)
+    assert partial.shape[0] == 400
+    assert len(os.listdir(checkpoints)) == 1
+    # The async-query is left open to resume from
+    assert len(local_server.async_queries) == 1
+    assert query._conn.open_async_queries == []
+
+    before = reads(local_server)
+    df = query.async_run(n_row=100, n_workers=n_workers, checkpoint_dir=checkpoints)
+    assert df.equals(expected)
+    # Only the missing pages, and a check the async-query is still open, were read.
+    assert reads(local_server) - before <= 1 + (n_reads - 4) + n_workers
+    assert local_server.requests[('database', 'open_asyncq')] == 2
+    # The checkpoint is removed once all rows were received.
+    assert os.listdir(checkpoints) == []
+    assert local_server.async_queries == {}
+
+
+def test_resume_with_new_async_query(local_server, query, tmp_path):
+    checkpoints = str(tmp_path / 'checkpoints')
+    expected = query.async_run(n_row=100)
+
+    fail_pages(local_server, 700)
+    assert query.run(n_row=100, checkpoint_dir=checkpoints).shape[0] == 700
+    # The async-query expired on the server.
+    local_server.async_queries.clear()
+    df = query.run(n_row=100, checkpoint_dir=checkpoints)
+    assert df.equals(expected)
+    assert local_server.requests[('database', 'open_asyncq')] == 3
+
+
+def test_checkpoint_files(tmp_path):
+    import pandas as pd
+    ckpt = Checkpoint(str(tmp_path), 'key')
+    ckpt.start('query-1', [{'name': 'a'}])
+    ckpt.save(0, pd.DataFrame({'a': [1, 2]}))
+    with pytest.raises(ValueError):
+        ckpt.save(2, pd.DataFrame({'a': [5]}))
+
+    ckpt = Checkpoint(str(tmp_path), 'key')
+    assert (ckpt.query_id, ckpt.n_pages) == ('query-1', 1)
+    assert ckpt.load()[0]['a'].tolist() == [1, 2]
+    ckpt.clear()
+    assert Checkpoint(str(tmp_path), 'key').n_pages == 0
+
+
+def test_resume_adaptive_batches(local_server, query, tmp_path):
+    from emspy.query.pages import PageSizer
+    checkpoints = str(tmp_path / 'checkpoints')
+    expected = query.async_run(n_row=100)
+
+    # Batches of 100 then 400 rows, the third one failing
+    fail_pages(local_server, 500)
+    sizer = PageSizer(first=100, target_seconds=60.)
+    assert query.async_run(n_row=sizer, checkpoint_dir=checkpoints).shape[0] == 500
+    df = query.async_run(n_row='auto', checkpoint_dir=checkpoints)
+    assert df.equals(expected)
+    assert local_server.requests[('database', 'open_asyncq')] == 2
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from emspy import codec
+from emspy import Connection
+
+
+def test_stdlib_codec_round_trip():
+    c = codec.get_codec('json')
+    obj = {'select': [{'fieldId': '[-hub-][field]', 'aggregate': 'none'}], 'top': 10}
+    assert json.loads(c.dumps(obj).decode('utf-8')) == obj
+    assert c.loads(c.dumps(obj)) == obj
+
+
+def test_default_codec_is_first_available_backend():
+    assert codec.get_codec().name == codec.available()[0]
+    assert codec.available()[-1] == 'json'
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        codec.get_codec('simplejson')
+
+
+def test_fast_backend_falls_back_to_stdlib():
+    def dumps(obj):
+        raise TypeError("unsupported")
+
+    def loads(s):
+        raise ValueError("unsupported")
+
+    c = codec.JSONCodec('broken', dumps, loads)
+    assert c.dumps([1, 2]) == b'[1, 2]'
+    assert c.loads(b'[1, 2]') == [1, 2]
+
+
+def test_orjson_handles_large_integers():
+    pytest.importorskip('orjson')
+    c = codec.get_codec('orjson')
+    assert c.loads(c.dumps({'id': 2 ** 70})) == {'id': 2 ** 70}
+
+
+def test_connection_uses_selected_codec():
+    assert Connection()._codec.name == codec.available()[0]
+    assert Connection(json_codec='json')._codec.name == 'json'
@@ -0,0 +1,141 @@
+import socket
+import threading
+import time
+
+import pytest
+from urllib.error import HTTPError, URLError
+
+from emspy import Connection, common
+from emspy.connection import DeadlineExceeded
+from emspy.retry import RetryPolicy
+from mock_server import server, server_url
+
+
+def test_pooled_connection_reuses_socket(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=2)
+    assert conn.token == 'token1'
+    for i in range(3):
+        _, content = conn.request(uri_keys=('ems_sys', 'info'), uri_args=i)
+        assert content == {'path': '/api/v2/ems-systems/%d/info' % i}
+    # Token request plus three GETs all went over the same keep-alive socket.
+    assert len(server.client_ports) == 4
+    assert len(set(server.client_ports)) == 1
+    assert conn._transport.idle_count() == 1
+    conn.close()
+    assert conn._transport.idle_count() == 0
+
+
+def test_pooled_connection_posts_json(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=2)
+    _, content = conn.request(rtype='POST', uri_keys=('database', 'query'), uri_args=(1, 'db'),
+                              jsondata={'select': []})
+    assert content == {'echo': {'select': []}}
+
+
+def test_pooled_connection_raises_http_error(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=2)
+    with pytest.raises(HTTPError):
+        conn.request(uri=server_url(server) + '/api/missing')
+    # The error body was consumed, so the connection can go back to the pool.
+    assert conn._transport.idle_count() == 1
+
+
+def test_pooled_connection_shared_across_threads(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=4)
+    results = []
+
+    def work(i):
+        _, content = conn.request(uri_keys=('ems_sys', 'info'), uri_args=i)
+        results.append(content['path'])
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == sorted('/api/v2/ems-systems/%d/info' % i for i in range(8))
+    assert conn._transport.idle_count() <= 4
+
+
+def test_streamed_rows_are_read_lazily(server):
+    server.n_rows = 1000
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=2)
+    _, content = conn.request(uri_keys=('database', 'get_asyncq'),
+                              uri_args=(1, 'db', 'mock-query-id', 0, 499), stream=True)
+    assert 'hasMoreRows' not in content
+    rows = list(content['rows'])
+    assert rows[0] == [0, 'row 0'] and rows[-1] == [499, 'row 499'] and len(rows) == 500
+    # Members after the rows are available once the rows are consumed.
+    assert content['hasMoreRows'] is True
+    assert conn._transport.idle_count() == 1
+
+
+def test_token_expiry_is_recorded(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), token_refresh_margin=60)
+    assert 3590 < conn.token_expires_at - time.time() <= 3600
+    assert not conn.token_expiring()
+    conn.request(uri_keys=('ems_sys', 'list'))
+    assert server.n_tokens == 1
+
+
+def test_expiring_token_is_refreshed_once_across_threads(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=4)
+    conn.token_expires_at = time.time() + 10
+    assert conn.token_expiring()
+    server.token_delay = 0.2
+
+    threads = [threading.Thread(target=conn.request,
+                                kwargs={'uri_keys': ('ems_sys', 'info'), 'uri_args': i})
+               for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.n_tokens == 2
+    assert server.authorizations[-8:] == ['bearer token2'] * 8
+    assert not conn.token_expiring()
+
+
+def test_timeouts_per_endpoint_family(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server),
+                      timeouts={'async_read': (5, 600), 'auth': 20})
+    assert conn._timeout(('database', 'get_asyncq')) == (5, 600)
+    assert conn._timeout(('sys', 'auth')) == (20, 20)
+    assert conn._timeout(('analytic', 'query')) == common.timeouts['analytic']
+    assert conn._timeout(('ems_sys', 'list')) == common.timeouts['metadata']
+    # Key-value maps of discrete fields can take very long to be fetched
+    assert conn._timeout(('database', 'field')) == (10, None)
+    assert conn._timeout(None) == common.timeouts['metadata']
+    with pytest.raises(ValueError):
+        Connection(server_url=server_url(server), timeouts={'bogus': 1})
+
+
+@pytest.mark.parametrize('pool_size', [None, 2])
+def test_read_timeout(server, pool_size):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=pool_size,
+                      timeouts={'metadata': 0.2}, retry_policy=RetryPolicy(max_retries=0))
+    server.response_delay = 1
+    started = time.time()
+    with pytest.raises((socket.timeout, URLError)):
+        conn.request(uri_keys=('ems_sys', 'list'))
+    assert time.time() - started < 0.9
+
+
+@pytest.mark.parametrize('pool_size', [None, 2])
+def test_deadline_bounds_retries(server, pool_size):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=pool_size,
+                      retry_policy=RetryPolicy(backoff_factor=0.05))
+    server.response_delay = 0.1
+    server.failures = [503] * 100
+    started = time.time()
+    with pytest.raises(DeadlineExceeded):
+        conn.request(uri_keys=('ems_sys', 'list'), deadline=started + 0.5)
+    assert time.time() - started < 0.9
+
+
+def test_passed_deadline_sends_nothing(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server))
+    n_requests = len(server.authorizations)
+    with pytest.raises(DeadlineExceeded):
+        conn.request(uri_keys=('ems_sys', 'list'), deadline=time.time() - 1)
+    assert len(server.authorizations) == n_requests
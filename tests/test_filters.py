@@ -1,6 +1,5 @@
 import pytest
-from mock_connection import MockConnection
-from mock_query import MockFltQuery, MockFilterQuery
+from mock_query import MockFilterQuery
 
 
 def get_filter(query):
@@ -765,3 +764,65 @@ def test_discrete_unsupported():
     query = MockFilterQuery('Flight Date Confidence')
     with pytest.raises(ValueError):
         query.filter("'Unknown' < 'Flight Date Confidence' < 'High'")
+
+
+def test_parse_groups():
+    from emspy.query.filterexpr import Condition, Group, parse
+    tree = parse("'a' == 1 and ('b' in ['x', \"y\"] or 'c' is not null) or 2.5 <= 'd' <= 3")
+    assert tree == Group('or', [
+        Group('and', [
+            Condition('a', '==', [1]),
+            Group('or', [Condition('b', 'in', ['x', 'y']), Condition('c', 'is not null', [])])
+        ]),
+        Condition('d', ['<=', '<='], [2.5, 3])
+    ])
+    assert parse("'Flight Date (Exact)' not in ['it\\'s']") == Condition(
+        'Flight Date (Exact)', 'not in', ["it's"])
+    assert parse("'e' == True") == Condition('e', '==', [True])
+
+
+@pytest.mark.parametrize('expr', [
+    "", "'a' ==", "'a' = 1", "('a' == 1", "'a' == 1 and", "flight == 1", "'a' in 1",
+    "'a' is nul"
+])
+def test_parse_errors(expr):
+    from emspy.query.filterexpr import FilterSyntaxError, parse
+    with pytest.raises(FilterSyntaxError):
+        parse(expr)
+
+
+def test_nested_filter():
+    query = MockFilterQuery('Flight Record')
+    query.filter("'Flight Record' > '17000' and "
+                 "('Takeoff Valid' == True or 'Flight Number String' in ['000000000'])")
+    queryset_filter = get_filter(query)
+    assert queryset_filter['operator'] == 'and'
+    first, second = queryset_filter['args']
+    assert first['value']['operator'] == 'greaterThan'
+    assert second['type'] == 'filter'
+    assert second['value']['operator'] == 'or'
+    assert [a['value']['operator'] for a in second['value']['args']] == ['isTrue', 'in']
+
+    query.remove_filter("'Flight Record' > '17000' and "
+                        "('Takeoff Valid' == True or 'Flight Number String' in ['000000000'])")
+    assert 'filter' not in query._FltQuery__queryset
+
+
+def test_filter_translations_are_memoized(monkeypatch):
+    query = MockFilterQuery('Flight Record')
+    expr = "'Flight Record' in ['1', '2'] and 'Takeoff Valid' == False"
+    query.filter(expr)
+    searches = []
+    flight = query._FltQuery__flight
+    search_fields = flight.search_fields
+    monkeypatch.setattr(flight, 'search_fields', lambda *a, **k: searches.append(a) or
+                        search_fields(*a, **k))
+    for _ in range(3):
+        query.filter(expr)
+    assert searches == []
+    args = query._FltQuery__queryset['filter']['args']
+    assert args[0] == args[3]
+    # Filters are copies, which can be changed without changing the others
+    assert args[0] is not args[3]
+    query.filter("'Flight Record' in ['1', '3'] and 'Takeoff Valid' == False")
+    assert len(searches) == 2
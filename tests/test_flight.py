@@ -14,3 +14,29 @@ def test_get_shortest_field():
     airframe_fields_dataframe = pd.DataFrame.from_dict(airframe_fields_dict)
     airframe_field = flight._get_shortest(airframe_fields_dataframe)
     assert(airframe_field['name'] == "Airframe")
+
+
+def test_code_table():
+    table = flight.CodeTable(pd.DataFrame({'key': [3, 1, 2, 7], 'value': ['C', 'A', 'B', 'A']}))
+    decoded = table.decode([1, 2, None, 7, 3, 9, 1])
+    assert isinstance(decoded, pd.Categorical)
+    assert list(decoded.categories) == ['C', 'A', 'B', 9]
+    assert decoded[[0, 1, 3, 4]].tolist() == ['A', 'B', 'A', 'C']
+    assert pd.isna(decoded[2])
+    # Keys without a value are kept
+    assert decoded[5] == 9
+
+    empty = flight.CodeTable(pd.DataFrame({'key': [], 'value': []}))
+    assert empty.decode([5, 5]).tolist() == [5, 5]
+
+
+def test_pages_with_unknown_keys_stay_categorical():
+    from emspy.query.fltquery import _concat
+    table = flight.CodeTable(pd.DataFrame({'key': [1, 2], 'value': ['A', 'B']}))
+    # Only the second page has a key missing from the table
+    pages = [pd.DataFrame({'f': table.decode([1, 2]), 'n': [1, 2]}),
+             pd.DataFrame({'f': table.decode([2, 9]), 'n': [3, 4]})]
+    df = _concat(pages)
+    assert isinstance(df['f'].dtype, pd.CategoricalDtype)
+    assert df['f'].tolist() == ['A', 'B', 'B', 9]
+    assert df['n'].tolist() == [1, 2, 3, 4]
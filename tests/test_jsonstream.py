@@ -0,0 +1,50 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from emspy import jsonstream
+
+
+DOCUMENTS = [
+    '[]',
+    '{}',
+    '123',
+    '[1, 2.5, "three", null]',
+    '{"rows": []}',
+    '{"header": [{"name": "a"}], "rows": [[1, "x"], [2, "y\\u00e9"]], "n": 1234567}',
+    '{"a": {"rows": [1]}, "rows": [[1]], "b": [true, false]}',
+    ' { "rows" : [ [ 1 ] , [ 2 ] ] } ',
+]
+
+
+def load_all(stream, **kwargs):
+    content = jsonstream.load(stream, **kwargs)
+    if isinstance(content, dict) and 'rows' in content and not isinstance(content['rows'], list):
+        content['rows'] = list(content['rows'])
+    return content
+
+
+@pytest.mark.parametrize('doc', DOCUMENTS)
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+def test_load_matches_json_loads(doc, chunk_size):
+    stream = io.BytesIO(doc.encode('utf-8'))
+    assert load_all(stream, iter_key='rows', chunk_size=chunk_size) == json.loads(doc)
+
+
+def test_load_gzip():
+    doc = {'header': [{'name': 'a'}], 'rows': [[i, u'\u00e9' * (i % 7)] for i in range(5000)]}
+    raw = gzip.compress(json.dumps(doc).encode('utf-8'))
+    assert load_all(io.BytesIO(raw), encoding='gzip', iter_key='rows', chunk_size=100) == doc
+    assert jsonstream.load(io.BytesIO(raw), encoding='gzip') == doc
+
+
+def test_rows_are_parsed_lazily():
+    raw = b'{"rows": [[1], [2], [3], "rest is not json'
+    rows = jsonstream.load(io.BytesIO(raw), iter_key='rows', chunk_size=4)['rows']
+    assert next(rows) == [1]
+    assert next(rows) == [2]
+    assert next(rows) == [3]
+    with pytest.raises(ValueError):
+        next(rows)
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+from urllib.error import HTTPError
+
+from emspy import Connection
+from emspy.localserver import LocalServer, EMS_NAME, DATABASE_NAME
+from emspy.query import FltQuery, Profile, TSeriesQuery
+
+
+@pytest.fixture
+def local_server():
+    with LocalServer(n_flights=1200, n_measurements=3, n_samples=120) as srv:
+        yield srv
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / 'metadata.db')
+
+
+def test_flight_query_end_to_end(local_server, data_file):
+    conn = Connection('user', 'pwd', server_url=local_server.url, pool_size=2)
+    query = FltQuery(conn, EMS_NAME, data_file=data_file)
+    query.set_database(DATABASE_NAME)
+    assert query.get_database()['name'] == DATABASE_NAME
+    query.generate_preset_fieldtree()
+    query.select('flight record', 'flight date (exact)', 'takeoff airport code',
+                 'takeoff valid', 'p2: measurement 2')
+
+    df = query.async_run(n_row=500)
+    assert df.shape == (1200, 5)
+    assert df['Flight Record'].tolist() == list(range(1, 1201))
+    assert df['Takeoff Airport Code'].iloc[0] == 'Takeoff 002'
+    assert str(df['Flight Date (Exact)'].iloc[1]) == '2020-01-01 01:00:00+00:00'
+    assert local_server.requests[('database', 'get_asyncq')] == 3
+    assert local_server.requests[('database', 'field')] == 1
+
+    query.get_top(10)
+    df = query.run()
+    assert df.shape == (10, 5)
+    conn.close()
+
+
+def test_time_series_query(local_server, data_file):
+    conn = Connection('user', 'pwd', server_url=local_server.url)
+    tsq = TSeriesQuery(conn, EMS_NAME, data_file=data_file)
+    tsq.select('parameter 1 (ft)', 'parameter 2 (ft)')
+    df = tsq.run(7, start=0, end=60)
+    assert df.shape == (60, 3)
+    assert tsq.flight_duration(7, unit='minute') == pytest.approx(2)
+
+
+def test_profile(local_server, data_file):
+    conn = Connection('user', 'pwd', server_url=local_server.url)
+    profile = Profile(conn, EMS_NAME, profile_name='local profile')
+    assert profile.get_measurements(10)['name'].tolist() == ['Maximum Pressure Altitude']
+    assert profile.get_events(10)['eventName'].tolist() == ['Hard Landing']
+
+
+def test_unimplemented_endpoints(local_server):
+    conn = Connection('user', 'pwd', server_url=local_server.url)
+    with pytest.raises(HTTPError) as err:
+        conn.request(uri_keys=('fleet', 'list'), uri_args=1)
+    assert err.value.code == 404
+
+
+def test_latency():
+    with LocalServer(latency=0.05) as srv:
+        conn = Connection('user', 'pwd', server_url=srv.url)
+        started = time.time()
+        conn.request(uri_keys=('ems_sys', 'list'))
+        assert time.time() - started >= 0.05
+
+
+def test_column_types(local_server, data_file):
+    conn = Connection('user', 'pwd', server_url=local_server.url)
+    query = FltQuery(conn, EMS_NAME, data_file=data_file)
+    query.set_database(DATABASE_NAME)
+    query.generate_preset_fieldtree()
+    query.select('flight record', 'flight date (exact)', 'takeoff airport code',
+                 'takeoff valid', 'p2: measurement 2')
+    query.get_top(100)
+    df = query.run()
+    assert df['Flight Record'].dtype.kind == 'i'
+    assert df['P2: Measurement 2'].dtype.kind == 'f'
+    assert df['Takeoff Valid'].dtype == bool
+    assert str(df['Flight Date (Exact)'].dtype).endswith('UTC]')
+    assert df['Takeoff Airport Code'].str.startswith('Takeoff ').all()
+
+
+def test_discrete_code_tables_are_cached(local_server, data_file):
+    conn = Connection('user', 'pwd', server_url=local_server.url)
+    for _ in range(2):
+        query = FltQuery(conn, EMS_NAME, data_file=data_file)
+        query.set_database(DATABASE_NAME)
+        query.generate_preset_fieldtree()
+        query.select('flight record', 'takeoff airport code')
+        df = query.async_run(n_row=500)
+        column = df['Takeoff Airport Code']
+        assert column.dtype == 'category'
+        assert column.iloc[0] == 'Takeoff 002'
+    # Built once for all pages and both queries
+    assert local_server.requests[('database', 'field')] == 1
+
+
+def test_query_from_json_string(local_server, data_file):
+    conn = Connection('user', 'pwd', server_url=local_server.url)
+    query = FltQuery(conn, EMS_NAME, data_file=data_file)
+    query.set_database(DATABASE_NAME)
+    query.generate_preset_fieldtree()
+    query.select('flight record', 'takeoff airport code', 'p2: measurement 2')
+    expected = query.async_run(n_row=500)
+
+    loaded = FltQuery(conn, EMS_NAME, data_file=data_file)
+    loaded.set_database(DATABASE_NAME)
+    loaded.from_json_string(query.in_json())
+    df = loaded.async_run(n_row=500)
+    # Without field information, columns are not typed, but all are built
+    assert list(df.columns) == list(expected.columns)
+    assert df['Flight Record'].tolist() == list(range(1, 1201))
+    assert df['P2: Measurement 2'].tolist() == expected['P2: Measurement 2'].tolist()
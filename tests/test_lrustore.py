@@ -0,0 +1,29 @@
+import time
+
+from emspy.lrustore import LRUStore
+
+
+def test_lru_eviction_and_expiry(tmp_path):
+    store = LRUStore(str(tmp_path / 'store.db'), 'entries', [('value', 'TEXT')], max_size=30)
+    for key in ('a', 'b', 'c'):
+        store.put(key, 10, ('value %s' % key,))
+    assert store.counts() == (3, 30)
+    assert store.get('a')[0] == 'value a'
+
+    # 'b' is the least recently used
+    store.put('d', 10, ('value d',))
+    assert store.get('b') is None
+    assert len(store) == 3
+    # Too large entries are not stored
+    assert store.put('e', 31, ('value e',)) is None
+    assert store.get('e') is None
+
+    time.sleep(0.05)
+    store.refresh('c')
+    assert store.get('a', max_age=0.05) is None
+    assert store.get('c', max_age=0.05)[0] == 'value c'
+    store.discard('c')
+    assert store.size() == 10
+    store.clear()
+    assert len(store) == 0
+    store.close()
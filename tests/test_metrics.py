@@ -0,0 +1,112 @@
+import sys
+
+import pytest
+from urllib.error import HTTPError
+
+from emspy import Connection
+from emspy.metrics import MetricsRegistry, PHASES
+from mock_server import server, server_url
+
+
+def test_counters_and_histograms():
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    registry.inc('requests', endpoint='a')
+    registry.inc('requests', 2, endpoint='a')
+    registry.inc('requests', endpoint='b')
+    for value in (0.05, 0.5, 0.5, 5):
+        registry.observe('seconds', value, endpoint='a')
+
+    assert registry.counter('requests', endpoint='a') == 3
+    assert registry.counter('requests', endpoint='b') == 1
+    assert registry.counter('requests', endpoint='c') == 0
+    histogram = registry.histogram('seconds', endpoint='a')
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(6.05)
+    assert histogram.cumulative_counts() == [1, 3, 4]
+
+    registry.reset()
+    assert registry.snapshot() == {'counters': [], 'histograms': []}
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry(buckets=(1,))
+    registry.inc('emspy_requests_total', endpoint='database/query', status='200')
+    registry.observe('emspy_request_seconds', 0.5, endpoint='database/query', phase='total')
+    assert registry.render().splitlines() == [
+        '# TYPE emspy_requests_total counter',
+        'emspy_requests_total{endpoint="database/query",status="200"} 1',
+        '# TYPE emspy_request_seconds histogram',
+        'emspy_request_seconds_bucket{endpoint="database/query",le="1",phase="total"} 1',
+        'emspy_request_seconds_bucket{endpoint="database/query",le="+Inf",phase="total"} 1',
+        'emspy_request_seconds_sum{endpoint="database/query",phase="total"} 0.5',
+        'emspy_request_seconds_count{endpoint="database/query",phase="total"} 1',
+    ]
+
+
+def test_request_hooks_report_timings_and_sizes(server):
+    registry = MetricsRegistry()
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=2,
+                      metrics=registry)
+    before, after = [], []
+    conn.before_request_hooks.append(before.append)
+    conn.after_request_hooks.append(after.append)
+
+    conn.request(uri_keys=('ems_sys', 'info'), uri_args=1)
+    conn.request(uri_keys=('ems_sys', 'info'), uri_args=2)
+    assert before == after
+    event = after[0]
+    assert (event.method, event.endpoint, event.status, event.attempts) == \
+        ('GET', 'ems_sys/info', 200, 1)
+    assert all(event.timings[phase] >= 0 for phase in PHASES + ('total',))
+    assert event.timings['total'] >= sum(event.timings[phase] for phase in PHASES)
+    # The mock server compresses its responses.
+    assert 0 < event.bytes_wire != event.bytes_decoded
+    # The second request reused the pooled connection.
+    assert after[1].timings['connect'] == 0
+
+    assert registry.counter('emspy_requests_total', endpoint='ems_sys/info', status='200') == 2
+    assert registry.counter('emspy_requests_total', endpoint='sys/auth', status='200') == 1
+    assert registry.histogram('emspy_request_seconds', endpoint='ems_sys/info',
+                              phase='parse').count == 2
+    assert registry.counter('emspy_response_bytes_total', endpoint='ems_sys/info',
+                            encoding='decoded') == event.bytes_decoded + after[1].bytes_decoded
+
+
+def test_request_hooks_report_errors(server):
+    registry = MetricsRegistry()
+    conn = Connection('user', 'pwd', server_url=server_url(server), metrics=registry)
+    events = []
+    conn.after_request_hooks.append(events.append)
+
+    with pytest.raises(HTTPError):
+        conn.request(uri=server_url(server) + '/api/missing')
+    assert events[0].status == 404
+    assert isinstance(events[0].error, HTTPError)
+    assert events[0].timings['total'] is not None
+    assert registry.counter('emspy_requests_total', endpoint='other', status='404') == 1
+
+
+def test_streamed_request_reports_response_phase_only(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server))
+    events = []
+    conn.after_request_hooks.append(events.append)
+    conn.request(uri_keys=('ems_sys', 'list'), stream=True)
+    assert events[0].timings['ttfb'] is not None
+    assert events[0].timings['parse'] is None
+    assert events[0].bytes_wire is None
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="emspy.aio requires Python 3.7 or later")
+def test_async_request_hooks(server):
+    import asyncio
+    from emspy.aio import AsyncConnection
+
+    registry = MetricsRegistry()
+    conn = AsyncConnection(server_url=server_url(server), metrics=registry)
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    asyncio.run(conn.arequest(uri_keys=('ems_sys', 'list')))
+    assert registry.counter('emspy_requests_total', endpoint='ems_sys/list', status='200') == 1
+    histogram = registry.histogram('emspy_request_seconds', endpoint='ems_sys/list',
+                                   phase='download')
+    assert histogram.count == 1
+    conn.close()
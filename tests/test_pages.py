@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from emspy.query.pages import PageSizer, read_pages
+from mock_localserver import local_server, query
+
+
+class Reader(object):
+    def __init__(self, n_pages, fail_at=None, delay=0.02):
+        self.n_pages = n_pages
+        self.fail_at = fail_at
+        self.delay = delay
+        self.read = []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, page):
+        with self.lock:
+            self.read.append(page)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # Later pages come back first
+        time.sleep(self.delay * (1 + (page % 3 == 0)))
+        with self.lock:
+            self.active -= 1
+        if page == self.fail_at:
+            raise IOError('page %d failed' % page)
+        return 'page %d' % page, page >= self.n_pages - 1
+
+
+def test_pages_are_yielded_in_order():
+    reader = Reader(10)
+    assert list(read_pages(reader, 4)) == ['page %d' % i for i in range(10)]
+    assert 1 < reader.max_active <= 4
+    # At most one batch of pages is read past the last one.
+    assert max(reader.read) < 10 + 4
+
+
+def test_error_is_raised_in_order():
+    reader = Reader(10, fail_at=5)
+    received = []
+    with pytest.raises(IOError):
+        for content in read_pages(reader, 3):
+            received.append(content)
+    assert received == ['page %d' % i for i in range(5)]
+    assert max(reader.read) < 5 + 3
+
+
+def test_stopping_early():
+    reader = Reader(100)
+    for content in read_pages(reader, 2):
+        break
+    assert len(reader.read) < 5
+
+
+@pytest.fixture
+def local_server_args():
+    return {'n_flights': 1000, 'n_measurements': 2, 'latency': 0.02}
+
+
+def test_concurrent_async_run(local_server, query):
+    expected = query.async_run(n_row=100)
+    local_server.requests.clear()
+    df = query.async_run(n_row=100, n_workers=4)
+    assert df.equals(expected)
+    assert df['Flight Record'].tolist() == list(range(1, 1001))
+    # hasMoreRows tells the 10th page is the last one.
+    assert local_server.requests[('database', 'get_asyncq')] <= 10 + 3
+
+
+def test_concurrent_async_run_partial_page(query):
+    df = query.run(n_row=300, n_workers=3)
+    assert df['Flight Record'].tolist() == list(range(1, 1001))
+
+
+@pytest.mark.parametrize('n_workers', [1, 3])
+def test_iter_chunks(local_server, query, n_workers):
+    chunks = query.iter_chunks(n_row=300, n_workers=n_workers)
+    first = next(chunks)
+    assert first.shape == (300, 3)
+    # Pages are read as the chunks are consumed.
+    assert local_server.requests[('database', 'get_asyncq')] <= n_workers + 1
+    rest = list(chunks)
+    assert [c.shape[0] for c in rest] == [300, 300, 100]
+    assert all((c.dtypes == first.dtypes).all() for c in rest)
+    assert rest[-1]['Flight Record'].iloc[-1] == 1000
+
+
+def test_page_sizer():
+    sizer = PageSizer(target_seconds=1., max_bytes=10 ** 6, first=1000)
+    assert sizer.n_row == 1000
+    # Fast, small rows: pages grow, at most 4 times at a time, up to max_rows
+    assert sizer.update(1000, 0.01, 10 ** 4) == 4000
+    assert sizer.update(4000, 0.04, 4 * 10 ** 4) == 16000
+    assert sizer.update(16000, 0.16, 16 * 10 ** 4) == 25000
+    # Slow pages shrink
+    sizer = PageSizer(target_seconds=1., first=1000)
+    assert sizer.update(1000, 2., 10 ** 4) == 500
+    # Wide rows are bound by the memory budget
+    sizer = PageSizer(max_bytes=10 ** 6, first=1000)
+    assert sizer.update(1000, 0.001, 10 ** 6) == 1000
+    assert sizer.update(1000, 0.001, 4 * 10 ** 6) < 1000
+    # Empty pages tell nothing
+    assert sizer.update(0, 1., 0) == sizer.n_row
+    with pytest.raises(ValueError):
+        PageSizer(min_rows=0)
+
+
+def page_sizes(query):
+    sizes = []
+
+    def record(event):
+        if event.uri_keys == ('database', 'get_asyncq'):
+            start, end = event.url.rstrip('/').split('/')[-2:]
+            sizes.append(int(end) - int(start) + 1)
+    query._conn.after_request_hooks.append(record)
+    return sizes
+
+
+def test_adaptive_async_run(query):
+    expected = query.async_run(n_row=100)
+    sizes = page_sizes(query)
+    df = query.async_run(n_row=PageSizer(first=100, target_seconds=5.))
+    assert df.equals(expected)
+    # Pages grow while they are fast
+    assert sizes[:3] == [100, 400, 1600]
+
+    # A memory budget of about 100 rows
+    del sizes[:]
+    row_bytes = expected.memory_usage(deep=True).sum() / 1000.
+    sizer = PageSizer(first=50, min_rows=10, max_bytes=100 * row_bytes)
+    assert query.async_run(n_row=sizer).equals(expected)
+    assert 1 < len(sizes) and max(sizes) <= 110
+    assert query.run(n_row='auto').equals(expected)
+    assert [c.shape[0] for c in query.iter_chunks(n_row='auto')] == [1000]
+    with pytest.raises(ValueError):
+        query.async_run(n_row='auto', n_workers=2)
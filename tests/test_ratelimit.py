@@ -0,0 +1,165 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from emspy import Connection
+from emspy.connection import DeadlineExceeded
+from emspy.query.asyncquery import AsyncQuery
+from emspy.ratelimit import FairSemaphore, RequestLimiter, TokenBucket
+from mock_localserver import local_server, local_server_args, make_query
+from mock_server import server, server_url
+
+
+def run_threads(n, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_token_bucket_reservations():
+    bucket = TokenBucket(rate=20, burst=2)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits[:2] == [0, 0]
+    assert waits[2:] == pytest.approx([0.05, 0.1, 0.15], abs=0.01)
+
+    # A reservation that cannot be met before the deadline takes no token.
+    with pytest.raises(DeadlineExceeded):
+        bucket.reserve(deadline=time.time() + 0.1)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_semaphore_is_fair():
+    semaphore = FairSemaphore(1)
+    semaphore.acquire()
+    order = []
+
+    def work(i):
+        semaphore.acquire()
+        order.append(i)
+        time.sleep(0.01)
+        semaphore.release()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    semaphore.release()
+    for t in threads:
+        t.join()
+    assert order == list(range(5))
+    assert semaphore.in_use() == 0
+
+
+def test_semaphore_deadline():
+    semaphore = FairSemaphore(1)
+    semaphore.acquire()
+    with pytest.raises(DeadlineExceeded):
+        semaphore.acquire(deadline=time.time() + 0.05)
+    semaphore.release()
+    semaphore.acquire(deadline=time.time() + 0.05)
+    assert semaphore.in_use() == 1
+
+
+def test_interrupted_waiter_gives_up_its_slot(monkeypatch):
+    class Interrupted(BaseException):
+        pass
+
+    class InterruptedEvent(threading.Event):
+        def wait(self, timeout=None):
+            raise Interrupted()
+
+    semaphore = FairSemaphore(1)
+    semaphore.acquire()
+    monkeypatch.setattr(threading, 'Event', InterruptedEvent)
+    with pytest.raises(Interrupted):
+        semaphore.acquire()
+    monkeypatch.undo()
+    semaphore.release()
+    assert semaphore.in_use() == 0
+    semaphore.acquire(deadline=time.time() + 0.05)
+    assert semaphore.in_use() == 1
+
+
+def test_unknown_family():
+    with pytest.raises(ValueError):
+        RequestLimiter(max_in_flight={'bogus': 1})
+
+
+@pytest.mark.parametrize('pool_size', [None, 8])
+def test_connection_caps_requests_in_flight(server, pool_size):
+    limiter = RequestLimiter(max_in_flight={'metadata': 2})
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=pool_size,
+                      limiter=limiter)
+    server.response_delay = 0.1
+    run_threads(6, lambda i: conn.request(uri_keys=('ems_sys', 'info'), uri_args=i))
+    assert server.max_active == 2
+    assert limiter.semaphores['metadata'].in_use() == 0
+
+
+def test_connection_rate_limit(server):
+    limiter = RequestLimiter(rate_limits={'metadata': (20, 1)})
+    conn = Connection('user', 'pwd', server_url=server_url(server), limiter=limiter)
+    started = time.time()
+    for i in range(5):
+        conn.request(uri_keys=('ems_sys', 'info'), uri_args=i)
+    assert time.time() - started >= 0.19
+    # Other endpoint families are not limited.
+    started = time.time()
+    conn.request(uri_keys=('analytic', 'query'), uri_args=(1, 2), jsondata={})
+    assert time.time() - started < 0.05
+
+
+def test_limiter_is_shared_by_connections(server):
+    limiter = RequestLimiter(max_in_flight={'metadata': 1})
+    conns = [Connection('user', 'pwd', server_url=server_url(server), limiter=limiter)
+             for _ in range(3)]
+    server.response_delay = 0.05
+    run_threads(3, lambda i: conns[i].request(uri_keys=('ems_sys', 'info'), uri_args=i))
+    assert server.max_active == 1
+
+
+@pytest.mark.parametrize('pool_size', [None, 4])
+def test_streamed_pages_hold_their_slot_until_read(local_server, tmp_path, pool_size):
+    limiter = RequestLimiter(max_in_flight={'async_read': 1})
+    query = make_query(local_server, tmp_path, pool_size=pool_size, limiter=limiter)
+    semaphore = limiter.semaphores['async_read']
+    with AsyncQuery.open(query._conn, query._asyncq_uri_args(), query.in_dict()) as opened:
+        content = opened.read(0, 99, stream=True)
+        assert semaphore.in_use() == 1
+        assert len(list(content['rows'])) == 100
+        assert semaphore.in_use() == 0
+
+        # Pages which are not read to the end free their slot once closed
+        rows = opened.read(100, 199, stream=True)['rows']
+        next(rows)
+        assert semaphore.in_use() == 1
+        rows.close()
+        assert semaphore.in_use() == 0
+    query._conn.close()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="emspy.aio requires Python 3.7 or later")
+def test_async_connection_caps_requests_in_flight(server):
+    import asyncio
+    from emspy.aio import AsyncConnection
+    from mock_aio import gather_all
+
+    limiter = RequestLimiter(max_in_flight={'metadata': 3}, rate_limits={'metadata': (100, 10)})
+    conn = AsyncConnection(server_url=server_url(server), limiter=limiter)
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    server.response_delay = 0.1
+    asyncio.run(gather_all(*[conn.arequest(uri_keys=('ems_sys', 'info'), uri_args=i)
+                             for i in range(9)]))
+    assert server.max_active == 3
+    assert limiter.semaphores['metadata'].in_use() == 0
+
+    limiter.semaphores['metadata'].acquire()
+    limiter.semaphores['metadata'].acquire()
+    limiter.semaphores['metadata'].acquire()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(conn.arequest(uri_keys=('ems_sys', 'list'), deadline=time.time() + 0.1))
+    conn.close()
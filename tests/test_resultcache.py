@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+from emspy import Connection
+from emspy.localserver import LocalServer, EMS_NAME, DATABASE_NAME
+from emspy.query import FltQuery
+from emspy.query.resultcache import ResultCache
+
+
+def test_key_is_canonical():
+    key = ResultCache.key({'select': [1, 2], 'format': 'none'}, 1, 'db', 'http://ems/api', 'u')
+    assert key == ResultCache.key({'format': 'none', 'select': [1, 2]}, 1, 'db',
+                                  'http://ems/api', 'u')
+    assert key != ResultCache.key({'format': 'none', 'select': [2, 1]}, 1, 'db',
+                                  'http://ems/api', 'u')
+    assert key != ResultCache.key({'format': 'none', 'select': [1, 2]}, 2, 'db',
+                                  'http://ems/api', 'u')
+
+
+@pytest.fixture
+def local_server():
+    with LocalServer(n_flights=600, n_measurements=2) as srv:
+        yield srv
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'results.db')
+
+
+def make_query(srv, tmp_path, cache, user='user'):
+    conn = Connection(user, 'pwd', server_url=srv.url)
+    query = FltQuery(conn, EMS_NAME, data_file=str(tmp_path / 'metadata.db'), result_cache=cache)
+    query.set_database(DATABASE_NAME)
+    query.generate_preset_fieldtree()
+    query.select('flight record', 'flight date (exact)', 'takeoff airport code')
+    return query
+
+
+def test_repeated_query(local_server, tmp_path, cache_file):
+    cache = ResultCache(cache_file)
+    query = make_query(local_server, tmp_path, cache)
+    df = query.run(n_row=250)
+    n_reads = local_server.requests[('database', 'get_asyncq')]
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'entries': 1, 'size': cache.size()}
+
+    cached = query.run(n_row=250)
+    assert cached.equals(df)
+    assert (cached.dtypes == df.dtypes).all()
+    assert local_server.requests[('database', 'get_asyncq')] == n_reads
+    assert local_server.requests[('database', 'open_asyncq')] == 1
+
+    # Another query object, reading the same file
+    other = make_query(local_server, tmp_path, cache_file)
+    assert other.run(n_row=250).equals(df)
+    assert other.result_cache.stats()['hits'] == 1
+
+    # A different query, or another user, is sent
+    query.get_top(10)
+    assert query.run().shape == (10, 3)
+    make_query(local_server, tmp_path, cache, user='other').run()
+    assert local_server.requests[('database', 'open_asyncq')] == 2
+    assert cache.stats()['entries'] == 3
+
+
+def test_ttl(local_server, tmp_path, cache_file):
+    cache = ResultCache(cache_file, ttl=0.2)
+    query = make_query(local_server, tmp_path, cache)
+    query.get_top(5)
+    query.run()
+    query.run()
+    assert local_server.requests[('database', 'query')] == 1
+    time.sleep(0.25)
+    query.run()
+    assert local_server.requests[('database', 'query')] == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_lru_eviction(local_server, tmp_path, cache_file):
+    cache = ResultCache(cache_file)
+    query = make_query(local_server, tmp_path, cache)
+    sizes = []
+    for n in (10, 20, 30):
+        query.get_top(n)
+        query.run()
+        sizes.append(cache.size() - sum(sizes))
+    query.get_top(10)
+    query.run()
+    assert cache.hits == 1
+
+    # Room for the two most recently used results only
+    cache.max_size = sizes[0] + sizes[2] + 1
+    query.get_top(40)
+    query.run()
+    assert len(cache) <= 2
+    query.get_top(20)
+    query.run()
+    assert cache.hits == 1
+    assert cache.size() <= cache.max_size
+
+
+def test_partial_results_are_not_cached(local_server, tmp_path, cache_file):
+    cache = ResultCache(cache_file)
+    query = make_query(local_server, tmp_path, cache)
+    local_server.async_queries.clear()
+    original = local_server.handle
+
+    def fail_second_page(method, path, query_args, body):
+        if '/read/250/' in path:
+            return 404, {'message': 'query expired'}
+        return original(method, path, query_args, body)
+
+    local_server.handle = fail_second_page
+    assert query.run(n_row=250).shape[0] == 250
+    assert len(cache) == 0
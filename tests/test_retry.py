@@ -0,0 +1,127 @@
+import errno
+import socket
+import ssl
+
+import pytest
+from email.message import Message
+from urllib.error import HTTPError, URLError
+
+from emspy import Connection
+from emspy.retry import RetryPolicy, REAUTHENTICATE, RETRY, is_connection_error
+from mock_server import server, server_url
+
+
+def http_error(code, retry_after=None):
+    headers = Message()
+    if retry_after is not None:
+        headers['Retry-After'] = retry_after
+    return HTTPError('http://ems/api', code, 'error', headers, None)
+
+
+def test_retryable_status_codes():
+    policy = RetryPolicy()
+    for code in (429, 502, 503, 504):
+        assert policy.action(http_error(code), 0, method='GET') == RETRY
+    for code in (400, 403, 404, 500):
+        assert policy.action(http_error(code), 0) is None
+
+
+def test_gateway_errors_are_retried_if_idempotent():
+    policy = RetryPolicy()
+    open_asyncq = ('database', 'open_asyncq')
+    for code in (502, 504):
+        # The gateway may have passed the request on to the server
+        assert policy.action(http_error(code), 0, open_asyncq, method='POST') is None
+        assert policy.action(http_error(code), 0, ('database', 'query'), method='POST') == RETRY
+        assert policy.action(http_error(code), 0, ('database', 'get_asyncq'),
+                             method='GET') == RETRY
+    # The server did not handle these
+    for code in (429, 503):
+        assert policy.action(http_error(code), 0, open_asyncq, method='POST') == RETRY
+
+
+def test_reauthenticate_only_once_on_401():
+    policy = RetryPolicy()
+    assert policy.action(http_error(401), 0) == REAUTHENTICATE
+    assert policy.action(http_error(401), 0, reauthenticated=True) is None
+
+
+def test_connection_errors_are_retried():
+    policy = RetryPolicy()
+    assert policy.action(URLError(ConnectionRefusedError()), 0) == RETRY
+    assert policy.action(socket.timeout(), 0, method='GET') == RETRY
+    assert policy.action(ConnectionResetError(), 0, method='GET') == RETRY
+    assert not is_connection_error(URLError(ssl.CertificateError('bad certificate')))
+    assert policy.action(ValueError(), 0) is None
+
+
+def test_requests_which_may_have_been_applied_are_retried_if_idempotent():
+    policy = RetryPolicy()
+    open_asyncq = ('database', 'open_asyncq')
+    for exc in (socket.timeout(), URLError(socket.timeout()),
+                ConnectionResetError(errno.ECONNRESET, 'reset')):
+        assert policy.action(exc, 0, uri_keys=open_asyncq, method='POST') is None
+        assert policy.action(exc, 0, uri_keys=('database', 'query'), method='POST') == RETRY
+        assert policy.action(exc, 0, uri_keys=('ems_sys', 'list'), method='GET') == RETRY
+        assert policy.action(exc, 0) is None
+    # POST requests which did not reach the server are sent again
+    assert policy.action(URLError(ConnectionRefusedError()), 0, uri_keys=open_asyncq,
+                         method='POST') == RETRY
+    assert not policy.idempotent('GET', ('database', 'create'))
+
+
+def test_retries_are_limited():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.action(http_error(503), 1) == RETRY
+    assert policy.action(http_error(503), 2) is None
+
+
+def test_unsafe_requests_are_not_retried():
+    policy = RetryPolicy()
+    assert policy.action(http_error(503), 0, uri_keys=('database', 'create')) is None
+    assert policy.action(http_error(401), 0, uri_keys=('database', 'create')) == REAUTHENTICATE
+
+
+def test_exponential_backoff():
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=0)
+    assert [policy.backoff(i) for i in range(5)] == [0.5, 1, 2, 3, 3]
+    policy = RetryPolicy(backoff_factor=1, jitter=0.5)
+    assert all(0.5 <= policy.backoff(0) <= 1 for _ in range(100))
+
+
+def test_retry_after_header():
+    policy = RetryPolicy(backoff_factor=0.1, max_backoff=30, jitter=0)
+    assert policy.backoff(0, http_error(503, '7')) == 7
+    assert policy.backoff(0, http_error(503, '120')) == 30
+    assert policy.backoff(0, http_error(503, 'Wed, 21 Oct 2015 07:28:00 GMT')) == 0.1
+
+
+def test_connection_retries_unavailable_server(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server),
+                      retry_policy=RetryPolicy(backoff_factor=0.01))
+    server.failures = [503, 429, 502]
+    _, content = conn.request(uri_keys=('ems_sys', 'list'))
+    assert content == {'path': '/api/v2/ems-systems'}
+    assert server.failures == []
+    assert server.n_tokens == 1
+
+
+def test_connection_gives_up_after_max_retries(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server),
+                      retry_policy=RetryPolicy(max_retries=2, backoff_factor=0.01))
+    server.failures = [503, 503, 503, 503]
+    with pytest.raises(HTTPError):
+        conn.request(uri_keys=('ems_sys', 'list'))
+    assert server.failures == [503]
+
+
+def test_connection_reauthenticates_on_401(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=2)
+    for _ in range(5):
+        server.failures = [401]
+        _, content = conn.request(uri_keys=('ems_sys', 'list'))
+        assert content == {'path': '/api/v2/ems-systems'}
+    # Every 401 refreshed the token and the request was resent with the new one. The reconnect
+    # counter is reset after each successful authentication, so this never runs out.
+    assert server.n_tokens == 6
+    assert server.authorizations[-2:] == ['bearer token5', 'bearer token6']
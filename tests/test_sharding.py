@@ -0,0 +1,52 @@
+import pytest
+
+from mock_localserver import local_server, make_query
+
+
+@pytest.fixture
+def local_server_args():
+    return {'n_flights': 1000, 'n_measurements': 2, 'latency': 0.05}
+
+
+@pytest.fixture
+def query(local_server, tmp_path):
+    query = make_query(local_server, tmp_path,
+                       ('flight record', 'flight date (exact)', 'p2: measurement 2'), pool_size=4)
+    yield query
+    query._conn.close()
+
+
+def test_sharded_run(local_server, query):
+    expected = query.async_run(n_row=50)
+    assert local_server.max_active == 1
+
+    df = query.sharded_run('flight date (exact)', '2020-01-01', '2020-03-01', n_shards=4,
+                           n_row=50)
+    assert df.equals(expected)
+    # The shards ran at the same time
+    assert 1 < local_server.max_active <= 4
+    # Each shard ran its own async-query
+    assert local_server.requests[('database', 'open_asyncq')] == 1 + 4
+    # and closed it
+    assert local_server.requests[('database', 'close_asyncq')] == 1 + 4
+    assert local_server.async_queries == {}
+
+
+def test_shard_ranges(local_server, query):
+    # Ranges not aligned on flight times, within the flights
+    df = query.sharded_run('flight date (exact)', '2020-01-02 00:30', '2020-01-05 12:00',
+                           n_shards=3)
+    assert df['Flight Record'].tolist() == list(range(26, 109))
+
+    # Existing filters still apply
+    query.filter("'flight date (exact)' < '2020-01-03'")
+    df = query.sharded_run('flight date (exact)', '2020-01-01', '2020-01-10', n_shards=3)
+    assert df['Flight Record'].tolist() == list(range(1, 49))
+
+
+def test_invalid_shards(query):
+    with pytest.raises(ValueError):
+        query.sharded_run('p2: measurement 2', '2020-01-01', '2020-03-01')
+    query.get_top(10)
+    with pytest.raises(ValueError):
+        query.sharded_run('flight date (exact)', '2020-01-01', '2020-03-01')
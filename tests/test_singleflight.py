@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from emspy import Connection
+from emspy.singleflight import SingleFlight
+from mock_server import server, server_url
+
+
+def run_threads(n, target):
+    results = [None] * n
+
+    def work(i):
+        results[i] = target(i)
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'values': [1, 2]}
+
+    results = run_threads(8, lambda i: flight.do('key', fetch))
+    assert len(calls) == 1
+    assert all(r == {'values': [1, 2]} for r in results)
+    # Every caller gets its own copy.
+    assert len(set(id(r) for r in results)) == 8
+    assert flight.in_flight() == 0
+
+    flight.do('key', fetch)
+    assert len(calls) == 2
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.2)
+        raise ValueError('failed')
+
+    def call(i):
+        try:
+            flight.do('key', fail)
+        except ValueError as exc:
+            return exc
+    assert all(isinstance(r, ValueError) for r in run_threads(4, call))
+    assert flight.in_flight() == 0
+
+
+def test_interruptions_are_shared():
+    # e.g. KeyboardInterrupt, which is not an Exception
+    class Interrupted(BaseException):
+        pass
+    flight = SingleFlight()
+
+    def interrupted():
+        time.sleep(0.2)
+        raise Interrupted()
+
+    def call(i):
+        try:
+            return flight.do('key', interrupted)
+        except Interrupted as exc:
+            return exc
+    assert all(isinstance(r, Interrupted) for r in run_threads(4, call))
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.parametrize('pool_size', [None, 4])
+def test_identical_gets_are_coalesced(server, pool_size):
+    conn = Connection('user', 'pwd', server_url=server_url(server), pool_size=pool_size)
+    server.response_delay = 0.2
+    n_requests = len(server.client_ports)
+
+    results = run_threads(8, lambda i: conn.request(uri_keys=('ems_sys', 'list'))[1])
+    assert len(server.client_ports) == n_requests + 1
+    assert all(r == {'path': '/api/v2/ems-systems'} for r in results)
+
+    results = run_threads(4, lambda i: conn.request(uri_keys=('ems_sys', 'info'),
+                                                    uri_args=i % 2)[1])
+    assert len(server.client_ports) == n_requests + 3
+
+
+def test_only_read_only_posts_are_coalesced(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server))
+    server.response_delay = 0.2
+    n_requests = len(server.client_ports)
+
+    run_threads(4, lambda i: conn.request(uri_keys=('analytic', 'search'), uri_args=1,
+                                          rtype='POST', jsondata={'id': 'abc'}))
+    assert len(server.client_ports) == n_requests + 1
+    run_threads(4, lambda i: conn.request(uri_keys=('database', 'open_asyncq'), uri_args=(1, 2),
+                                          rtype='POST', jsondata={'select': []}))
+    assert len(server.client_ports) == n_requests + 5
+
+
+def test_coalescing_can_be_disabled(server):
+    conn = Connection('user', 'pwd', server_url=server_url(server), coalesce=False)
+    server.response_delay = 0.1
+    n_requests = len(server.client_ports)
+    run_threads(4, lambda i: conn.request(uri_keys=('ems_sys', 'list')))
+    assert len(server.client_ports) == n_requests + 4
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="emspy.aio requires Python 3.7 or later")
+def test_identical_async_requests_are_coalesced(server):
+    import asyncio
+    from emspy.aio import AsyncConnection
+    from mock_aio import gather_all
+
+    conn = AsyncConnection(server_url=server_url(server))
+    asyncio.run(conn.aconnect('user', 'pwd'))
+    server.response_delay = 0.1
+    n_requests = len(server.client_ports)
+    results = asyncio.run(gather_all(*[conn.arequest(uri_keys=('ems_sys', 'list'))
+                                       for _ in range(8)]))
+    assert len(server.client_ports) == n_requests + 1
+    assert len(set(id(content) for _, content in results)) == 8
+    conn.close()
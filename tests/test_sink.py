@@ -0,0 +1,102 @@
+import sys
+
+import pandas as pd
+import pytest
+
+from emspy.localserver import LocalServer, EMS_NAME, DATABASE_NAME
+from emspy.query import FltQuery, sink
+from mock_localserver import local_server, make_query
+
+FIELDS = ('flight record', 'flight date (exact)', 'takeoff airport code', 'takeoff valid',
+          'p2: measurement 2')
+
+
+@pytest.fixture
+def local_server_args():
+    return {'n_flights': 700, 'n_measurements': 2}
+
+
+@pytest.fixture
+def query(local_server, tmp_path):
+    query = make_query(local_server, tmp_path, FIELDS)
+    yield query
+    query._conn.close()
+
+
+@pytest.mark.parametrize('name', ['flights.parquet', 'flights.arrow'])
+def test_to_file(query, tmp_path, name):
+    pa = pytest.importorskip('pyarrow')
+    path = str(tmp_path / name)
+    assert query.to_file(path, n_row=300) == 700
+
+    if name.endswith('.parquet'):
+        import pyarrow.parquet
+        written = pyarrow.parquet.ParquetFile(path)
+        assert written.metadata.num_row_groups == 3
+        table = written.read()
+    else:
+        table = pa.ipc.open_file(path).read_all()
+    assert [str(t) for t in table.schema.types] == [
+        'double', 'timestamp[ns, tz=UTC]', 'string', 'bool', 'double']
+    df = table.to_pandas()
+    expected = query.async_run(n_row=300)
+    assert df['Flight Record'].tolist() == list(range(1, 701))
+    assert df['Takeoff Airport Code'].tolist() == expected['Takeoff Airport Code'].tolist()
+    assert (df['Flight Date (Exact)'] == expected['Flight Date (Exact)']).all()
+
+
+def test_empty_result(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    path = str(tmp_path / 'flights.parquet')
+    with LocalServer(n_flights=0, n_measurements=2) as srv:
+        assert make_query(srv, tmp_path, FIELDS).to_file(path) == 0
+    table = pyarrow.parquet.read_table(path)
+    assert table.num_rows == 0
+    assert len(table.schema) == len(FIELDS)
+
+
+def test_query_from_json_string(query, tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    loaded = FltQuery(query._conn, EMS_NAME, data_file=str(tmp_path / 'metadata.db'))
+    loaded.set_database(DATABASE_NAME)
+    loaded.from_json_string(query.in_json())
+    path = str(tmp_path / 'flights.parquet')
+    assert loaded.to_file(path, n_row=300) == 700
+
+    # Without field information, every column is written as strings
+    table = pyarrow.parquet.read_table(path)
+    assert table.num_rows == 700
+    assert len(table.schema) == len(FIELDS)
+    assert [str(t) for t in table.schema.types] == ['string'] * len(FIELDS)
+
+
+def test_columns_fit_the_schema(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    schema = sink.arrow_schema(['a', 'b'], ['number', 'discrete'])
+    path = str(tmp_path / 'out.parquet')
+    with sink.FileSink(path, schema) as out:
+        # Untyped values, e.g. discrete keys without a value, are converted
+        out.write(pd.DataFrame({'a': ['1.5', None], 'b': [3, 'Takeoff 001']}))
+        out.write(pd.DataFrame({'a': [1, 2], 'b': ['x', None]}))
+    table = pyarrow.parquet.read_table(path)
+    assert table.schema == schema
+    assert table.column('a').to_pylist() == [1.5, None, 1., 2.]
+    assert table.column('b').to_pylist() == ['3', 'Takeoff 001', 'x', None]
+
+
+def test_format():
+    assert sink.get_format('out.PQ') == 'parquet'
+    assert sink.get_format('out.feather') == 'arrow'
+    assert sink.get_format('out.csv', 'arrow') == 'arrow'
+    with pytest.raises(ValueError):
+        sink.get_format('out', 'csv')
+
+
+def test_missing_pyarrow(query, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(ImportError) as err:
+        query.to_file(str(tmp_path / 'flights.parquet'))
+    assert 'pip install pyarrow' in str(err.value)
@@ -0,0 +1,131 @@
+import gzip
+import http.client
+import json
+import urllib.request
+
+import pytest
+from urllib.error import HTTPError
+
+from emspy import Connection
+from emspy.localserver import LocalServer, EMS_NAME, DATABASE_NAME
+from emspy.query import FltQuery
+from emspy.transport import (FakeTransport, PooledTransport, UrllibTransport, backends,
+                             get_transport)
+from mock_server import server, server_url
+
+
+def test_get_transport():
+    assert isinstance(get_transport(), UrllibTransport)
+    assert isinstance(get_transport(pool_size=2), PooledTransport)
+    assert isinstance(get_transport('pooled'), PooledTransport)
+    fake = FakeTransport()
+    assert get_transport(fake, pool_size=2) is fake
+    assert list(backends) == ['pooled', 'urllib', 'fake']
+    with pytest.raises(ValueError):
+        get_transport('curl')
+
+
+def test_fake_transport_canned_responses():
+    fake = FakeTransport()
+    fake.add_response('POST', '/api/token', {'access_token': 'abc', 'token_type': 'bearer'})
+    fake.add_response('GET', '/api/v2/ems-systems', [{'id': 1, 'name': 'EMS'}])
+    fake.add_response('GET', '/api/v2/ems-systems/1/info', {'message': 'no'}, status=403)
+    conn = Connection('user', 'pwd', server_url='http://ems.invalid', transport=fake)
+    assert conn.token == 'abc'
+    assert conn.request(uri_keys=('ems_sys', 'list'))[1] == [{'id': 1, 'name': 'EMS'}]
+    with pytest.raises(HTTPError) as err:
+        conn.request(uri_keys=('ems_sys', 'info'), uri_args=1)
+    assert err.value.code == 403
+    method, url, data, headers = fake.requests[1]
+    assert (method, url) == ('GET', 'http://ems.invalid/api/v2/ems-systems')
+    assert headers['Authorization'] == 'bearer abc'
+
+
+def test_fake_transport_serves_local_api(tmp_path):
+    api = LocalServer(n_flights=100, n_measurements=2)
+    conn = Connection('user', 'pwd', server_url='http://ems.invalid',
+                      transport=FakeTransport(api.handle))
+    query = FltQuery(conn, EMS_NAME, data_file=str(tmp_path / 'metadata.db'))
+    query.set_database(DATABASE_NAME)
+    query.generate_preset_fieldtree()
+    query.select('flight record', 'p1: measurement 1')
+    query.get_top(20)
+    df = query.run()
+    assert df['Flight Record'].tolist() == list(range(1, 21))
+    assert api.requests[('database', 'query')] == 1
+
+
+@pytest.mark.parametrize('transport', ['urllib', 'pooled'])
+def test_proxies_are_per_connection(server, transport):
+    proxied = Connection(server_url='http://ems.invalid', transport=transport,
+                         proxies={'http': server_url(server)})
+    direct = Connection(server_url=server_url(server), transport=transport)
+    _, content = proxied.request(uri_keys=('ems_sys', 'list'), headers={})
+    # Through an HTTP proxy the absolute url is requested.
+    assert content == {'path': 'http://ems.invalid/api/v2/ems-systems'}
+    _, content = direct.request(uri_keys=('ems_sys', 'list'), headers={})
+    assert content == {'path': '/api/v2/ems-systems'}
+    # No process-wide opener is installed.
+    assert urllib.request._opener is None
+
+
+def test_connect_changes_proxies(server):
+    conn = Connection(server_url='http://ems.invalid')
+    conn.connect('user', 'pwd', proxies={'http': server_url(server)})
+    assert conn.token == 'token1'
+    _, content = conn.request(uri_keys=('ems_sys', 'list'))
+    assert content == {'path': 'http://ems.invalid/api/v2/ems-systems'}
+
+
+def stale_after_send(transport):
+    # Makes the idle pooled connection fail once the request was sent, as when the server
+    # closed it while it sat idle.
+    (conn, _), = transport._pools[next(iter(transport._pools))]
+
+    def getresponse():
+        raise http.client.RemoteDisconnected('closed')
+    conn.getresponse = getresponse
+
+
+def test_stale_connection_resends_only_idempotent_requests(server):
+    transport = PooledTransport(pool_size=2)
+    url = server_url(server) + '/api/v2/ems-systems'
+    transport.send('GET', url).read()
+
+    stale_after_send(transport)
+    assert json.loads(gzip.decompress(transport.send('GET', url).read())) == \
+        {'path': '/api/v2/ems-systems'}
+    n_requests = len(server.client_ports)
+
+    # A POST which may have reached the server is not sent again
+    stale_after_send(transport)
+    with pytest.raises(http.client.RemoteDisconnected):
+        transport.send('POST', url + '/1/databases/db/async-query', b'{}',
+                       {'Content-Type': 'application/json'})
+    assert len(server.client_ports) == n_requests + 1
+    transport.close()
+
+
+def test_failed_resend_closes_its_connection(server, monkeypatch):
+    transport = PooledTransport(pool_size=2)
+    url = server_url(server) + '/api/v2/ems-systems'
+    transport.send('GET', url).read()
+    stale_after_send(transport)
+
+    opened = []
+    new_connection = transport._PooledTransport__new_connection
+
+    def failing_connection(key, timeout):
+        conn = new_connection(key, timeout)
+
+        def getresponse():
+            raise http.client.RemoteDisconnected('closed')
+        conn.getresponse = getresponse
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(transport, '_PooledTransport__new_connection', failing_connection)
+    with pytest.raises(http.client.RemoteDisconnected):
+        transport.send('GET', url)
+    assert len(opened) == 1
+    assert opened[0].sock is None
+    transport.close()
@@ -1,4 +1,5 @@
-import emspy, os, sys, pytest
+import emspy, os, sys, time, pytest
+from emspy.connection import DeadlineExceeded
 from emspy.query import LocalData
 from mock_connection import MockConnection
 from mock_ems import MockEMS
@@ -196,3 +197,12 @@ def test_db_file_not_created(tsq_no_db):
 
     # Make sure the default data file was not created.
     assert os.path.exists(LocalData.default_data_file) is False
+
+
+def test_multi_run_deadline(tsq_no_db):
+    tsq_no_db.select_ids(['fake-bar-alt-id-that-exists='], ['Baro-Corrected Altitude (ft)'])
+    res = tsq_no_db.multi_run([10, 20], start=[0, 0], end=[1, 1], deadline=time.time() + 60)
+    assert [r['ts_data']['Baro-Corrected Altitude (ft)'].tolist() for r in res] == \
+        [[10, 11], [20, 21]]
+    with pytest.raises(DeadlineExceeded):
+        tsq_no_db.multi_run([10, 20], start=[0, 0], end=[1, 1], deadline=time.time() - 1)